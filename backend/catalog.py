@@ -0,0 +1,124 @@
+"""
+Process-local route catalog cache.
+
+The routes table changes a few times a day but is read on every search, so
+each worker keeps a versioned snapshot of it with prices already converted
+and formatted for every supported currency. The snapshot is reloaded when
+its TTL expires or when a write invalidates it; concurrent misses share a
+single database load.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+Row = Dict[str, Any]
+
+
+class CatalogSnapshot(NamedTuple):
+    """An immutable view of the routes table at one catalog version."""
+    version: int
+    loaded_at: float
+    routes: Tuple[Row, ...]
+    by_id: Dict[str, Row]
+    # name -> data derived from the routes, e.g. a serialized response
+    views: Dict[str, Any]
+
+    def view(self, name: str, build: Callable[["CatalogSnapshot"], Any]) -> Any:
+        """
+        Data derived from this snapshot, built on first use.
+
+        Views are dropped with the snapshot, so they never outlive the
+        catalog version (and currency rates) they were built from.
+        """
+        if name not in self.views:
+            self.views[name] = build(self)
+        return self.views[name]
+
+
+class RouteCatalog:
+    """
+    Versioned, TTL-bound cache of the routes table.
+
+    Args:
+        loader: Coroutine function returning all route rows.
+        prepare: Called once per row on load to add derived fields such as
+            ``prices`` and ``formatted_prices``.
+        ttl (float): Seconds a snapshot is served before it is reloaded.
+        clock: Monotonic time source, injectable for tests.
+        key (str): Column ``by_id`` is keyed on, for catalogs of other
+            tables such as buses.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Awaitable[List[Row]]],
+        prepare: Callable[[Row], Row],
+        ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        key: str = "route_id",
+    ):
+        self.loader = loader
+        self.prepare = prepare
+        self.ttl = ttl
+        self.clock = clock
+        self.key = key
+        self.version = 0
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._generation = 0
+        self._snapshot_generation = -1
+        self._loading: Optional[asyncio.Future] = None
+
+    def is_fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and self._snapshot_generation == self._generation
+            and self.clock() - self._snapshot.loaded_at < self.ttl
+        )
+
+    def invalidate(self) -> None:
+        """Mark the current snapshot stale; the next read reloads it."""
+        self._generation += 1
+
+    async def get(self) -> CatalogSnapshot:
+        """
+        Return a fresh snapshot, loading it if needed.
+
+        Only one load runs at a time per worker; concurrent callers await
+        the same load instead of each querying the database.
+        """
+        if self.is_fresh():
+            return self._snapshot
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._load(self._generation))
+            self._loading.add_done_callback(self._clear_loading)
+        return await asyncio.shield(self._loading)
+
+    async def routes(self) -> Tuple[Row, ...]:
+        return (await self.get()).routes
+
+    async def route(self, route_id: str) -> Optional[Row]:
+        return (await self.get()).by_id.get(route_id)
+
+    def _clear_loading(self, future: asyncio.Future) -> None:
+        self._loading = None
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Route catalog load failed: {future.exception()}")
+
+    async def _load(self, generation: int) -> CatalogSnapshot:
+        rows = await self.loader()
+        routes = tuple(self.prepare(dict(row)) for row in rows)
+        self.version += 1
+        snapshot = CatalogSnapshot(
+            version=self.version,
+            loaded_at=self.clock(),
+            routes=routes,
+            by_id={route[self.key]: route for route in routes if self.key in route},
+            views={},
+        )
+        self._snapshot = snapshot
+        # A write that landed while loading keeps the snapshot stale
+        self._snapshot_generation = generation
+        return snapshot
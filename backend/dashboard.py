@@ -0,0 +1,297 @@
+"""
+Incrementally maintained admin dashboard aggregates.
+
+Bookings per route and status, bookings per day and seat occupancy per
+route are kept as running totals; revenue is priced from them at the
+routes' current fares when the dashboard is read. Every booking and every
+seat inventory change is folded in as it happens, in the worker that made
+it and, through the event bus, in the others, so reading the dashboard
+costs O(routes) whatever the size of the bookings table. A periodic
+reconciliation reloads the totals from the ``dashboard_totals`` aggregate
+(backend/sql/dashboard.sql) to pick up writes from other hosts and correct
+any drift. Seat occupancy covers travel dates from today onwards, on both
+paths. Days are UTC days everywhere: bookings store ``created_at`` with an
+explicit UTC offset, and the aggregate buckets it in UTC as well.
+"""
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from catalog import CatalogSnapshot, RouteCatalog
+from db import Store
+from seats import SeatState, TABLE as SEAT_TABLE
+
+logger = logging.getLogger(__name__)
+
+Row = Dict[str, Any]
+
+# Seconds before a reconciliation starts from which bookings may also
+# arrive as events during it
+REPLAY_MARGIN = 300.0
+
+# Booking fields the dashboard uses, and that are sent to other workers
+DASHBOARD_FIELDS = ("booking_id", "route_id", "travel_date", "seat_number", "status", "created_at")
+
+
+def utc_time(timestamp: str) -> datetime:
+    """An ISO timestamp as an aware UTC datetime; naive ones are taken as UTC."""
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def _day(timestamp: Optional[str]) -> Optional[str]:
+    """The UTC day a booking was created, which is what "today" counts."""
+    if not timestamp:
+        return None
+    try:
+        return utc_time(timestamp).date().isoformat()
+    except ValueError:
+        return timestamp[:10]
+
+
+def _recent_entry(rows: List[Row]) -> Row:
+    """Bookings created together, as one line of the recent bookings list."""
+    return {
+        "booking_id": rows[0]["booking_id"],
+        "route_id": rows[0]["route_id"],
+        "travel_date": rows[0].get("travel_date"),
+        "seat_numbers": [row["seat_number"] for row in rows],
+        "status": rows[0].get("status"),
+        "created_at": rows[0].get("created_at"),
+    }
+
+
+def _priced(entry: Row, snapshot: CatalogSnapshot) -> Row:
+    """A recent bookings line with its total at the route's current USD fare."""
+    price = snapshot.by_id.get(entry["route_id"], {}).get("prices", {}).get("USD", 0.0)
+    return {**entry, "total_price": round(price * len(entry["seat_numbers"]), 2), "currency": "USD"}
+
+
+class DashboardTotals:
+    """Running totals over bookings and seat inventory."""
+
+    def __init__(self, recent_size: int = 10):
+        self.total_bookings = 0
+        self.by_status: Dict[str, int] = {}
+        self.by_day: Dict[str, int] = {}
+        self.route_bookings: Dict[str, int] = {}
+        # (route_id, travel_date) -> (version, booked, total), and per-route sums
+        self.seats: Dict[Tuple[str, str], Tuple[int, int, int]] = {}
+        self.route_seats: Dict[str, List[int]] = {}
+        self.recent: Deque[Row] = deque(maxlen=recent_size)
+
+    def add_count(self, route_id: str, status: Optional[str], count: int) -> None:
+        """Count ``count`` bookings of one route and status."""
+        status = status or "pending"
+        self.total_bookings += count
+        self.by_status[status] = self.by_status.get(status, 0) + count
+        self.route_bookings[route_id] = self.route_bookings.get(route_id, 0) + count
+
+    def add_bookings(self, rows: List[Row]) -> None:
+        """Count booking rows, by their route, status and creation day."""
+        for row in rows:
+            self.add_count(row["route_id"], row.get("status"), 1)
+            day = _day(row.get("created_at"))
+            if day:
+                self.by_day[day] = self.by_day.get(day, 0) + 1
+
+    def set_seats(self, route_id: str, travel_date: str, state: SeatState) -> None:
+        """Record a seat state unless a newer one is already known."""
+        key = (route_id, travel_date)
+        previous = self.seats.get(key)
+        if previous is not None and previous[0] > state.version:
+            return
+        booked = state.total_seats - state.available_count
+        self.seats[key] = (state.version, booked, state.total_seats)
+        sums = self.route_seats.setdefault(route_id, [0, 0])
+        if previous is not None:
+            sums[0] -= previous[1]
+            sums[1] -= previous[2]
+        sums[0] += booked
+        sums[1] += state.total_seats
+
+    def booked_seats(self, route_id: str, travel_date: str) -> Optional[int]:
+        entry = self.seats.get((route_id, travel_date))
+        return entry[1] if entry else None
+
+    def revenue(self, snapshot: CatalogSnapshot) -> Dict[str, float]:
+        """Revenue per currency, at each route's current fares."""
+        revenue: Dict[str, float] = {}
+        for route_id, count in self.route_bookings.items():
+            prices = snapshot.by_id.get(route_id, {}).get("prices", {})
+            for currency, price in prices.items():
+                revenue[currency] = revenue.get(currency, 0.0) + price * count
+        return revenue
+
+
+class Dashboard:
+    """
+    Keeps DashboardTotals current and reconciles them with the database.
+
+    Args:
+        db (Store): Data-access layer.
+        catalog (RouteCatalog): Source of routes and prices.
+        reconcile_interval (float): Seconds between reloads of the totals.
+        recent_size (int): Recent bookings listed on the dashboard.
+        clock: Wall-clock time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        db: Store,
+        catalog: RouteCatalog,
+        reconcile_interval: float = 900.0,
+        recent_size: int = 10,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.db = db
+        self.catalog = catalog
+        self.reconcile_interval = reconcile_interval
+        self.recent_size = recent_size
+        self.clock = clock
+        self.totals = DashboardTotals(recent_size)
+        self.reconciled_at: Optional[float] = None
+        # Events seen while a reconciliation is reading, replayed onto its result
+        self._replay: Optional[List[Tuple[str, tuple]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def record_bookings(self, rows: List[Row]) -> None:
+        """Fold in bookings created together on one route, here or by another worker."""
+        if not rows:
+            return
+        self.totals.add_bookings(rows)
+        self.totals.recent.appendleft(_recent_entry(rows))
+        if self._replay is not None:
+            self._replay.append(("bookings", (rows,)))
+
+    def record_seats(self, route_id: str, travel_date: str, state: SeatState) -> None:
+        """Fold in a seat inventory change for today onwards; usable as SeatInventory.on_change."""
+        if travel_date < self.today():
+            return
+        self.totals.set_seats(route_id, travel_date, state)
+        if self._replay is not None:
+            self._replay.append(("seats", (route_id, travel_date, state)))
+
+    def today(self) -> str:
+        return datetime.fromtimestamp(self.clock(), timezone.utc).date().isoformat()
+
+    async def reconcile(self) -> None:
+        """
+        Reload the totals from the database.
+
+        Booking counts come from the ``dashboard_totals`` aggregate, seat
+        rows only for today onwards. Events that arrive meanwhile are
+        applied again on top of the reloaded totals, skipping bookings the
+        aggregate already counted: it lists the ids of bookings created
+        shortly before the reload started for that.
+        """
+        if self._replay is not None:
+            return
+        self._replay = []
+        today = self.today()
+        started = datetime.fromtimestamp(self.clock() - REPLAY_MARGIN, timezone.utc)
+        try:
+            aggregate = await self.db.rpc("dashboard_totals", {
+                "today": today, "recent_since": started.isoformat(),
+            })
+            recent = await self.db.select(
+                "bookings", ",".join(DASHBOARD_FIELDS),
+                order="created_at.desc,booking_id.desc", limit=self.recent_size,
+            )
+            seat_rows = await self.db.select(
+                SEAT_TABLE, "route_id,travel_date,booked_mask,version,total_seats",
+                [("travel_date", f"gte.{today}")],
+            )
+        except BaseException:
+            self._replay = None
+            raise
+
+        totals = DashboardTotals(self.recent_size)
+        for row in aggregate["totals"]:
+            totals.add_count(row["route_id"], row["status"], int(row["bookings"]))
+            if row["today"]:
+                totals.by_day[today] = totals.by_day.get(today, 0) + int(row["today"])
+        for row in seat_rows:
+            totals.set_seats(row["route_id"], row["travel_date"], SeatState(
+                booked_mask=int(row["booked_mask"]),
+                version=int(row["version"]),
+                total_seats=int(row["total_seats"]),
+            ))
+        totals.recent.extend(_recent_entry([row]) for row in recent)
+        seen = set(aggregate["recent_ids"])
+        listed = {entry["booking_id"] for entry in totals.recent}
+        replay, self._replay = self._replay, None
+        for kind, args in replay:
+            if kind == "seats":
+                totals.set_seats(*args)
+                continue
+            rows = [row for row in args[0] if row["booking_id"] not in seen]
+            if rows:
+                totals.add_bookings(rows)
+            rows = [row for row in args[0] if row["booking_id"] not in listed]
+            if rows:
+                totals.recent.appendleft(_recent_entry(rows))
+        self.totals = totals
+        self.reconciled_at = self.clock()
+
+    async def summary(self, active_buses: int) -> Row:
+        """Dashboard stats and per-route figures, O(routes)."""
+        snapshot = await self.catalog.get()
+        totals = self.totals
+        revenue = totals.revenue(snapshot)
+        routes = []
+        for route in snapshot.routes:
+            route_id = route["route_id"]
+            bookings = totals.route_bookings.get(route_id, 0)
+            booked, capacity = totals.route_seats.get(route_id, (0, 0))
+            routes.append({
+                "route_id": route_id,
+                "origin": route.get("origin"),
+                "destination": route.get("destination"),
+                "bookings": bookings,
+                "revenue": round(route.get("prices", {}).get("USD", 0.0) * bookings, 2),
+                "booked_seats": booked,
+                "occupancy_percentage": round(100 * booked / capacity, 1) if capacity else 0.0,
+            })
+        return {
+            "stats": {
+                "total_bookings": totals.total_bookings,
+                "today_bookings": totals.by_day.get(self.today(), 0),
+                "active_buses": active_buses,
+                "total_revenue": round(revenue.get("KES", 0.0), 2),
+                "revenue": {c: round(v, 2) for c, v in revenue.items()},
+                "bookings_by_status": dict(totals.by_status),
+            },
+            "routes": routes,
+            "recent_bookings": [_priced(entry, snapshot) for entry in totals.recent],
+            "reconciled_at": (
+                datetime.fromtimestamp(self.reconciled_at, timezone.utc).isoformat()
+                if self.reconciled_at else None
+            ),
+        }
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Dashboard reconciliation failed: {e}")
+            await asyncio.sleep(self.reconcile_interval)
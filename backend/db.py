@@ -0,0 +1,356 @@
+"""
+Async data-access layer for the Supabase PostgREST API.
+
+All handlers share one pooled ``httpx.AsyncClient`` so that database round
+trips overlap instead of blocking the event loop. The pool size, per-call
+timeout and number of in-flight requests are bounded per worker.
+
+Handlers only use the table operations of ``Store``, so storage is
+pluggable: ``Database`` talks to Supabase, ``sqlite_store.SqliteStore``
+keeps the same tables in a local SQLite file.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+import asyncio
+import time
+
+import async_timeout
+import httpx
+
+# Query filters in PostgREST syntax, e.g. {"route_id": "eq.123"} or
+# [("created_at", "gte.2024-01-01"), ("created_at", "lt.2024-02-01")]
+Filters = Union[Mapping[str, str], Sequence[Tuple[str, str]]]
+
+# Called after every call with (operation, table or function, status, seconds)
+Observer = Callable[[str, str, int, float], None]
+
+OPERATIONS = {"GET": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+
+def _operation(method: str, path: str) -> Tuple[str, str]:
+    """("select", "bookings") for GET /bookings, ("rpc", "fn") for POST /rpc/fn"""
+    target = path.lstrip("/")
+    if target.startswith("rpc/"):
+        return "rpc", target[4:]
+    return OPERATIONS.get(method, method.lower()), target
+
+
+class PostgrestError(Exception):
+    """Raised when a PostgREST call fails, times out or cannot connect."""
+
+    def __init__(self, status_code: int, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.code = code
+
+    @classmethod
+    def from_response(cls, response: httpx.Response) -> "PostgrestError":
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if not isinstance(body, dict):
+            body = {}
+        message = body.get("message") or response.text or response.reason_phrase
+        return cls(response.status_code, message, body.get("code"))
+
+
+def _params(filters: Optional[Filters]) -> List[Tuple[str, str]]:
+    if not filters:
+        return []
+    if isinstance(filters, Mapping):
+        return list(filters.items())
+    return list(filters)
+
+
+class Store(ABC):
+    """
+    Table storage: select, insert, update and named functions.
+
+    Filters, orders and select lists use PostgREST syntax whatever the
+    backend, and failures raise ``PostgrestError`` with PostgREST status
+    codes, e.g. 409 and code 23505 for a duplicate key.
+    """
+
+    @abstractmethod
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Optional[Filters] = None,
+        *,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Select the matching rows."""
+
+    async def select_one(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Optional[Filters] = None,
+        *,
+        timeout: Optional[float] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Select the first matching row, or None."""
+        rows = await self.select(table, columns, filters, limit=1, timeout=timeout)
+        return rows[0] if rows else None
+
+    @abstractmethod
+    async def insert(
+        self,
+        table: str,
+        rows: Union[Dict[str, Any], List[Dict[str, Any]]],
+        *,
+        on_conflict: Optional[str] = None,
+        resolution: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Insert one or many rows and return them."""
+
+    @abstractmethod
+    async def update(
+        self,
+        table: str,
+        values: Dict[str, Any],
+        filters: Filters,
+        *,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Update the rows matching ``filters`` and return them."""
+
+    @abstractmethod
+    async def rpc(
+        self,
+        function: str,
+        params: Optional[Dict[str, Any]] = None,
+        *,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Call a named function."""
+
+    async def close(self) -> None:
+        pass
+
+
+class Database(Store):
+    """
+    Pooled async client for the PostgREST endpoint of a Supabase project.
+
+    Args:
+        url (str): Supabase project URL.
+        key (str): API key sent as ``apikey`` and bearer token.
+        max_connections (int): Upper bound on open HTTP connections.
+        max_keepalive_connections (int): Idle connections kept for reuse.
+        timeout (float): Default per-call timeout in seconds.
+        max_concurrency (int): Upper bound on in-flight calls; extra calls
+            wait for a slot within their timeout.
+        transport (httpx.AsyncBaseTransport, optional): Custom transport,
+            used to point the client at a local PostgREST stand-in.
+        observer (Observer, optional): Told the operation, table, status
+            and duration of every call, e.g. to record latency metrics.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        *,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        timeout: float = 10.0,
+        max_concurrency: int = 50,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        observer: Optional[Observer] = None,
+    ):
+        self.rest_url = url.rstrip("/") + "/rest/v1"
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+        }
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._transport = transport
+        self.observer = observer
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared HTTP client, created on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.rest_url,
+                headers=self._headers,
+                limits=self._limits,
+                timeout=self.timeout,
+                transport=self._transport,
+            )
+        return self._client
+
+    async def close(self) -> None:
+        """Close the pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: Optional[Filters] = None,
+        json: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Send one request through the pool and decode the JSON body.
+
+        The timeout covers both waiting for a concurrency slot and the
+        HTTP round trip.
+
+        Raises:
+            PostgrestError: On HTTP errors, timeouts and connection failures.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        status = 0
+        try:
+            async with async_timeout.timeout(timeout):
+                async with self._semaphore:
+                    response = await self.client.request(
+                        method,
+                        path,
+                        params=_params(params),
+                        json=json,
+                        headers=headers,
+                    )
+            status = response.status_code
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            status = 504
+            raise PostgrestError(504, f"{method} {path} timed out after {timeout}s")
+        except httpx.HTTPError as e:
+            status = 503
+            raise PostgrestError(503, f"{method} {path} failed: {e}")
+        finally:
+            if self.observer is not None:
+                self.observer(*_operation(method, path), status, time.perf_counter() - start)
+
+        if response.status_code >= 400:
+            raise PostgrestError.from_response(response)
+        if not response.content:
+            return None
+        return response.json()
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Optional[Filters] = None,
+        *,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Select rows from a table.
+
+        Args:
+            table (str): Table name.
+            columns (str): PostgREST select list, may embed related tables.
+            filters (Filters, optional): Column filters in PostgREST syntax.
+            order (str, optional): Order clause, e.g. ``"created_at.desc"``.
+            limit (int, optional): Maximum number of rows.
+            offset (int, optional): Number of rows to skip.
+
+        Returns:
+            List[Dict[str, Any]]: Matching rows
+        """
+        params = [("select", columns)] + _params(filters)
+        if order:
+            params.append(("order", order))
+        if limit is not None:
+            params.append(("limit", str(limit)))
+        if offset:
+            params.append(("offset", str(offset)))
+        return await self.request("GET", f"/{table}", params=params, timeout=timeout) or []
+
+    async def insert(
+        self,
+        table: str,
+        rows: Union[Dict[str, Any], List[Dict[str, Any]]],
+        *,
+        on_conflict: Optional[str] = None,
+        resolution: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Insert one or many rows and return them as stored.
+
+        Args:
+            on_conflict (str, optional): Comma-separated unique columns.
+            resolution (str, optional): ``"merge-duplicates"`` to upsert or
+                ``"ignore-duplicates"`` to skip rows that already exist.
+        """
+        prefer = "return=representation"
+        if resolution:
+            prefer += f",resolution={resolution}"
+        params = [("on_conflict", on_conflict)] if on_conflict else None
+        return await self.request(
+            "POST",
+            f"/{table}",
+            params=params,
+            json=rows,
+            headers={"Prefer": prefer},
+            timeout=timeout,
+        ) or []
+
+    async def update(
+        self,
+        table: str,
+        values: Dict[str, Any],
+        filters: Filters,
+        *,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Update the rows matching ``filters`` and return them."""
+        return await self.request(
+            "PATCH",
+            f"/{table}",
+            params=filters,
+            json=values,
+            headers={"Prefer": "return=representation"},
+            timeout=timeout,
+        ) or []
+
+    async def rpc(
+        self,
+        function: str,
+        params: Optional[Dict[str, Any]] = None,
+        *,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Call a Postgres function exposed by PostgREST."""
+        return await self.request(
+            "POST", f"/rpc/{function}", json=params or {}, timeout=timeout
+        )
+
+
+def eq(value: Any) -> str:
+    """PostgREST equality filter."""
+    return f"eq.{value}"
+
+
+def in_(values) -> str:
+    """PostgREST membership filter; values are quoted so commas are safe."""
+    quoted = ",".join('"{}"'.format(str(v).replace('"', '\\"')) for v in values)
+    return f"in.({quoted})"
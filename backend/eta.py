@@ -0,0 +1,75 @@
+"""
+Progress and ETA of buses along their route polylines.
+
+A route's polyline runs from ``origin_coords`` through ``waypoints`` to
+``destination_coords``. The vectorized work happens in a
+``geometry.FleetGeometry`` per catalog version; that module (and NumPy) is
+imported when the first geometry is built rather than at startup.
+"""
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+import math
+
+from catalog import CatalogSnapshot, RouteCatalog
+
+if TYPE_CHECKING:
+    from geometry import FleetGeometry
+
+Row = Dict[str, Any]
+
+FIELDS = ("progress_percentage", "distance_covered_km", "distance_remaining_km", "off_route_km", "eta")
+
+
+def _round(value: float, digits: int) -> Optional[float]:
+    return None if math.isnan(value) else round(float(value), digits)
+
+
+class EtaEngine:
+    """
+    Keeps a FleetGeometry in step with the route catalog.
+
+    Args:
+        catalog (RouteCatalog): Source of routes.
+    """
+
+    def __init__(self, catalog: RouteCatalog):
+        self.catalog = catalog
+        self._geometry: Optional["FleetGeometry"] = None
+
+    async def geometry(self) -> "FleetGeometry":
+        snapshot: CatalogSnapshot = await self.catalog.get()
+        geometry = self._geometry
+        if geometry is None or geometry.version != snapshot.version:
+            from geometry import FleetGeometry
+
+            geometry = self._geometry = FleetGeometry(snapshot.version, snapshot.routes)
+        return geometry
+
+    def estimate(self, positions: Sequence[Tuple[str, float, float]], now: float) -> List[Row]:
+        """
+        Progress fields for (route_id, lat, lon) positions in one batch.
+
+        Uses the last geometry built by ``geometry()``; fields are None until
+        then and for routes it does not know.
+
+        Returns:
+            List[Row]: ``progress_percentage``, ``distance_covered_km``,
+            ``distance_remaining_km``, ``off_route_km`` and ``eta`` (ISO) per
+            position
+        """
+        if self._geometry is None or not positions:
+            return [dict.fromkeys(FIELDS) for _ in positions]
+        route_ids, lats, lons = zip(*positions)
+        located = self._geometry.locate(route_ids, lats, lons)
+        results = []
+        for i in range(len(positions)):
+            eta_seconds = located["eta_seconds"][i]
+            results.append({
+                "progress_percentage": _round(located["progress"][i] * 100, 1),
+                "distance_covered_km": _round(located["covered_m"][i] / 1000, 1),
+                "distance_remaining_km": _round(located["remaining_m"][i] / 1000, 1),
+                "off_route_km": _round(located["off_route_m"][i] / 1000, 2),
+                "eta": None if math.isnan(eta_seconds) else datetime.fromtimestamp(
+                    now + float(eta_seconds), timezone.utc).isoformat(),
+            })
+        return results
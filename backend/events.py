@@ -0,0 +1,168 @@
+"""
+Change events broadcast between the workers on one host.
+
+Each worker binds a Unix datagram socket in a shared directory (ideally on
+a tmpfs such as /dev/shm). Publishing sends the event to every other
+socket in that directory, so a change made by one worker reaches the
+others' caches within milliseconds without polling or a broker. Delivery
+is best effort, like any datagram: an event a busy peer cannot take is
+dropped and counted, and caches keep their TTLs as a backstop.
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Datagrams larger than this are not sent; events are a few hundred bytes
+MAX_EVENT_SIZE = 16 * 1024
+
+
+class Event(NamedTuple):
+    """
+    A change to one thing, e.g. topic "seats" and key "<route>/<date>".
+
+    ``version`` orders events about the same key; consumers ignore
+    versions older than what they have.
+    """
+    topic: str
+    key: Optional[str]
+    version: int
+    data: Dict[str, Any]
+    origin: str
+
+
+class EventBus:
+    """
+    Host-local publish/subscribe over Unix datagram sockets.
+
+    Args:
+        directory (str): Where every worker's socket lives.
+        enabled (bool): When False, or when sockets are unavailable,
+            publishing does nothing and no events arrive.
+    """
+
+    def __init__(self, directory: str, enabled: bool = True):
+        self.directory = directory
+        self.enabled = enabled
+        self.name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.path = os.path.join(directory, f"{self.name}.sock")
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+        self._handlers: Dict[str, List[Callable[[Event], Any]]] = {}
+        self._sock: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def running(self) -> bool:
+        return self._sock is not None
+
+    def subscribe(self, topic: str, handler: Callable[[Event], Any]) -> None:
+        """Call ``handler`` with each event on ``topic`` from other workers."""
+        self._handlers.setdefault(topic, []).append(handler)
+
+    async def start(self) -> None:
+        """Bind this worker's socket and start receiving."""
+        if not self.enabled or self._sock is not None:
+            return
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.bind(self.path)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"Event bus unavailable, caches rely on TTLs: {e}")
+            return
+        self._sock = sock
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(sock.fileno(), self._receive)
+
+    async def stop(self) -> None:
+        if self._sock is None:
+            return
+        self._loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def publish(self, topic: str, key: Optional[str] = None, version: Optional[int] = None, **data: Any) -> int:
+        """
+        Send an event to every other worker.
+
+        Args:
+            topic (str): e.g. "routes", "seats" or "rates".
+            key (str, optional): What changed within the topic.
+            version (int, optional): Defaults to the current time in
+                nanoseconds, which orders events from the same host.
+
+        Returns:
+            int: Number of workers the event was sent to
+        """
+        if self._sock is None:
+            return 0
+        payload = json.dumps({
+            "topic": topic,
+            "key": key,
+            "version": time.time_ns() if version is None else version,
+            "data": data,
+            "origin": self.name,
+        }, separators=(",", ":")).encode()
+        if len(payload) > MAX_EVENT_SIZE:
+            raise ValueError(f"Event too large: {len(payload)} bytes")
+        delivered = 0
+        for peer in self._peers():
+            try:
+                self._sock.sendto(payload, peer)
+                delivered += 1
+            except BlockingIOError:
+                # The peer's receive buffer is full
+                self.dropped += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # A worker that exited without removing its socket
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            except OSError as e:
+                logger.warning(f"Event to {peer} not sent: {e}")
+                self.dropped += 1
+        self.sent += delivered
+        return delivered
+
+    def _peers(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        own = f"{self.name}.sock"
+        return [os.path.join(self.directory, name) for name in names if name.endswith(".sock") and name != own]
+
+    def _receive(self) -> None:
+        while self._sock is not None:
+            try:
+                payload = self._sock.recv(MAX_EVENT_SIZE)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                logger.error(f"Event bus receive failed: {e}")
+                return
+            try:
+                event = Event(**json.loads(payload))
+            except (ValueError, TypeError) as e:
+                logger.warning(f"Ignoring malformed event: {e}")
+                continue
+            self.received += 1
+            for handler in self._handlers.get(event.topic, ()):
+                try:
+                    handler(event)
+                except Exception as e:
+                    logger.error(f"Event handler for {event.topic} failed: {e}")
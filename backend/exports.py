@@ -0,0 +1,121 @@
+"""
+Streaming bulk exports of bookings.
+
+Bookings are read in keyset-ordered pages and written out page by page as
+NDJSON or CSV, so an export holds at most two pages in memory (the one
+being written and the one being prefetched) however many rows it covers,
+and the first bytes go out as soon as the first page is read.
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import csv
+import io
+import json
+
+from catalog import RouteCatalog
+from db import Database, Filters
+from pagination import after, order
+
+Row = Dict[str, Any]
+
+FORMATS = ("ndjson", "csv")
+
+BOOKING_COLUMNS = (
+    "booking_id", "user_id", "route_id", "bus_id", "travel_date", "seat_number",
+    "status", "created_at",
+)
+ROUTE_COLUMNS = ("origin", "destination", "country_origin", "country_destination")
+EXPORT_COLUMNS = BOOKING_COLUMNS + ROUTE_COLUMNS + ("price", "currency", "formatted_price")
+
+
+async def booking_pages(
+    db: Database,
+    filters: Filters,
+    sort: Sequence[str] = ("created_at", "booking_id"),
+    page_size: int = 1000,
+) -> AsyncIterator[List[Row]]:
+    """
+    Bookings matching ``filters`` in ascending ``sort`` order, page by page.
+
+    The next page is requested before the current one is handed out, so
+    reading overlaps with whatever the consumer does with it.
+    """
+    filters = list(filters.items() if isinstance(filters, dict) else filters)
+    columns = ",".join(BOOKING_COLUMNS)
+
+    def fetch(last: Optional[Row]) -> asyncio.Future:
+        page_filters = filters if last is None else filters + [
+            after(sort, [last[c] for c in sort], descending=False)
+        ]
+        return asyncio.ensure_future(db.select(
+            "bookings", columns, page_filters,
+            order=order(sort, descending=False), limit=page_size,
+        ))
+
+    pending: Optional[asyncio.Future] = fetch(None)
+    try:
+        while pending is not None:
+            rows = await pending
+            pending = fetch(rows[-1]) if len(rows) == page_size else None
+            if rows:
+                yield rows
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+def export_row(booking: Row, route: Optional[Row], currency: str) -> Row:
+    """A booking joined with its route and price in ``currency``."""
+    row = {column: booking.get(column) for column in BOOKING_COLUMNS}
+    route = route or {}
+    for column in ROUTE_COLUMNS:
+        row[column] = route.get(column)
+    row["price"] = route.get("prices", {}).get(currency)
+    row["currency"] = currency
+    row["formatted_price"] = route.get("formatted_prices", {}).get(currency)
+    return row
+
+
+def ndjson_chunk(rows: List[Row]) -> str:
+    return "".join(json.dumps(row, separators=(",", ":"), default=str) + "\n" for row in rows)
+
+
+def csv_chunk(rows: List[Row], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+async def export_bookings(
+    db: Database,
+    catalog: RouteCatalog,
+    filters: Filters,
+    *,
+    fmt: str = "ndjson",
+    currency: str = "USD",
+    sort: Tuple[str, str] = ("created_at", "booking_id"),
+    page_size: int = 1000,
+) -> AsyncIterator[str]:
+    """
+    Encoded export chunks, one per page of bookings.
+
+    Args:
+        db (Database): Data-access layer.
+        catalog (RouteCatalog): Source of route details and prices.
+        filters (Filters): Booking filters, e.g. a date range.
+        fmt (str): "ndjson" or "csv"; CSV starts with a header row.
+        currency (str): Currency of the exported prices.
+        sort (Tuple[str, str]): Export order, unique when taken together.
+        page_size (int): Rows per database read.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if fmt == "csv":
+        yield csv_chunk([], header=True)
+    async for page in booking_pages(db, filters, sort, page_size):
+        snapshot = await catalog.get()
+        rows = [export_row(b, snapshot.by_id.get(b.get("route_id")), currency) for b in page]
+        yield csv_chunk(rows) if fmt == "csv" else ndjson_chunk(rows)
@@ -0,0 +1,36 @@
+"""
+Fast JSON responses for large payloads the server builds itself.
+
+FastAPI validates a handler's return value against its response model and
+runs it through ``jsonable_encoder`` before the standard encoder, which is
+most of the CPU cost of a long list. ``JSONBytesResponse`` skips both: it
+takes data already in response shape, or bytes serialized earlier, and
+encodes with orjson when it is installed.
+"""
+from typing import Any
+import json
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the standard encoder is used instead
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON, as Starlette's JSONResponse renders it."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+class JSONBytesResponse(Response):
+    """JSON from plain data or pre-serialized bytes, without validation."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
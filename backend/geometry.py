@@ -0,0 +1,129 @@
+"""
+Route polylines packed into NumPy arrays for vectorized positioning.
+
+For each catalog version the polylines of all routes are packed once into
+padded arrays of segments, with the haversine length of every segment and
+the distance covered before it. Locating buses is then a single vectorized
+pass: each position is projected onto every segment of its route in a
+local flat approximation, snapped to the nearest one, and turned into
+distance covered, distance remaining and an ETA at the route's scheduled
+average speed.
+
+Importing this module loads NumPy, so it is only imported once the first
+geometry is built.
+"""
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+Row = Dict[str, Any]
+
+EARTH_RADIUS_M = 6_371_000.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres; accepts scalars or arrays in degrees."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def polyline(route: Row) -> List[Tuple[float, float]]:
+    """Route vertices in order, without missing or repeated points."""
+    points = []
+    for point in [route.get("origin_coords"), *(route.get("waypoints") or []), route.get("destination_coords")]:
+        if not point or len(point) != 2:
+            continue
+        point = (float(point[0]), float(point[1]))
+        if not points or points[-1] != point:
+            points.append(point)
+    return points
+
+
+class FleetGeometry:
+    """
+    Segments of every route of one catalog version as padded arrays.
+
+    Routes with fewer than two distinct points cannot be located on and
+    are left out.
+
+    Args:
+        version (int): Catalog version the geometry was built from.
+        routes: Catalog routes.
+    """
+
+    def __init__(self, version: int, routes: Sequence[Row]):
+        self.version = version
+        lines = [(route, polyline(route)) for route in routes]
+        lines = [(route, points) for route, points in lines if len(points) >= 2]
+        self.index: Dict[str, int] = {route["route_id"]: i for i, (route, _) in enumerate(lines)}
+
+        count = len(lines)
+        width = max((len(points) - 1 for _, points in lines), default=1)
+        self.starts = np.zeros((count, width, 2))
+        self.ends = np.zeros((count, width, 2))
+        self.valid = np.zeros((count, width), dtype=bool)
+        for i, (_, points) in enumerate(lines):
+            vertices = np.asarray(points)
+            n = len(points) - 1
+            self.starts[i, :n] = vertices[:-1]
+            self.ends[i, :n] = vertices[1:]
+            self.valid[i, :n] = True
+
+        lengths = haversine_m(self.starts[..., 0], self.starts[..., 1], self.ends[..., 0], self.ends[..., 1])
+        self.lengths = np.where(self.valid, lengths, 0.0)
+        self.offsets = np.cumsum(self.lengths, axis=1) - self.lengths
+        self.totals = self.lengths.sum(axis=1)
+        hours = np.array([float(route.get("duration_hours") or 0) for route, _ in lines])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.speeds = np.where(hours > 0, self.totals / (hours * 3600), np.nan)
+
+    def locate(self, route_ids: Sequence[str], lats, lons) -> Dict[str, np.ndarray]:
+        """
+        Snap positions to their routes' polylines.
+
+        Returns:
+            Dict[str, np.ndarray]: ``covered_m``, ``remaining_m``,
+            ``progress`` (0 to 1), ``off_route_m`` and ``eta_seconds`` per
+            position; NaN where the route is unknown or has no speed
+        """
+        rows = np.array([self.index.get(route_id, -1) for route_id in route_ids], dtype=int)
+        known = rows >= 0
+        rows = np.where(known, rows, 0)
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        nan = np.full(len(rows), np.nan)
+        if not len(self.index) or not len(rows):
+            return {name: nan for name in ("covered_m", "remaining_m", "progress", "off_route_m", "eta_seconds")}
+
+        # Flat coordinates around each position: degrees of latitude and
+        # longitude scaled by cos(latitude), shape (positions, segments)
+        scale = np.cos(np.radians(lats))[:, None]
+        starts, ends = self.starts[rows], self.ends[rows]
+        ay = starts[..., 0] - lats[:, None]
+        ax = (starts[..., 1] - lons[:, None]) * scale
+        dy = ends[..., 0] - starts[..., 0]
+        dx = (ends[..., 1] - starts[..., 1]) * scale
+        squared = dx * dx + dy * dy
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(squared > 0, -(ax * dx + ay * dy) / squared, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        gap = (ax + t * dx) ** 2 + (ay + t * dy) ** 2
+        gap = np.where(self.valid[rows], gap, np.inf)
+
+        nearest = np.argmin(gap, axis=1)
+        picked = np.arange(len(rows))
+        covered = self.offsets[rows, nearest] + t[picked, nearest] * self.lengths[rows, nearest]
+        totals = self.totals[rows]
+        remaining = totals - covered
+        with np.errstate(divide="ignore", invalid="ignore"):
+            progress = np.where(totals > 0, covered / totals, 0.0)
+            eta_seconds = remaining / self.speeds[rows]
+        off_route = np.radians(np.sqrt(gap[picked, nearest])) * EARTH_RADIUS_M
+        return {
+            "covered_m": np.where(known, covered, nan),
+            "remaining_m": np.where(known, remaining, nan),
+            "progress": np.where(known, progress, nan),
+            "off_route_m": np.where(known, off_route, nan),
+            "eta_seconds": np.where(known, eta_seconds, nan),
+        }
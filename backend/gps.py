@@ -0,0 +1,229 @@
+"""
+High-rate GPS ingestion with write-behind persistence.
+
+Pings arrive in batches from many buses. Each bus keeps its recent
+positions in a fixed-size ring buffer, and the buffers of the buses that
+reported least recently are dropped past a fleet-size cap. Pings of unknown
+buses, near-duplicate and out-of-order points and points stamped in the
+future are dropped on arrival, and each batch's accepted points are pushed
+to live tracking together, straight away. The database only sees a
+periodic bulk write: one function call that stores the accepted track
+points and moves every bus to its latest position.
+"""
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Container, Deque, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import logging
+import math
+import time
+
+from db import Database
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6_371_000.0
+
+
+class Ping(NamedTuple):
+    bus_id: str
+    lat: float
+    lon: float
+    recorded_at: float
+    status: Optional[str] = None
+
+    def to_event(self) -> Dict[str, Any]:
+        return {
+            "bus_id": self.bus_id,
+            "current_location": [self.lat, self.lon],
+            "status": self.status,
+            "updated_at": to_iso(self.recorded_at),
+        }
+
+
+def to_iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def approx_distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Equirectangular distance, accurate enough at the scale of a few km."""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+
+class GpsIngestor:
+    """
+    Buffers GPS pings per bus and persists them in periodic bulk writes.
+
+    Args:
+        db (Database): Data-access layer.
+        publish: Called once per batch with the (bus_id, event) pairs of
+            its accepted pings.
+        buffer_size (int): Recent positions kept per bus.
+        max_buses (int): Buses buffered at once; a new bus past this takes
+            the buffer of the one that reported least recently.
+        max_skew (float): Seconds ``recorded_at`` may lie ahead of the
+            clock, for drift between bus and server clocks.
+        min_distance_m (float): Pings closer than this to the last accepted
+            one are dropped unless ``min_interval`` has passed...
+        min_interval (float): ...seconds, so parked buses still report now
+            and then.
+        flush_interval (float): Seconds between bulk writes.
+        max_pending (int): Track points kept for a failing database before
+            the oldest are dropped.
+        clock: Wall-clock time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        publish: Optional[Callable[[List[Tuple[str, Dict[str, Any]]]], Any]] = None,
+        buffer_size: int = 120,
+        max_buses: int = 10_000,
+        max_skew: float = 30.0,
+        min_distance_m: float = 15.0,
+        min_interval: float = 60.0,
+        flush_interval: float = 5.0,
+        max_pending: int = 100_000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.db = db
+        self.publish = publish
+        self.buffer_size = buffer_size
+        self.max_buses = max_buses
+        self.max_skew = max_skew
+        self.min_distance_m = min_distance_m
+        self.min_interval = min_interval
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.accepted = 0
+        self.dropped = 0
+        # Least recently reporting bus first
+        self._buffers: "OrderedDict[str, Deque[Ping]]" = OrderedDict()
+        self._pending: Deque[Ping] = deque(maxlen=max_pending)
+        self._task: Optional[asyncio.Task] = None
+
+    def ingest(
+        self,
+        pings: List[Tuple[str, float, float, Optional[float], Optional[str]]],
+        known: Optional[Container[str]] = None,
+    ) -> Tuple[int, int]:
+        """
+        Buffer a batch of (bus_id, lat, lon, recorded_at, status) pings.
+
+        ``recorded_at`` (epoch seconds) defaults to now and a missing
+        status carries over from the bus's previous ping. Coordinates must
+        already be validated. Pings of buses not in ``known``, when given,
+        and pings recorded more than ``max_skew`` seconds ahead of now are
+        dropped.
+
+        Returns:
+            Tuple[int, int]: Accepted and dropped ping counts
+        """
+        now = self.clock()
+        accepted: List[Ping] = []
+        for bus_id, lat, lon, recorded_at, status in pings:
+            if known is not None and bus_id not in known:
+                continue
+            if recorded_at is not None and recorded_at > now + self.max_skew:
+                continue
+            buffer = self._buffers.get(bus_id)
+            if buffer is None:
+                if len(self._buffers) >= self.max_buses:
+                    self._buffers.popitem(last=False)
+                buffer = self._buffers[bus_id] = deque(maxlen=self.buffer_size)
+                ping = Ping(bus_id, lat, lon, recorded_at or now, status)
+            else:
+                last = buffer[-1]
+                ping = Ping(bus_id, lat, lon, recorded_at or now, status or last.status)
+                if not self._keep(last, ping):
+                    continue
+                self._buffers.move_to_end(bus_id)
+            buffer.append(ping)
+            self._pending.append(ping)
+            accepted.append(ping)
+        if self.publish is not None and accepted:
+            self.publish([(ping.bus_id, ping.to_event()) for ping in accepted])
+        self.accepted += len(accepted)
+        self.dropped += len(pings) - len(accepted)
+        return len(accepted), len(pings) - len(accepted)
+
+    def _keep(self, last: Ping, ping: Ping) -> bool:
+        if ping.recorded_at <= last.recorded_at:
+            return False
+        if ping.status != last.status:
+            return True
+        if ping.recorded_at - last.recorded_at >= self.min_interval:
+            return True
+        return approx_distance_m(last.lat, last.lon, ping.lat, ping.lon) >= self.min_distance_m
+
+    def latest(self, bus_id: str) -> Optional[Ping]:
+        buffer = self._buffers.get(bus_id)
+        return buffer[-1] if buffer else None
+
+    def recent(self, bus_id: str, limit: Optional[int] = None) -> List[Ping]:
+        """Buffered positions of a bus, oldest first."""
+        buffer = self._buffers.get(bus_id)
+        if not buffer:
+            return []
+        pings = list(buffer)
+        return pings[-limit:] if limit else pings
+
+    def latest_positions(self) -> Dict[str, Ping]:
+        return {bus_id: buffer[-1] for bus_id, buffer in self._buffers.items() if buffer}
+
+    async def flush(self) -> int:
+        """
+        Write all buffered track points in one ``record_bus_positions`` call.
+
+        On failure the points stay queued for the next flush.
+
+        Returns:
+            int: Number of track points written
+        """
+        if not self._pending:
+            return 0
+        points, self._pending = list(self._pending), deque(maxlen=self._pending.maxlen)
+        try:
+            await self.db.rpc("record_bus_positions", {"points": [
+                {
+                    "bus_id": p.bus_id,
+                    "location": [p.lat, p.lon],
+                    "status": p.status,
+                    "recorded_at": to_iso(p.recorded_at),
+                }
+                for p in points
+            ]})
+        except Exception:
+            # Requeue ahead of anything that arrived meanwhile; past the cap
+            # the oldest points are the ones dropped
+            self._pending = deque(points + list(self._pending), maxlen=self._pending.maxlen)
+            raise
+        return len(points)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush loop and write out what is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Final GPS flush failed: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"GPS flush failed: {e}")
@@ -0,0 +1,125 @@
+"""
+Dependency health checked in the background.
+
+Load balancers and orchestrators probe every worker every few seconds.
+Instead of a database query per probe, a ``HealthProber`` checks each
+dependency once per interval and probes read the cached result, so the
+load on dependencies does not depend on how often workers are probed.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+Check = Callable[[], Awaitable[Any]]
+
+
+class HealthProber:
+    """
+    Runs dependency checks on an interval and caches their outcome.
+
+    Args:
+        checks (Dict[str, Check]): Name -> coroutine function that raises
+            when the dependency is unavailable.
+        interval (float): Seconds between rounds of checks.
+        timeout (float): Seconds a check may take before it counts as failed.
+        stale_after (float, optional): Age after which a result no longer
+            counts as ready, e.g. because the prober stalled; by default
+            three intervals.
+        clock: Wall-clock time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        checks: Dict[str, Check],
+        interval: float = 10.0,
+        timeout: float = 2.0,
+        stale_after: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.checks = checks
+        self.interval = interval
+        self.timeout = timeout
+        self.stale_after = stale_after if stale_after is not None else 3 * interval
+        self.clock = clock
+        # name -> {"ok", "error", "latency_ms", "checked_at"}
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def _check(self, name: str, check: Check) -> None:
+        start = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(check(), self.timeout)
+        except asyncio.TimeoutError:
+            error = f"timed out after {self.timeout}s"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        if error and self.results.get(name, {}).get("ok", True):
+            logger.warning(f"Health check {name} failed: {error}")
+        self.results[name] = {
+            "ok": error is None,
+            "error": error,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "checked_at": self.clock(),
+        }
+
+    async def refresh(self) -> None:
+        """Run every check once, concurrently."""
+        await asyncio.gather(*(self._check(name, check) for name, check in self.checks.items()))
+
+    def ok(self, name: str) -> Optional[bool]:
+        """Last outcome of one check, None before it first ran."""
+        result = self.results.get(name)
+        return result["ok"] if result else None
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Readiness from the cached results.
+
+        Returns:
+            Dict[str, Any]: ``ready``, ``age_seconds`` of the oldest result
+            and per-check outcomes
+        """
+        now = self.clock()
+        checks = {}
+        oldest = None
+        for name in self.checks:
+            result = self.results.get(name)
+            if result is None:
+                checks[name] = {"ok": False, "error": "not checked yet"}
+                continue
+            age = now - result["checked_at"]
+            oldest = age if oldest is None else max(oldest, age)
+            checks[name] = {**result, "age_seconds": round(age, 3)}
+        ready = all(
+            check["ok"] and check["age_seconds"] <= self.stale_after for check in checks.values()
+        )
+        return {
+            "ready": ready,
+            "age_seconds": round(oldest, 3) if oldest is not None else None,
+            "checks": checks,
+        }
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Health probing failed: {e}")
@@ -0,0 +1,230 @@
+"""
+Time-limited seat holds for checkout.
+
+A hold claims its seats in the seat inventory straight away, so they show
+as unavailable to everyone else while the customer pays, and records a
+lease in the ``seat_holds`` table. Confirming the booking turns the lease
+into a sale; otherwise the seats are released when it expires.
+
+Each worker keeps the deadlines of the holds it created in one min-heap
+served by a single background task, instead of a task or timer per hold.
+A periodic sweep also expires holds left behind by workers that stopped.
+"""
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import heapq
+import logging
+import time
+import uuid
+
+from db import Database, eq
+from seats import SEATS_PER_BUS, SeatInventory
+
+logger = logging.getLogger(__name__)
+
+TABLE = "seat_holds"
+
+
+class HoldExpiredError(Exception):
+    """Raised when a hold is unknown, expired or already used."""
+
+
+class Hold(NamedTuple):
+    hold_id: str
+    route_id: str
+    travel_date: str
+    seat_numbers: List[int]
+    total_seats: int
+    expires_at: float
+
+    def to_row(self, status: str = "held") -> Dict[str, Any]:
+        return {
+            "hold_id": self.hold_id,
+            "route_id": self.route_id,
+            "travel_date": self.travel_date,
+            "seat_numbers": self.seat_numbers,
+            "total_seats": self.total_seats,
+            "expires_at": to_iso(self.expires_at),
+            "status": status,
+        }
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "Hold":
+        return cls(
+            hold_id=row["hold_id"],
+            route_id=row["route_id"],
+            travel_date=row["travel_date"],
+            seat_numbers=list(row["seat_numbers"]),
+            total_seats=row.get("total_seats") or SEATS_PER_BUS,
+            expires_at=datetime.fromisoformat(row["expires_at"]).timestamp(),
+        )
+
+
+def to_iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class SeatHolds:
+    """
+    Issues seat holds and releases them when they expire.
+
+    Args:
+        db (Database): Data-access layer.
+        inventory (SeatInventory): Seat inventory the holds claim from.
+        ttl (float): Lease length in seconds.
+        sweep_interval (float): Seconds between sweeps for orphaned holds.
+        clock: Wall-clock time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        inventory: SeatInventory,
+        ttl: float = 600.0,
+        sweep_interval: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.db = db
+        self.inventory = inventory
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._heap: List[Tuple[float, str]] = []
+        self._pending: Dict[str, Hold] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def hold(
+        self, route_id: str, travel_date: str, seat_numbers: List[int],
+        total_seats: int = SEATS_PER_BUS,
+    ) -> Hold:
+        """
+        Claim seats for ``ttl`` seconds.
+
+        Raises:
+            SeatUnavailableError: If any seat is booked or held.
+        """
+        await self.inventory.claim(route_id, travel_date, seat_numbers, total_seats)
+        hold = Hold(
+            hold_id=str(uuid.uuid4()),
+            route_id=route_id,
+            travel_date=travel_date,
+            seat_numbers=sorted(seat_numbers),
+            total_seats=total_seats,
+            expires_at=self.clock() + self.ttl,
+        )
+        try:
+            await self.db.insert(TABLE, hold.to_row())
+        except Exception:
+            await self.inventory.release(route_id, travel_date, seat_numbers, total_seats)
+            raise
+        self._schedule(hold)
+        return hold
+
+    async def get(self, hold_id: str) -> Optional[Hold]:
+        """The hold if it is still live, i.e. neither expired nor used."""
+        row = await self.db.select_one(TABLE, "*", [
+            ("hold_id", eq(hold_id)), ("status", eq("held")), ("expires_at", f"gt.{to_iso(self.clock())}"),
+        ])
+        return Hold.from_row(row) if row else None
+
+    async def confirm(self, hold_id: str) -> Hold:
+        """
+        Turn a live hold into a sale; its seats stay booked.
+
+        Raises:
+            HoldExpiredError: If the hold is unknown, expired or already used.
+        """
+        rows = await self._transition(hold_id, "confirmed", [("expires_at", f"gt.{to_iso(self.clock())}")])
+        if not rows:
+            raise HoldExpiredError(f"Seat hold {hold_id} has expired or was already used")
+        self._pending.pop(hold_id, None)
+        return Hold.from_row(rows[0])
+
+    async def cancel(self, hold_id: str) -> bool:
+        """Release a live hold early. Returns False if it was no longer held."""
+        return await self._end(hold_id, "cancelled")
+
+    async def expire_due(self) -> int:
+        """Expire this worker's holds whose deadline has passed."""
+        now = self.clock()
+        expired = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, hold_id = heapq.heappop(self._heap)
+            # Confirmed or cancelled holds are dropped lazily here
+            if hold_id in self._pending and await self._end(hold_id, "expired"):
+                expired += 1
+        return expired
+
+    async def sweep(self) -> int:
+        """Expire overdue holds from any worker, e.g. one that was restarted."""
+        rows = await self.db.select(
+            TABLE, "hold_id",
+            [("status", eq("held")), ("expires_at", f"lt.{to_iso(self.clock())}")],
+        )
+        expired = 0
+        for row in rows:
+            if await self._end(row["hold_id"], "expired"):
+                expired += 1
+        return expired
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _schedule(self, hold: Hold) -> None:
+        self._pending[hold.hold_id] = hold
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (hold.expires_at, hold.hold_id))
+        if self._wakeup is not None and (earliest is None or hold.expires_at < earliest):
+            self._wakeup.set()
+
+    async def _transition(self, hold_id: str, status: str, extra=()) -> List[Dict[str, Any]]:
+        return await self.db.update(
+            TABLE,
+            {"status": status},
+            [("hold_id", eq(hold_id)), ("status", eq("held")), *extra],
+        )
+
+    async def _end(self, hold_id: str, status: str) -> bool:
+        rows = await self._transition(hold_id, status)
+        self._pending.pop(hold_id, None)
+        if not rows:
+            return False
+        hold = Hold.from_row(rows[0])
+        await self.inventory.release(
+            hold.route_id, hold.travel_date, hold.seat_numbers, hold.total_seats
+        )
+        return True
+
+    async def _run(self) -> None:
+        next_sweep = self.clock()
+        while True:
+            now = self.clock()
+            deadline = next_sweep
+            if self._heap:
+                deadline = min(deadline, self._heap[0][0])
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(deadline - now, 0))
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.expire_due()
+                if self.clock() >= next_sweep:
+                    await self.sweep()
+                    next_sweep = self.clock() + self.sweep_interval
+            except Exception as e:
+                logger.error(f"Seat hold expiry failed: {e}")
+                await asyncio.sleep(1)
@@ -0,0 +1,229 @@
+"""
+Multi-leg journey planning over scheduled departures.
+
+Routes and their scheduled buses form a time-dependent graph: cities are
+nodes and every bus departure is an edge that can only be taken at its
+departure time. The graph for a travel date is built once (adjacency lists
+sorted by departure time) and cached, and itineraries are found with a
+best-first search that returns the k cheapest or fastest connections.
+"""
+from bisect import bisect_left
+from datetime import date as Date, datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+import heapq
+import time
+
+from catalog import RouteCatalog
+from db import Database
+from search import normalize
+
+Row = Dict[str, Any]
+
+SORT_KEYS = ("duration", "price")
+
+
+def parse_departure(bus: Row) -> Tuple[datetime, datetime]:
+    """
+    Departure and arrival of a bus as datetimes.
+
+    ``departure_time``/``arrival_time`` are either full ISO datetimes or
+    times of day on ``date``; an arrival earlier than the departure is on a
+    following day.
+    """
+    def at(value: str) -> datetime:
+        if "T" in value:
+            return datetime.fromisoformat(value).replace(tzinfo=None)
+        return datetime.fromisoformat(f"{bus['date']}T{value}")
+
+    departs, arrives = at(bus["departure_time"]), at(bus["arrival_time"])
+    while arrives < departs:
+        arrives += timedelta(days=1)
+    return departs, arrives
+
+
+class Departure(NamedTuple):
+    departs: datetime
+    arrives: datetime
+    origin: str
+    destination: str
+    route: Row
+    bus: Row
+
+
+class JourneyGraph:
+    """
+    Adjacency lists of departures per city for a window of dates.
+
+    Args:
+        routes: Catalog routes, with ``prices`` per currency.
+        buses: Scheduled buses of those routes.
+    """
+
+    def __init__(self, routes: Tuple[Row, ...], buses: List[Row]):
+        by_id = {route["route_id"]: route for route in routes}
+        self.adjacency: Dict[str, List[Departure]] = {}
+        for bus in buses:
+            route = by_id.get(bus.get("route_id"))
+            if route is None or bus.get("status") == "cancelled":
+                continue
+            departs, arrives = parse_departure(bus)
+            origin = normalize(route["origin"])
+            self.adjacency.setdefault(origin, []).append(Departure(
+                departs, arrives, origin, normalize(route["destination"]), route, bus,
+            ))
+        self._times: Dict[str, List[datetime]] = {}
+        for city, departures in self.adjacency.items():
+            departures.sort(key=lambda d: d.departs)
+            self._times[city] = [d.departs for d in departures]
+
+    def plan(
+        self,
+        origin: str,
+        destination: str,
+        travel_date: Date,
+        *,
+        k: int = 3,
+        sort: str = "duration",
+        currency: str = "USD",
+        min_connection: timedelta = timedelta(minutes=60),
+        max_wait: timedelta = timedelta(hours=24),
+        max_legs: int = 3,
+    ) -> List[List[Departure]]:
+        """
+        Find up to ``k`` itineraries leaving ``origin`` on ``travel_date``.
+
+        Partial itineraries are expanded cheapest first. Both total duration
+        (first departure to last arrival) and total price only grow as legs
+        are added, so complete itineraries come off the heap in order. Each
+        city is expanded at most ``k`` times and no itinerary visits a city
+        twice.
+
+        Returns:
+            List[List[Departure]]: Itineraries, best first
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unsupported sort: {sort}")
+        origin, destination = normalize(origin), normalize(destination)
+        day_start = datetime.combine(travel_date, datetime.min.time())
+        day_end = day_start + timedelta(days=1)
+
+        heap: List[Tuple[float, int, str, Tuple[Departure, ...]]] = [(0.0, 0, origin, ())]
+        expanded: Dict[str, int] = {}
+        results: List[List[Departure]] = []
+        counter = 1
+        while heap and len(results) < k:
+            cost, _, city, legs = heapq.heappop(heap)
+            if city == destination and legs:
+                results.append(list(legs))
+                continue
+            expanded[city] = expanded.get(city, 0) + 1
+            if expanded[city] > k or len(legs) >= max_legs:
+                continue
+
+            if legs:
+                earliest = legs[-1].arrives + min_connection
+                latest = earliest + max_wait
+            else:
+                earliest, latest = day_start, day_end
+            visited = {origin, *(leg.destination for leg in legs)}
+            departures = self.adjacency.get(city, [])
+            for i in range(bisect_left(self._times.get(city, []), earliest), len(departures)):
+                departure = departures[i]
+                if departure.departs >= latest:
+                    break
+                if departure.destination in visited:
+                    continue
+                if sort == "price":
+                    next_cost = cost + departure.route["prices"][currency]
+                else:
+                    start = legs[0].departs if legs else departure.departs
+                    next_cost = (departure.arrives - start).total_seconds()
+                heapq.heappush(heap, (next_cost, counter, departure.destination, legs + (departure,)))
+                counter += 1
+        return results
+
+
+def describe(itinerary: List[Departure], currency: str, format_price: Callable[[float, str], str]) -> Row:
+    """Itinerary as a response dict with per-leg and total price and duration."""
+    legs = []
+    total_price = 0.0
+    for leg in itinerary:
+        price = leg.route["prices"][currency]
+        total_price += price
+        legs.append({
+            "route_id": leg.route["route_id"],
+            "bus_id": leg.bus.get("bus_id"),
+            "origin": leg.route["origin"],
+            "destination": leg.route["destination"],
+            "departure": leg.departs.isoformat(),
+            "arrival": leg.arrives.isoformat(),
+            "price": price,
+        })
+    total_price = round(total_price, 2)
+    duration = itinerary[-1].arrives - itinerary[0].departs
+    return {
+        "legs": legs,
+        "transfers": len(legs) - 1,
+        "departure": legs[0]["departure"],
+        "arrival": legs[-1]["arrival"],
+        "total_duration_hours": round(duration.total_seconds() / 3600, 2),
+        "total_price": total_price,
+        "formatted_total_price": format_price(total_price, currency),
+        "currency": currency,
+    }
+
+
+class JourneyPlanner:
+    """
+    Caches one JourneyGraph per travel date and catalog version.
+
+    Args:
+        db (Database): Data-access layer for the ``buses`` table.
+        catalog (RouteCatalog): Source of routes and prices.
+        horizon_days (int): Days after the travel date whose departures are
+            included for onward connections.
+        ttl (float): Seconds a graph is reused before buses are reloaded.
+        clock: Monotonic time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        catalog: RouteCatalog,
+        horizon_days: int = 2,
+        ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.db = db
+        self.catalog = catalog
+        self.horizon_days = horizon_days
+        self.ttl = ttl
+        self.clock = clock
+        self._graphs: Dict[Date, Tuple[int, float, JourneyGraph]] = {}
+
+    async def graph(self, travel_date: Date) -> JourneyGraph:
+        snapshot = await self.catalog.get()
+        cached = self._graphs.get(travel_date)
+        if cached and cached[0] == snapshot.version and self.clock() - cached[1] < self.ttl:
+            return cached[2]
+        last_date = travel_date + timedelta(days=self.horizon_days)
+        buses = await self.db.select(
+            "buses",
+            "bus_id,route_id,date,departure_time,arrival_time,status",
+            [("date", f"gte.{travel_date.isoformat()}"), ("date", f"lte.{last_date.isoformat()}")],
+        )
+        graph = JourneyGraph(snapshot.routes, buses)
+        # Drop graphs of other dates that have gone stale
+        now = self.clock()
+        self._graphs = {
+            day: entry for day, entry in self._graphs.items() if now - entry[1] < self.ttl
+        }
+        self._graphs[travel_date] = (snapshot.version, now, graph)
+        return graph
+
+    def invalidate(self) -> None:
+        self._graphs.clear()
+
+    async def plan(self, origin: str, destination: str, travel_date: Date, **options) -> List[List[Departure]]:
+        graph = await self.graph(travel_date)
+        return graph.plan(origin, destination, travel_date, **options)
@@ -0,0 +1,109 @@
+"""
+Non-blocking, structured logging.
+
+Records are handed to a queue and formatted and written by a listener
+thread, so a log call on the event loop costs an enqueue rather than
+string formatting and a blocking write to stderr.
+"""
+from typing import IO, Optional
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any ``extra={"fields": {...}}`` merged in."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The plain format, with any ``fields`` appended as key=value pairs."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records as they are.
+
+    ``QueueHandler.prepare`` formats the message on the calling thread; the
+    listener formats it anyway, so that work is skipped here.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(
+    level: int = logging.INFO,
+    fmt: str = "text",
+    stream: Optional[IO[str]] = None,
+) -> logging.handlers.QueueListener:
+    """
+    Route the root logger through a queue to a stderr handler on a thread.
+
+    Calling it again replaces the previous setup.
+
+    Args:
+        level (int): Root log level.
+        fmt (str): "json" for structured lines, otherwise the plain format.
+        stream (IO[str], optional): Where lines go; stderr by default.
+
+    Returns:
+        logging.handlers.QueueListener: The running listener.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, DeferredQueueHandler):
+            root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(records))
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,172 @@
+"""
+Pure ASGI middleware.
+
+Unlike ``BaseHTTPMiddleware`` these wrap the ASGI callables directly: no
+extra task per request, no re-wrapping of the response body stream, and
+streaming responses (SSE, exports) pass straight through.
+"""
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import logging
+import random
+import time
+
+import async_timeout
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import Histogram
+
+
+class TimeoutMiddleware:
+    """
+    Answer 504 when a request has not started its response in time.
+
+    The limit covers the work before the first byte, as before; once the
+    response has started (e.g. a long stream) it is no longer limited.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        timeout (float): Seconds until the response must start.
+    """
+
+    def __init__(self, app: ASGIApp, timeout: float = 30.0):
+        self.app = app
+        self.timeout = timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = False
+        deadline = async_timeout.timeout(self.timeout)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                deadline.reject()
+            await send(message)
+
+        try:
+            async with deadline:
+                await self.app(scope, receive, send_wrapper)
+        except asyncio.TimeoutError:
+            if started:
+                raise
+            response = JSONResponse(status_code=504, content={"detail": "Request timeout"})
+            await response(scope, receive, send)
+
+
+class AccessLogMiddleware:
+    """
+    Structured, sampled access log.
+
+    One record per request with method, path, status and duration as
+    ``extra`` fields. Successful requests are logged at ``sample_rate``;
+    server errors and requests slower than ``slow_ms`` always are.
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        logger (logging.Logger): Logger to emit to; give it a queue handler
+            so emitting never blocks the event loop.
+        sample_rate (float): Share of ordinary requests logged, 0 to 1.
+        slow_ms (float): Requests at least this slow are always logged.
+        clock: Monotonic time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        logger: logging.Logger,
+        sample_rate: float = 0.1,
+        slow_ms: float = 1000.0,
+        clock: Callable[[], float] = time.perf_counter,
+        random: Callable[[], float] = random.random,
+    ):
+        self.app = app
+        self.logger = logger
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.clock = clock
+        self.random = random
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = self.clock()
+        status: Optional[int] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (self.clock() - start) * 1000
+            failed = status is None or status >= 500
+            if failed or duration_ms >= self.slow_ms or self.random() < self.sample_rate:
+                fields: Dict[str, Any] = {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round(duration_ms, 2),
+                    "client": scope["client"][0] if scope.get("client") else None,
+                }
+                self.logger.log(
+                    logging.WARNING if failed else logging.INFO,
+                    "request",
+                    extra={"fields": fields},
+                )
+
+
+class MetricsMiddleware:
+    """
+    Request latency per method, route template and status.
+
+    The route template (``/bookings/{user_id}``) is read from the matched
+    route after the request, keeping label cardinality bounded; requests
+    that match no route are recorded as "unmatched".
+
+    Args:
+        app (ASGIApp): The wrapped application.
+        histogram (Histogram): Labelled by method, route and status.
+        clock: Monotonic time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        histogram: Histogram,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.app = app
+        self.histogram = histogram
+        self.clock = clock
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = self.clock()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            self.histogram.observe(self.clock() - start, scope["method"], template, str(status))
@@ -0,0 +1,65 @@
+"""
+Keyset (cursor) pagination over PostgREST.
+
+A page is read with ``order=<columns>.desc`` and ``limit``; the cursor is the
+sort key of its last row, and the next page is everything strictly after
+that key. Unlike ``offset`` the cost of a page does not grow with how far
+into the result it is, and rows inserted meanwhile do not shift pages.
+"""
+from typing import Any, List, Sequence, Tuple
+import base64
+import json
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor was not produced by ``encode_cursor``."""
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Sort key values carried by a cursor.
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed or has the wrong
+            number of values.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidCursorError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorError("Invalid cursor")
+    return values
+
+
+def _quote(value: Any) -> str:
+    return '"{}"'.format(str(value).replace('"', '\\"'))
+
+
+def after(columns: Sequence[str], values: Sequence[Any], descending: bool = True) -> Tuple[str, str]:
+    """
+    PostgREST filter for rows strictly after ``values`` in the sort order.
+
+    For ``("created_at", "booking_id")`` descending this is
+    ``created_at < a or (created_at = a and booking_id < b)``.
+
+    Returns:
+        Tuple[str, str]: An ``("or", "(...)")`` filter pair
+    """
+    operator = "lt" if descending else "gt"
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [f"{c}.eq.{_quote(v)}" for c, v in zip(columns[:i], values[:i])]
+        beyond = f"{column}.{operator}.{_quote(values[i])}"
+        clauses.append(f"and({','.join(equal + [beyond])})" if equal else beyond)
+    return ("or", f"({','.join(clauses)})")
+
+
+def order(columns: Sequence[str], descending: bool = True) -> str:
+    direction = "desc" if descending else "asc"
+    return ",".join(f"{column}.{direction}" for column in columns)
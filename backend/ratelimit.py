@@ -0,0 +1,299 @@
+"""
+Token-bucket rate limiting with state shared between workers.
+
+Each limited key (an endpoint plus a client IP, user or route) has a token
+bucket that refills continuously at its rate up to its capacity, so there
+are no window resets for bursts to slip through. Buckets live in a backend:
+``MemoryBackend`` for a single process, or ``SharedMemoryBackend``, a
+fixed-size hash table in a memory-mapped file that every uvicorn worker on
+the host maps, so a limit applies to the host rather than to each worker.
+A check is a hash, a byte-range lock and a few struct reads and writes.
+"""
+from abc import ABC, abstractmethod
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+import hashlib
+import mmap
+import os
+import struct
+import time
+
+from fastapi import HTTPException, Request
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(rate: str) -> Tuple[float, float]:
+    """
+    Parse a slowapi-style limit such as "30/minute" or "5/10 seconds".
+
+    Returns:
+        Tuple[float, float]: Bucket capacity and refill rate in tokens per
+        second
+    """
+    count, _, period = rate.partition("/")
+    parts = period.split()
+    multiplier = float(parts[0]) if len(parts) == 2 else 1.0
+    unit = parts[-1].rstrip("s")
+    if unit not in PERIODS:
+        raise ValueError(f"Invalid rate: {rate}")
+    capacity = float(count)
+    return capacity, capacity / (PERIODS[unit] * multiplier)
+
+
+class RateLimitBackend(ABC):
+    """Stores token buckets."""
+
+    @abstractmethod
+    def hit(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> float:
+        """
+        Take ``cost`` tokens from the bucket of ``key`` if it has them.
+
+        Returns:
+            float: 0 if allowed, otherwise seconds until enough tokens
+        """
+
+
+def _take(tokens: float, updated: float, now: float, capacity: float, rate: float, cost: float):
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+class MemoryBackend(RateLimitBackend):
+    """Buckets in a dict; limits are per process."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def hit(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> float:
+        now = self.clock()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens, retry_after = _take(tokens, updated, now, capacity, rate, cost)
+        self._buckets[key] = (tokens, now)
+        return retry_after
+
+
+class SharedMemoryBackend(RateLimitBackend):
+    """
+    Buckets in a memory-mapped file shared by all processes that open it.
+
+    The file is a header recording the table size, so that a process
+    configured with another size refuses the file rather than indexing it
+    differently, followed by an open-addressing hash table of ``slots``
+    entries of (key hash, tokens, last update). The table is split into ``stripes``
+    regions, each guarded by a byte-range lock on the file, so workers only
+    contend when they touch the same region. When every slot a key may use
+    is taken, the least recently updated one is reused; a bucket idle that
+    long has refilled anyway.
+
+    Args:
+        path (str): File backing the table, ideally on a tmpfs such as
+            /dev/shm.
+        slots (int): Table size; a power of two.
+        stripes (int): Number of lock regions; a power of two.
+        probes (int): Slots tried per key.
+        clock: Wall-clock time source, shared by all processes.
+
+    Raises:
+        ValueError: If the file holds a table of another size, or is not a
+            rate limit table.
+    """
+
+    HEADER = struct.Struct("<8sQ")
+    MAGIC = b"ratelim1"
+    SLOT = struct.Struct("<Qdd")
+
+    def __init__(
+        self,
+        path: str,
+        slots: int = 1 << 16,
+        stripes: int = 64,
+        probes: int = 8,
+        clock: Callable[[], float] = time.time,
+    ):
+        if fcntl is None:
+            raise RuntimeError("SharedMemoryBackend needs fcntl")
+        if slots & (slots - 1) or stripes & (stripes - 1) or slots < stripes * probes:
+            raise ValueError("slots and stripes must be powers of two, slots >= stripes * probes")
+        self.path = path
+        self.slots = slots
+        self.stripes = stripes
+        self.probes = probes
+        self.clock = clock
+        size = self.HEADER.size + slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._check_header(size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._map = mmap.mmap(self._fd, size)
+        self._per_stripe = slots // stripes
+
+    def _check_header(self, size: int) -> None:
+        """Write the header of a new file, or check an existing one's."""
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.HEADER.size, 0)
+        try:
+            header = os.pread(self._fd, self.HEADER.size, 0).ljust(self.HEADER.size, b"\0")
+            magic, slots = self.HEADER.unpack(header)
+            if magic == b"\0" * len(self.MAGIC):
+                # Extending a file fills it with zeros, i.e. empty slots
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, self.slots), 0)
+            elif magic != self.MAGIC:
+                raise ValueError(f"{self.path} is not a rate limit table")
+            elif slots != self.slots:
+                raise ValueError(f"{self.path} holds {slots} slots, not {self.slots}")
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.HEADER.size, 0)
+
+    def _locate(self, key: str) -> Tuple[int, int]:
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+        # Zero marks an empty slot
+        return digest or 1, digest & (self.slots - 1)
+
+    def hit(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> float:
+        tag, start = self._locate(key)
+        stripe = start // self._per_stripe
+        first = stripe * self._per_stripe
+        lock_start = self.HEADER.size + first * self.SLOT.size
+        lock_length = self._per_stripe * self.SLOT.size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, lock_length, lock_start)
+        try:
+            now = self.clock()
+            chosen, oldest = None, None
+            for i in range(self.probes):
+                # Probe within the stripe so one lock covers every candidate
+                slot = first + (start - first + i) % self._per_stripe
+                offset = self.HEADER.size + slot * self.SLOT.size
+                stored_tag, tokens, updated = self.SLOT.unpack_from(self._map, offset)
+                if stored_tag == tag:
+                    chosen = (offset, tokens, updated)
+                    break
+                if stored_tag == 0:
+                    chosen = (offset, capacity, now)
+                    break
+                if oldest is None or updated < oldest[2]:
+                    oldest = (offset, capacity, updated)
+            if chosen is None:
+                offset = oldest[0]
+                chosen = (offset, capacity, now)
+            offset, tokens, updated = chosen
+            tokens, retry_after = _take(tokens, updated, now, capacity, rate, cost)
+            self.SLOT.pack_into(self._map, offset, tag, tokens, now)
+            return retry_after
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, lock_length, lock_start)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+_RATES: Dict[str, Tuple[float, float]] = {}
+
+
+def _parse(rate: str) -> Tuple[float, float]:
+    parsed = _RATES.get(rate)
+    if parsed is None:
+        parsed = _RATES[rate] = parse_rate(rate)
+    return parsed
+
+
+def client_ip(request: Request, **_) -> Optional[str]:
+    return request.client.host if request.client else None
+
+
+class RateLimiter:
+    """
+    Endpoint decorators checking token buckets in a backend.
+
+    ``limit`` can be stacked to apply several limits to one endpoint, each
+    keyed on something else: the client IP by default, or any value
+    derived from the request and the endpoint's parsed arguments, such as
+    the user a booking is for.
+
+    Args:
+        backend (RateLimitBackend, optional): Where the buckets live; by
+            default ``factory`` creates it on ``open`` or the first check.
+        enabled (bool): When False every check passes.
+        factory: Creates the backend, e.g. mapping a shared file, so that
+            constructing a limiter at import time stays cheap.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[RateLimitBackend] = None,
+        enabled: bool = True,
+        factory: Callable[[], RateLimitBackend] = MemoryBackend,
+    ):
+        self.backend = backend
+        self.enabled = enabled
+        self.factory = factory
+        self.rejections: Dict[str, int] = {}
+
+    def open(self) -> RateLimitBackend:
+        """Create the backend unless there is one already."""
+        if self.backend is None:
+            self.backend = self.factory()
+        return self.backend
+
+    def check(self, scope: str, key: Any, rate: str, cost: float = 1.0) -> None:
+        """
+        Spend ``cost`` tokens of ``scope``'s bucket for ``key``.
+
+        Raises:
+            HTTPException: 429 with a Retry-After header when the bucket is
+                empty.
+        """
+        if not self.enabled or key is None:
+            return
+        capacity, per_second = _parse(rate)
+        retry_after = self.open().hit(f"{scope}:{key}", capacity, per_second, cost)
+        if retry_after:
+            self.rejections[scope] = self.rejections.get(scope, 0) + 1
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded: {rate}",
+                headers={"Retry-After": str(max(1, round(retry_after)))},
+            )
+
+    def limit(
+        self,
+        rate: str,
+        key: Callable[..., Any] = client_ip,
+        scope: Optional[str] = None,
+    ):
+        """
+        Limit an endpoint that takes a ``request: Request`` argument.
+
+        Args:
+            rate (str): e.g. "30/minute".
+            key: Called with the request and the endpoint's keyword
+                arguments; returning None skips the limit.
+            scope (str, optional): Bucket namespace, by default the endpoint
+                name and the key function's name, so stacked limits with
+                differently named key functions do not share buckets.
+        """
+        parse_rate(rate)
+
+        def decorator(func):
+            name = scope or f"{func.__name__}:{getattr(key, '__name__', 'key')}"
+
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.get("request")
+                if request is not None:
+                    self.check(name, key(**kwargs), rate)
+                return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
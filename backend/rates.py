@@ -0,0 +1,228 @@
+"""
+Versioned currency rate snapshots.
+
+Rates come from a pluggable provider and are swapped in as an immutable
+``RateSnapshot`` carrying the full cross-rate matrix in fixed point, so a
+conversion is two dict lookups and integer arithmetic with exact half-up
+rounding to the cent. Each change of rates gets a new version and notifies
+listeners, e.g. to invalidate cached prices.
+"""
+from abc import ABC, abstractmethod
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+BASE_CURRENCY = "USD"
+# Cross rates are stored as integers scaled by 10**RATE_DECIMALS
+RATE_DECIMALS = 12
+RATE_SCALE = 10 ** RATE_DECIMALS
+# Amounts are converted in minor units (cents)
+MINOR_UNITS = 100
+
+
+class RateProvider(ABC):
+    """Source of rates, as units of each currency per one USD."""
+
+    @abstractmethod
+    async def fetch(self) -> Mapping[str, float]:
+        """Fetch the current rates."""
+
+
+class StaticProvider(RateProvider):
+    """Fixed rates, e.g. the built-in defaults."""
+
+    def __init__(self, rates: Mapping[str, float]):
+        self.rates = dict(rates)
+
+    async def fetch(self) -> Mapping[str, float]:
+        return self.rates
+
+
+class FileProvider(RateProvider):
+    """
+    Rates read from a JSON file, either ``{"KES": 157.25, ...}`` or
+    ``{"rates": {"KES": 157.25, ...}}``. The file is read off the event loop.
+
+    Args:
+        path (str): Path of the JSON file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _read(self) -> Mapping[str, float]:
+        with open(self.path) as f:
+            data = json.load(f)
+        return data.get("rates", data)
+
+    async def fetch(self) -> Mapping[str, float]:
+        return await asyncio.get_running_loop().run_in_executor(None, self._read)
+
+
+class RateSnapshot(NamedTuple):
+    """Rates at one version, with every cross rate precomputed."""
+    version: int
+    updated_at: float
+    rates: Dict[str, float]
+    # from -> to -> rate * RATE_SCALE
+    cross: Dict[str, Dict[str, int]]
+
+    @classmethod
+    def build(cls, version: int, updated_at: float, rates: Mapping[str, float]) -> "RateSnapshot":
+        """
+        Validate ``rates`` and precompute the cross-rate matrix.
+
+        Raises:
+            ValueError: If a rate is not a positive number or USD is not 1.
+        """
+        for currency, rate in rates.items():
+            if isinstance(rate, bool) or not isinstance(rate, (int, float)) or rate <= 0:
+                raise ValueError(f"Invalid rate for {currency}: {rate}")
+        if rates.get(BASE_CURRENCY) != 1:
+            raise ValueError(f"Rates must be per {BASE_CURRENCY} with {BASE_CURRENCY} = 1")
+        exact = {currency: Decimal(str(rate)) for currency, rate in rates.items()}
+        cross = {
+            source: {
+                target: int((exact[target] * RATE_SCALE / exact[source]).to_integral_value(ROUND_HALF_UP))
+                for target in exact
+            }
+            for source in exact
+        }
+        return cls(version, updated_at, dict(rates), cross)
+
+    def convert(self, amount: float, from_currency: str, to_currency: str) -> float:
+        """
+        Convert ``amount``, rounded half up to the cent.
+
+        Raises:
+            ValueError: For an unsupported currency.
+        """
+        try:
+            rate = self.cross[from_currency][to_currency]
+        except KeyError:
+            raise ValueError(f"Unsupported currency: {from_currency} or {to_currency}")
+        minor = round(amount * MINOR_UNITS) * rate
+        # Half-up rounding of minor * rate / RATE_SCALE, for either sign
+        half = RATE_SCALE // 2
+        converted = (minor + half) // RATE_SCALE if minor >= 0 else -((-minor + half) // RATE_SCALE)
+        return converted / MINOR_UNITS
+
+
+class CurrencyRates:
+    """
+    The current RateSnapshot, refreshed from a provider on an interval.
+
+    Args:
+        provider (RateProvider): Where rates come from.
+        initial (Mapping[str, float]): Rates served until the first refresh.
+        interval (float): Seconds between refreshes.
+        clock: Wall-clock time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        provider: RateProvider,
+        initial: Mapping[str, float],
+        interval: float = 3600.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.provider = provider
+        self.interval = interval
+        self.clock = clock
+        self.snapshot = RateSnapshot.build(1, clock(), initial)
+        # (listener, local_only)
+        self._listeners: List[Tuple[Callable[[RateSnapshot], None], bool]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, currency: str) -> bool:
+        return currency in self.snapshot.rates
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    def currencies(self) -> Tuple[str, ...]:
+        return tuple(self.snapshot.rates)
+
+    def convert(self, amount: float, from_currency: str, to_currency: str) -> float:
+        return self.snapshot.convert(amount, from_currency, to_currency)
+
+    def on_change(self, listener: Callable[[RateSnapshot], None], local_only: bool = False) -> None:
+        """
+        Call ``listener`` with each new snapshot.
+
+        Args:
+            local_only (bool): Only for snapshots made here by ``update``,
+                not those taken from other workers by ``apply``; e.g. to
+                broadcast them without echoing what was received.
+        """
+        self._listeners.append((listener, local_only))
+
+    def _swap(self, snapshot: RateSnapshot, local: bool) -> RateSnapshot:
+        self.snapshot = snapshot
+        logger.info(f"Currency rates updated to version {snapshot.version}")
+        for listener, local_only in self._listeners:
+            if local or not local_only:
+                listener(snapshot)
+        return snapshot
+
+    async def refresh(self) -> RateSnapshot:
+        """
+        Fetch rates and swap in a new snapshot if they changed.
+
+        Raises:
+            ValueError: If the provider returned invalid rates; the current
+                snapshot stays in place.
+        """
+        return self.update(await self.provider.fetch())
+
+    def update(self, rates: Mapping[str, float]) -> RateSnapshot:
+        """Swap in ``rates`` if they differ from the current ones."""
+        rates = dict(rates)
+        current = self.snapshot
+        if rates == current.rates:
+            return current
+        return self._swap(RateSnapshot.build(current.version + 1, self.clock(), rates), local=True)
+
+    def apply(self, version: int, updated_at: float, rates: Mapping[str, float]) -> Optional[RateSnapshot]:
+        """
+        Take a snapshot made by another worker as it is, version included.
+
+        Listeners registered with ``local_only`` are not called.
+
+        Returns:
+            RateSnapshot: The new snapshot, or None if ``version`` is not
+            newer than the current one
+
+        Raises:
+            ValueError: If the rates are invalid.
+        """
+        if version <= self.snapshot.version:
+            return None
+        return self._swap(RateSnapshot.build(version, updated_at, rates), local=False)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Failed to update currency rates: {e}")
@@ -0,0 +1,131 @@
+"""
+In-memory route search and city autocomplete.
+
+The index is built from a route catalog snapshot plus the static list of
+supported cities and is rebuilt only when the catalog version changes, so
+searches and autocomplete keystrokes never scan the database. Matching is
+case- and accent-insensitive.
+"""
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+import unicodedata
+
+from catalog import CatalogSnapshot, RouteCatalog
+
+Row = Dict[str, Any]
+
+
+def normalize(text: Optional[str]) -> str:
+    """Fold case, strip accents and collapse whitespace: ' Gisényi ' -> 'gisenyi'"""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+class SearchIndex:
+    """
+    Lookup tables over one catalog version.
+
+    Args:
+        version (int): Catalog version the index was built from.
+        routes: Catalog routes.
+        countries (Dict[str, List[str]]): Supported cities per country.
+    """
+
+    def __init__(self, version: int, routes: Tuple[Row, ...], countries: Dict[str, List[str]]):
+        self.version = version
+        self._by_pair: Dict[Tuple[str, str], List[Row]] = {}
+        self._by_origin: Dict[str, List[Row]] = {}
+        self._by_destination: Dict[str, List[Row]] = {}
+        cities: Dict[Tuple[str, str], Tuple[str, str]] = {}
+
+        for route in routes:
+            origin, destination = normalize(route["origin"]), normalize(route["destination"])
+            self._by_pair.setdefault((origin, destination), []).append(route)
+            self._by_origin.setdefault(origin, []).append(route)
+            self._by_destination.setdefault(destination, []).append(route)
+            cities[(origin, normalize(route["country_origin"]))] = (
+                route["origin"], route["country_origin"])
+            cities[(destination, normalize(route["country_destination"]))] = (
+                route["destination"], route["country_destination"])
+        for country, names in countries.items():
+            for name in names:
+                cities.setdefault((normalize(name), normalize(country)), (name, country))
+
+        # Every word start of a city name is a key, so "salaam" also finds
+        # "Dar es Salaam"; entries sort by key for prefix range scans
+        entries = []
+        for (name, country_key), (display, country) in cities.items():
+            words = name.split(" ")
+            for i in range(len(words)):
+                entries.append((" ".join(words[i:]), i, display, country, country_key))
+        entries.sort()
+        self._keys = [entry[0] for entry in entries]
+        self._entries = entries
+
+    def routes(
+        self,
+        origin: Optional[str] = None,
+        destination: Optional[str] = None,
+        country_origin: Optional[str] = None,
+        country_destination: Optional[str] = None,
+    ) -> List[Row]:
+        """Routes matching origin and/or destination exactly, optionally by country."""
+        origin, destination = normalize(origin), normalize(destination)
+        if origin and destination:
+            found = self._by_pair.get((origin, destination), [])
+        elif origin:
+            found = self._by_origin.get(origin, [])
+        elif destination:
+            found = self._by_destination.get(destination, [])
+        else:
+            found = [route for routes in self._by_origin.values() for route in routes]
+        if country_origin:
+            country_origin = normalize(country_origin)
+            found = [r for r in found if normalize(r["country_origin"]) == country_origin]
+        if country_destination:
+            country_destination = normalize(country_destination)
+            found = [r for r in found if normalize(r["country_destination"]) == country_destination]
+        return list(found)
+
+    def autocomplete(self, prefix: str, country: Optional[str] = None, limit: int = 10) -> List[Dict[str, str]]:
+        """Cities with a word starting with ``prefix``, full-name matches first."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        country = normalize(country)
+        best: Dict[Tuple[str, str], int] = {}
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and self._keys[i].startswith(prefix):
+            _, word_index, display, city_country, country_key = self._entries[i]
+            i += 1
+            if country and country_key != country:
+                continue
+            city = (display, city_country)
+            best[city] = min(word_index, best.get(city, word_index))
+        matches = sorted((word_index, city) for city, word_index in best.items())
+        return [{"city": city, "country": c} for _, (city, c) in matches[:limit]]
+
+
+class RouteSearch:
+    """
+    Keeps a SearchIndex in step with the route catalog.
+
+    Args:
+        catalog (RouteCatalog): Source of routes.
+        countries (Dict[str, List[str]]): Supported cities per country.
+    """
+
+    def __init__(self, catalog: RouteCatalog, countries: Dict[str, List[str]]):
+        self.catalog = catalog
+        self.countries = countries
+        self._index: Optional[SearchIndex] = None
+
+    async def index(self) -> SearchIndex:
+        snapshot: CatalogSnapshot = await self.catalog.get()
+        index = self._index
+        if index is None or index.version != snapshot.version:
+            index = self._index = SearchIndex(snapshot.version, snapshot.routes, self.countries)
+        return index
@@ -0,0 +1,317 @@
+"""
+Atomic seat inventory per route and travel date.
+
+Seat state lives in one ``seat_inventory`` row per (route_id, travel_date)
+holding a bitset of booked seats (bit n-1 is seat n) and a version number.
+Claims and releases are applied with a single conditional update on that
+version, so two buyers can never both win a seat and a stale writer can
+never bring a sold seat back. Within a worker, concurrent requests for the
+same route and date are combined into one conditional update, which keeps
+throughput high when many buyers fight over the same 44 seats. The cached
+state of past travel dates is dropped once a day, when inventory is loaded.
+"""
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from db import Database, eq, in_
+
+SEATS_PER_BUS = 44
+
+TABLE = "seat_inventory"
+
+logger = logging.getLogger(__name__)
+
+
+class SeatUnavailableError(Exception):
+    """Raised when one or more requested seats are already booked."""
+
+    def __init__(self, seats: List[int]):
+        self.seats = seats
+        listed = ", ".join(str(s) for s in seats)
+        if len(seats) == 1:
+            super().__init__(f"Seat {listed} is not available for this route")
+        else:
+            super().__init__(f"Seats {listed} are not available for this route")
+
+
+class SeatConflictError(Exception):
+    """Raised when a claim keeps losing races to other workers."""
+
+
+def seats_to_mask(seats: Iterable[int]) -> int:
+    mask = 0
+    for seat in seats:
+        mask |= 1 << (seat - 1)
+    return mask
+
+
+def mask_to_seats(mask: int) -> List[int]:
+    seats = []
+    while mask:
+        low = mask & -mask
+        seats.append(low.bit_length())
+        mask ^= low
+    return seats
+
+
+class SeatState(NamedTuple):
+    """Booked seats of one route on one date at a given version."""
+    booked_mask: int
+    version: int
+    total_seats: int
+
+    @property
+    def full_mask(self) -> int:
+        return (1 << self.total_seats) - 1
+
+    @property
+    def available_count(self) -> int:
+        return self.total_seats - self.booked_mask.bit_count()
+
+    def booked_seats(self) -> List[int]:
+        return mask_to_seats(self.booked_mask)
+
+    def available_seats(self, unavailable_mask: int = 0) -> List[int]:
+        return mask_to_seats(self.full_mask & ~(self.booked_mask | unavailable_mask))
+
+
+class _Operation(NamedTuple):
+    mask: int
+    claim: bool
+    future: asyncio.Future
+
+
+class _Key:
+    __slots__ = ("state", "pending", "flushing")
+
+    def __init__(self):
+        self.state: Optional[SeatState] = None
+        self.pending: List[_Operation] = []
+        self.flushing = False
+
+
+class SeatInventory:
+    """
+    Claims and releases seats with single-round-trip conditional updates.
+
+    Args:
+        db (Database): Data-access layer.
+        max_attempts (int): Conditional updates tried before giving up when
+            other workers keep changing the same row.
+        on_change: Called with (route_id, travel_date, state) after every
+            update this worker makes.
+        clock: Wall-clock time source, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        max_attempts: int = 8,
+        on_change: Optional[Callable[[str, str, SeatState], Any]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.db = db
+        self.max_attempts = max_attempts
+        self.on_change = on_change
+        self.clock = clock
+        self._keys: Dict[Tuple[str, str], _Key] = {}
+        # Day the keys of earlier travel dates were last dropped
+        self._evicted_before: Optional[str] = None
+
+    async def state(
+        self, route_id: str, travel_date: str, total_seats: int = SEATS_PER_BUS
+    ) -> SeatState:
+        """Read the current seat state from the database."""
+        key = self._key(route_id, travel_date)
+        key.state = await self._fetch(route_id, travel_date, total_seats)
+        return key.state
+
+    async def states(
+        self, travel_date: str, route_ids: Optional[List[str]] = None
+    ) -> Dict[str, SeatState]:
+        """
+        Read the seat state of many routes on one date in a single query.
+
+        Routes nobody has booked yet have no row and are left out.
+        """
+        filters = [("travel_date", eq(travel_date))]
+        if route_ids is not None:
+            filters.append(("route_id", in_(route_ids)))
+        rows = await self.db.select(
+            TABLE, "route_id,booked_mask,version,total_seats", filters,
+        )
+        return {row["route_id"]: self._state(row, SEATS_PER_BUS) for row in rows}
+
+    async def claim(
+        self, route_id: str, travel_date: str, seats: Iterable[int],
+        total_seats: int = SEATS_PER_BUS,
+    ) -> SeatState:
+        """
+        Book all of ``seats`` or none of them.
+
+        Raises:
+            ValueError: If a seat number is outside the bus.
+            SeatUnavailableError: If any seat is already booked.
+        """
+        return await self._submit(route_id, travel_date, seats, True, total_seats)
+
+    async def release(
+        self, route_id: str, travel_date: str, seats: Iterable[int],
+        total_seats: int = SEATS_PER_BUS,
+    ) -> SeatState:
+        """Make ``seats`` available again; releasing a free seat is a no-op."""
+        return await self._submit(route_id, travel_date, seats, False, total_seats)
+
+    def observe(self, route_id: str, travel_date: str, state: SeatState) -> None:
+        """
+        Take note of a state another worker wrote, so the next conditional
+        update here starts from it instead of failing on a stale version.
+        """
+        key = self._keys.get((route_id, travel_date))
+        if key is not None and (key.state is None or key.state.version < state.version):
+            key.state = state
+
+    def _key(self, route_id: str, travel_date: str) -> _Key:
+        return self._keys.setdefault((route_id, travel_date), _Key())
+
+    def _evict_past(self) -> None:
+        """Drop idle keys of travel dates before today, at most once a day."""
+        today = datetime.fromtimestamp(self.clock(), timezone.utc).date().isoformat()
+        if self._evicted_before == today:
+            return
+        self._evicted_before = today
+        past = [
+            (route_id, travel_date) for (route_id, travel_date), key in self._keys.items()
+            if travel_date < today and not key.flushing and not key.pending
+        ]
+        for past_key in past:
+            del self._keys[past_key]
+
+    async def _submit(self, route_id, travel_date, seats, claim, total_seats) -> SeatState:
+        seats = list(seats)
+        invalid = [s for s in seats if not 1 <= s <= total_seats]
+        if invalid or not seats:
+            raise ValueError(f"Invalid seat number(s): {invalid or seats}")
+
+        key = self._key(route_id, travel_date)
+        future = asyncio.get_running_loop().create_future()
+        key.pending.append(_Operation(seats_to_mask(seats), claim, future))
+        if not key.flushing:
+            key.flushing = True
+            asyncio.ensure_future(self._flush(key, route_id, travel_date, total_seats))
+        return await future
+
+    async def _flush(self, key: _Key, route_id: str, travel_date: str, total_seats: int):
+        """Apply queued operations in batches until the queue is empty."""
+        try:
+            while key.pending:
+                batch, key.pending = key.pending, []
+                try:
+                    await self._apply(key, route_id, travel_date, total_seats, batch)
+                except Exception as e:
+                    key.state = None
+                    for op in batch:
+                        if not op.future.done():
+                            op.future.set_exception(e)
+        finally:
+            key.flushing = False
+
+    async def _apply(self, key, route_id, travel_date, total_seats, batch: List[_Operation]):
+        for _ in range(self.max_attempts):
+            fresh = key.state is None
+            if fresh:
+                key.state = await self._fetch(route_id, travel_date, total_seats)
+            state = key.state
+
+            # Decide every operation in arrival order against the combined mask
+            mask, granted, rejected = state.booked_mask, [], []
+            for op in batch:
+                if op.future.done():
+                    continue
+                if not op.claim:
+                    mask &= ~op.mask
+                    granted.append(op)
+                elif mask & op.mask:
+                    rejected.append((op, mask & op.mask))
+                else:
+                    mask |= op.mask
+                    granted.append(op)
+
+            if rejected and not fresh:
+                # The cached state may predate a release by another worker
+                key.state = None
+                continue
+
+            changed = mask != state.booked_mask
+            if changed:
+                rows = await self.db.update(
+                    TABLE,
+                    {"booked_mask": mask, "version": state.version + 1},
+                    [
+                        ("route_id", eq(route_id)),
+                        ("travel_date", eq(travel_date)),
+                        ("version", eq(state.version)),
+                    ],
+                )
+                if not rows:
+                    # Another worker moved the row on; decide again from the
+                    # state it announced meanwhile, or re-read it
+                    if key.state is state:
+                        key.state = None
+                    continue
+                state = key.state = self._state(rows[0], total_seats)
+
+            abandoned = 0
+            for op in granted:
+                if not op.future.done():
+                    op.future.set_result(state)
+                elif op.claim:
+                    abandoned |= op.mask
+            for op, taken in rejected:
+                if not op.future.done():
+                    op.future.set_exception(SeatUnavailableError(mask_to_seats(taken)))
+            if abandoned:
+                # The caller went away after its seats were booked; give them back
+                loop = asyncio.get_running_loop()
+                key.pending.append(_Operation(abandoned, False, loop.create_future()))
+            if changed and self.on_change is not None:
+                # The batch is decided and stored; a failing listener must not undo that
+                try:
+                    self.on_change(route_id, travel_date, state)
+                except Exception as e:
+                    logger.error(f"Seat change listener failed for {route_id} on {travel_date}: {e}")
+            return
+        raise SeatConflictError(
+            f"Seat inventory for {route_id} on {travel_date} is changing too fast, retry"
+        )
+
+    async def _fetch(self, route_id: str, travel_date: str, total_seats: int) -> SeatState:
+        self._evict_past()
+        filters = {"route_id": eq(route_id), "travel_date": eq(travel_date)}
+        row = await self.db.select_one(TABLE, "booked_mask,version,total_seats", filters)
+        if row is None:
+            await self.db.insert(
+                TABLE,
+                {
+                    "route_id": route_id,
+                    "travel_date": travel_date,
+                    "total_seats": total_seats,
+                    "booked_mask": 0,
+                    "version": 0,
+                },
+                on_conflict="route_id,travel_date",
+                resolution="ignore-duplicates",
+            )
+            row = await self.db.select_one(TABLE, "booked_mask,version,total_seats", filters)
+        return self._state(row, total_seats)
+
+    @staticmethod
+    def _state(row: Dict[str, Any], total_seats: int) -> SeatState:
+        return SeatState(
+            booked_mask=int(row["booked_mask"]),
+            version=int(row["version"]),
+            total_seats=int(row.get("total_seats") or total_seats),
+        )
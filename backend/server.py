@@ -1,26 +1,40 @@
 import os
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any, Union
-from typing import List
-from fastapi import FastAPI, HTTPException, Depends, Request
-from starlette.responses import JSONResponse  # Change this import
+from typing import Optional, Dict, Any
+from typing import Container, List, Tuple
+from fastapi import FastAPI, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect
+from starlette.responses import JSONResponse, Response, StreamingResponse  # Change this import
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_utils.tasks import repeat_every
-from supabase import create_client, Client
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from starlette.middleware.base import BaseHTTPMiddleware
-from asyncio import TimeoutError
-import async_timeout
-from slowapi.errors import RateLimitExceeded
-from pydantic import BaseModel, EmailStr, validator
-from datetime import datetime, timedelta
+from pydantic import BaseModel, EmailStr, Field, validator
+from datetime import datetime, timedelta, timezone
 import uuid
-import qrcode
-import base64
-from io import BytesIO
+import asyncio
+import time
+import tempfile
 import logging
 
+from db import Database, Store, eq, in_
+from catalog import CatalogSnapshot, RouteCatalog
+from exports import FORMATS as EXPORT_FORMATS, export_bookings
+from pagination import InvalidCursorError, after, decode_cursor, encode_cursor, order
+from search import RouteSearch
+from journeys import SORT_KEYS, JourneyPlanner, describe
+from seats import SEATS_PER_BUS, SeatInventory, SeatState, SeatUnavailableError
+from holds import HoldExpiredError, SeatHolds
+from tracking import TrackingHub
+from gps import GpsIngestor
+from eta import FIELDS as ETA_FIELDS, EtaEngine
+from fastjson import JSONBytesResponse, dumps
+from dashboard import DASHBOARD_FIELDS, Dashboard
+from events import EventBus
+from health import HealthProber
+from logs import setup_logging
+from metrics import Registry
+from middleware import AccessLogMiddleware, MetricsMiddleware, TimeoutMiddleware
+from rates import CurrencyRates, FileProvider, StaticProvider
+from ratelimit import MemoryBackend, RateLimiter, SharedMemoryBackend, client_ip
+from tickets import InvalidTicketError, TicketRenderer, is_ticket_token, sign_ticket, verify_ticket
+
 # Environment configuration
 load_dotenv()
 # Add after API_VERSION definition
@@ -29,11 +43,51 @@ VERSION = API_VERSION
 ENV = os.getenv("ENV", "development")
 DEBUG = ENV != "production"
 BUILD_DATE = "2024-07-28"
+MAX_GROUP_SEATS = int(os.getenv("MAX_GROUP_SEATS", "20"))
+MAX_GPS_BATCH = int(os.getenv("MAX_GPS_BATCH", "5000"))
+MAX_SEARCH_ROUTES = 20
+MAX_SEARCH_DEPARTURES = 20
+MAX_BOOKINGS_PAGE = 100
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+HEALTH_TIMEOUT = float(os.getenv("HEALTH_TIMEOUT_SECONDS", "2"))
+# Load the catalog and ETA geometry before taking traffic
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true") == "true"
+# Host-wide state shared by the workers lives here, on a tmpfs when possible
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
 #rate limiter
-limiter = Limiter(key_func=get_remote_address)
+def rate_limit_backend():
+    """Buckets shared by all workers on the host unless RATE_LIMIT_BACKEND=memory"""
+    if os.getenv("RATE_LIMIT_BACKEND", "shared") == "memory":
+        return MemoryBackend()
+    path = os.getenv("RATE_LIMIT_PATH", os.path.join(SHARED_DIR, "bus-booking-ratelimit"))
+    try:
+        return SharedMemoryBackend(path, slots=int(os.getenv("RATE_LIMIT_SLOTS", "65536")))
+    except (OSError, RuntimeError, ValueError) as e:
+        logging.getLogger(__name__).warning(f"Falling back to per-process rate limits: {e}")
+        return MemoryBackend()
+
+# The backend is opened at startup, so importing the app maps no files
+limiter = RateLimiter(
+    enabled=os.getenv("RATE_LIMIT_ENABLED", "true") == "true",
+    factory=rate_limit_backend,
+)
+
+def booking_user(request: Request, booking=None, group=None, **_) -> str:
+    """
+    Rate limit key: one client booking for one user. The user id comes from
+    the unauthenticated body, so the client IP is part of the key and no
+    client can spend another's quota; rotating ids still meets the per-IP
+    limit stacked with this one.
+    """
+    return f"{client_ip(request)}:{(booking or group).user_id}"
+
+def client_route(request: Request, booking=None, group=None, hold=None, **_) -> str:
+    """Rate limit key: one client on one departure, so no client can grab a whole bus"""
+    target = booking or group or hold
+    return f"{client_ip(request)}:{target.route_id}:{target.travel_date}"
 
 
-# Currency conversion rates (as of typical 2024 rates)
+# Default currency conversion rates (as of typical 2024 rates)
 CURRENCY_RATES = {
     "USD": 1.0,
     "KES": 157.25,  # 1 USD = 157.25 KES
@@ -50,48 +104,98 @@ CURRENCY_SYMBOLS = {
     "TZS": "TSh"
 }
 
-# Supabase setup
-SUPABASE_URL = os.environ.get('SUPABASE_URL')
-SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
+# Versioned rate snapshots from RATES_FILE if set, else the defaults above
+currency_rates = CurrencyRates(
+    FileProvider(os.environ["RATES_FILE"]) if os.getenv("RATES_FILE") else StaticProvider(CURRENCY_RATES),
+    CURRENCY_RATES,
+    interval=float(os.getenv("RATES_REFRESH_SECONDS", "3600")),
+)
+
+# Supabase setup; checked at startup so importing the app stays cheap
+SUPABASE_URL = os.environ.get('SUPABASE_URL', '')
+SUPABASE_KEY = os.environ.get('SUPABASE_KEY', '')
+
+# "supabase", or "sqlite" for a depot that books against a local file
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'supabase')
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'bus_booking.db')
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("Missing Supabase credentials. Check environment variables.")
+# Key for signing ticket tokens; set it explicitly in production
+TICKET_SIGNING_KEY = os.environ.get('TICKET_SIGNING_KEY', SUPABASE_KEY)
 
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-except Exception as e:
-    raise ConnectionError(f"Failed to connect to Supabase: {str(e)}")
+# Prometheus metrics served at /metrics, per worker process
+metrics = Registry()
+request_latency = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+db_latency = metrics.histogram(
+    "db_operation_duration_seconds", "Database call latency", ("operation", "table", "status")
+)
+ticket_latency = metrics.histogram(
+    "ticket_duration_seconds", "Ticket token signing and QR rendering time", ("stage",)
+)
+currency_conversions = metrics.counter(
+    "currency_conversions_total", "Prices converted between currencies", ("from", "to")
+)
+metrics.callback(
+    "rate_limit_rejections_total", "Requests rejected by rate limits", ("scope",),
+    lambda: {(scope,): count for scope, count in limiter.rejections.items()}, kind="counter",
+)
+
+def observe_query(operation: str, table: str, status: int, seconds: float) -> None:
+    """Database observer recording each storage call"""
+    db_latency.observe(seconds, operation, table, str(status) if status else "cancelled")
+
+def create_store() -> Store:
+    """The storage backend selected by STORAGE_BACKEND"""
+    if STORAGE_BACKEND == 'sqlite':
+        from sqlite_store import SqliteStore
+        return SqliteStore(
+            SQLITE_PATH,
+            busy_timeout=float(os.getenv("SQLITE_BUSY_TIMEOUT_SECONDS", "5")),
+            observer=observe_query,
+        )
+    # Pooled async PostgREST client shared by all handlers
+    return Database(
+        SUPABASE_URL,
+        SUPABASE_KEY,
+        max_connections=int(os.getenv("DB_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("DB_MAX_KEEPALIVE", "10")),
+        timeout=float(os.getenv("DB_TIMEOUT_SECONDS", "10")),
+        max_concurrency=int(os.getenv("DB_MAX_CONCURRENCY", "50")),
+        observer=observe_query,
+    )
+
+db = create_store()
 app = FastAPI(
     title="Trinity Bus Booking API",
     version=API_VERSION,
     debug=DEBUG
 )
 @app.on_event("startup")
-@repeat_every(seconds=60 * 60 * 24)
-async def update_currency_rates():
-    """Update currency rates daily"""
-    try:
-        for currency in CURRENCY_RATES:
-            if currency != "USD":
-                pass  # Here you would implement the logic to fetch and update currency rates
-        # Add logic to update CURRENCY_RATES
-        logger.info("Currency rates updated successfully")
-    except Exception as e:
-        logger.error(f"Failed to update currency rates: {e}")
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+async def start_logging():
+    """Start the log listener thread; importing the app starts no threads"""
+    setup_logging(logging.INFO, fmt=os.getenv("LOG_FORMAT", "text"))
+
+@app.on_event("startup")
+async def check_configuration():
+    """Refuse to start without a usable storage backend"""
+    if STORAGE_BACKEND not in ('supabase', 'sqlite'):
+        raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    if STORAGE_BACKEND == 'supabase' and (not SUPABASE_URL or not SUPABASE_KEY):
+        raise ValueError("Missing Supabase credentials. Check environment variables.")
+    if not TICKET_SIGNING_KEY:
+        raise ValueError("Missing TICKET_SIGNING_KEY. Check environment variables.")
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-@app.middleware("http")
-async def log_requests(request, call_next):
-    logger.info(f"Request: {request.method} {request.url}")
-    response = await call_next(request)
-    return response
+app.add_middleware(MetricsMiddleware, histogram=request_latency)
+# Access log: a sample of ordinary requests, every failed or slow one
+app.add_middleware(
+    AccessLogMiddleware,
+    logger=logging.getLogger("access"),
+    sample_rate=float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "0.1")),
+    slow_ms=float(os.getenv("ACCESS_LOG_SLOW_MS", "1000")),
+)
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -101,20 +205,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Middleware for handling timeouts
-class TimeoutMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        try:
-            async with async_timeout.timeout(30):  # 30 second timeout
-                response = await call_next(request)
-                return response
-        except TimeoutError:
-            return JSONResponse(
-                status_code=504,
-                content={"detail": "Request timeout"}
-            )
+# 504 when a response has not started within 30 seconds
+app.add_middleware(TimeoutMiddleware, timeout=30)
+# Supported countries and their major cities
+COUNTRIES = {
+    "Kenya": [
+        "Nairobi", "Mombasa", "Kisumu", "Nakuru", "Eldoret", 
+        "Thika", "Malindi", "Kitale", "Garissa", "Kakamega"
+    ],
+    "Rwanda": [
+        "Kigali", "Butare", "Gitarama", "Ruhengeri", "Gisenyi",
+        "Cyangugu", "Kibungo", "Byumba", "Gikongoro", "Kibuye"
+    ],
+    "Uganda": [
+        "Kampala", "Entebbe", "Jinja", "Mbale", "Gulu", 
+        "Lira", "Mbarara", "Kasese", "Soroti", "Arua"
+    ],
+    "Tanzania": [
+        "Dar es Salaam", "Arusha", "Mwanza", "Dodoma", "Mbeya",
+        "Tanga", "Morogoro", "Tabora", "Kigoma", "Iringa"
+    ]
+}
+
+COUNTRIES_RESPONSE = {
+    "countries": COUNTRIES,
+    "total_countries": len(COUNTRIES),
+    "total_cities": sum(len(cities) for cities in COUNTRIES.values())
+}
 
-app.add_middleware(TimeoutMiddleware)
 # Pydantic models
 class User(BaseModel):
     user_id: Optional[str] = None
@@ -124,25 +242,28 @@ class User(BaseModel):
     preferred_language: str = "en"
 
 def convert_price(amount: float, from_currency: str, to_currency: str) -> float:
-    """Convert price between currencies"""
-    if not isinstance(amount, (int, float)):
-        raise ValueError("Amount must be a number")
-    
-    if amount < 0:
-        raise ValueError("Amount cannot be negative")
-    try:
-        if from_currency not in CURRENCY_RATES or to_currency not in CURRENCY_RATES:
-            raise ValueError(f"Unsupported currency: {from_currency} or {to_currency}")
-            
-        if from_currency == to_currency:
-            return amount
-        
-        usd_amount = amount / CURRENCY_RATES[from_currency] if from_currency != "USD" else amount
-        final_amount = usd_amount * CURRENCY_RATES[to_currency]
-        
-        return round(final_amount, 2)
-    except Exception as e:
-        raise ValueError(f"Currency conversion error: {str(e)}")
+    """Convert price between currencies with the current rate snapshot"""
+    converted = currency_rates.convert(amount, from_currency, to_currency)
+    currency_conversions.inc(from_currency, to_currency)
+    return converted
+def format_price(amount: float, currency: str) -> str:
+    """Format an amount with its currency symbol, e.g. 'Ksh 7,076.25'"""
+    return f"{CURRENCY_SYMBOLS.get(currency, currency)} {amount:,.2f}"
+
+def price_route(route: Dict[str, Any]) -> Dict[str, Any]:
+    """Add prices and formatted prices in every supported currency to a route row"""
+    base_price = route['base_price']
+    base_currency = route.get('base_currency', 'USD')
+    route['prices'] = {
+        curr: convert_price(base_price, base_currency, curr)
+        for curr in currency_rates.currencies()
+    }
+    route['formatted_prices'] = {
+        curr: format_price(price, curr)
+        for curr, price in route['prices'].items()
+    }
+    return route
+
 class DatabaseError(HTTPException):
     def __init__(self, detail: str):
         super().__init__(status_code=500, detail=f"Database error: {detail}")
@@ -160,7 +281,7 @@ class RouteCreate(BaseModel):
     
     @validator('base_currency')
     def validate_currency(cls, v):
-        if v not in CURRENCY_RATES:
+        if v not in currency_rates:
             raise ValueError(f"Unsupported currency: {v}")
         return v
     @validator('origin_coords', 'destination_coords')
@@ -246,6 +367,7 @@ class BookingResponse(BaseModel):
     seat_number: int
     status: str
     qr_code: Optional[str]
+    ticket_url: Optional[str] = None
     route: RouteResponse
     created_at: str
 
@@ -257,13 +379,342 @@ class Booking(BaseModel):
     seat_number: int
     status: str = "pending"
     qr_code: Optional[str] = None
+    hold_id: Optional[str] = None
+
+class GroupBooking(BaseModel):
+    user_id: str
+    route_id: str
+    travel_date: str
+    seat_numbers: List[int]
+    status: str = "pending"
+    hold_id: Optional[str] = None
+
+    @validator('seat_numbers')
+    def validate_seat_numbers(cls, seats):
+        if not 1 <= len(seats) <= MAX_GROUP_SEATS:
+            raise ValueError(f"A group booking takes 1 to {MAX_GROUP_SEATS} seats")
+        if len(set(seats)) != len(seats):
+            raise ValueError("Seat numbers must be unique")
+        return seats
+
+class SeatHoldRequest(BaseModel):
+    route_id: str
+    travel_date: str
+    seat_numbers: List[int]
+
+class SeatHoldResponse(BaseModel):
+    hold_id: str
+    route_id: str
+    travel_date: str
+    seat_numbers: List[int]
+    expires_at: str
+
+class BusPosition(BaseModel):
+    current_location: List[float]
+    status: Optional[str] = None
 
+    @validator('current_location')
+    def validate_location(cls, coords):
+        if not coords:
+            raise ValueError("Location coordinates must be [latitude, longitude]")
+        return Bus.validate_location(coords)
+
+class GpsPing(BaseModel):
+    bus_id: str
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+    recorded_at: Optional[float] = None  # epoch seconds, defaults to arrival
+    status: Optional[str] = None
+
+class GpsBatch(BaseModel):
+    pings: List[GpsPing] = Field(..., max_length=MAX_GPS_BATCH)
 
 class SeatUpdate(BaseModel):
     route_id: str
+    travel_date: str
     seat_number: int
     status: str
 
+# Route catalog cache, invalidated by route writes
+route_catalog = RouteCatalog(
+    lambda: db.select('routes'),
+    price_route,
+    ttl=float(os.getenv("ROUTE_CATALOG_TTL_SECONDS", "300")),
+)
+
+# Prices are converted when the catalog loads, so new rates reload it
+currency_rates.on_change(lambda snapshot: route_catalog.invalidate())
+
+# Route and city lookups, rebuilt when the catalog version changes
+route_search = RouteSearch(route_catalog, COUNTRIES)
+
+# Time-dependent route/departure graph per travel date
+journey_planner = JourneyPlanner(
+    db,
+    route_catalog,
+    ttl=float(os.getenv("JOURNEY_GRAPH_TTL_SECONDS", "60")),
+)
+
+# Admin dashboard totals, updated per booking and seat change
+dashboard = Dashboard(
+    db,
+    route_catalog,
+    reconcile_interval=float(os.getenv("DASHBOARD_RECONCILE_SECONDS", "900")),
+)
+
+async def check_database() -> None:
+    """Health check: one indexed single-row read"""
+    await db.select('routes', "route_id", limit=1, timeout=HEALTH_TIMEOUT)
+
+# Dependency status refreshed in the background; probes read the cache
+health_prober = HealthProber(
+    {"supabase": check_database},
+    interval=float(os.getenv("HEALTH_INTERVAL_SECONDS", "10")),
+    timeout=HEALTH_TIMEOUT,
+)
+metrics.callback(
+    "dependency_up", "Whether the last health check of a dependency passed", ("dependency",),
+    lambda: {(name,): int(bool(health_prober.ok(name))) for name in health_prober.checks},
+)
+
+def announce(topic: str, key: Optional[str] = None, version: Optional[int] = None, **data: Any) -> None:
+    """Publish a change to the other workers; best effort, the change is already stored"""
+    try:
+        event_bus.publish(topic, key, version, **data)
+    except Exception as e:
+        logger.error(f"Publishing {topic} event failed, other workers rely on TTLs: {e}")
+
+def routes_changed() -> None:
+    """Reload the route catalog in this and every other worker"""
+    route_catalog.invalidate()
+    announce("routes")
+
+def seats_changed(route_id: str, travel_date: str, state: SeatState) -> None:
+    """SeatInventory.on_change: update the dashboard here and announce the new state"""
+    dashboard.record_seats(route_id, travel_date, state)
+    announce(
+        "seats", f"{route_id}/{travel_date}", state.version,
+        route_id=route_id, travel_date=travel_date,
+        booked_mask=state.booked_mask, total_seats=state.total_seats,
+    )
+
+def on_seats_event(event) -> None:
+    """Seat state written by another worker"""
+    data = event.data
+    state = SeatState(data["booked_mask"], event.version, data["total_seats"])
+    seat_inventory.observe(data["route_id"], data["travel_date"], state)
+    dashboard.record_seats(data["route_id"], data["travel_date"], state)
+
+def bookings_created(rows: List[Dict[str, Any]]) -> None:
+    """
+    Count new bookings on the dashboard here and in every other worker.
+
+    The rows were created together, so the event carries their shared
+    route, date, status and creation time once plus (booking_id, seat)
+    pairs, which keeps it small whatever the group size.
+    """
+    rows = [{field: row.get(field) for field in DASHBOARD_FIELDS} for row in rows]
+    dashboard.record_bookings(rows)
+    if rows:
+        first = rows[0]
+        announce(
+            "bookings",
+            route_id=first["route_id"], travel_date=first["travel_date"],
+            status=first["status"], created_at=first["created_at"],
+            seats=[[row["booking_id"], row["seat_number"]] for row in rows],
+        )
+
+def on_bookings_event(event) -> None:
+    """Bookings created by another worker"""
+    data = event.data
+    shared = {field: data.get(field) for field in ("route_id", "travel_date", "status", "created_at")}
+    dashboard.record_bookings([
+        {**shared, "booking_id": booking_id, "seat_number": seat_number}
+        for booking_id, seat_number in data["seats"]
+    ])
+
+def subscribe_events(bus: EventBus) -> EventBus:
+    """Apply other workers' route, seat, booking and rate changes to this worker's caches"""
+    bus.subscribe("routes", lambda event: route_catalog.invalidate())
+    bus.subscribe("seats", on_seats_event)
+    bus.subscribe("bookings", on_bookings_event)
+    bus.subscribe("rates", lambda event: currency_rates.apply(
+        event.version, event.data["updated_at"], event.data["rates"]
+    ))
+    return bus
+
+# Change events to and from the other workers on this host
+event_bus = subscribe_events(EventBus(
+    os.getenv("EVENT_BUS_DIR", os.path.join(SHARED_DIR, "bus-booking-events")),
+    enabled=os.getenv("EVENT_BUS_ENABLED", "true") == "true",
+))
+metrics.callback(
+    "cache_events_total", "Change events exchanged with other workers", ("direction",),
+    lambda: {("sent",): event_bus.sent, ("received",): event_bus.received, ("dropped",): event_bus.dropped},
+    kind="counter",
+)
+# Only rates refreshed here are announced; applying a peer's must not echo it
+currency_rates.on_change(
+    lambda snapshot: announce(
+        "rates", version=snapshot.version, updated_at=snapshot.updated_at, rates=snapshot.rates
+    ),
+    local_only=True,
+)
+
+# Per route and travel date seat bitsets with atomic claim/release
+seat_inventory = SeatInventory(db, on_change=seats_changed)
+
+# QR images rendered on demand from ticket tokens
+ticket_renderer = TicketRenderer(
+    max_workers=int(os.getenv("TICKET_RENDER_WORKERS", "2")),
+    cache_size=int(os.getenv("TICKET_CACHE_SIZE", "1024")),
+)
+
+def ticket_url(booking: Dict[str, Any]) -> str:
+    """
+    Path of a booking's ticket image, from the token stored in ``qr_code``.
+    
+    Bookings stored before tokens, with a base64 image there, get a token
+    signed from their ticket fields instead.
+    """
+    token = booking.get('qr_code')
+    if not is_ticket_token(token):
+        token = sign_ticket(booking, TICKET_SIGNING_KEY)
+    return f"/api/tickets/{token}.png"
+
+# Live bus positions fanned out to SSE/WebSocket subscribers
+tracking_hub = TrackingHub(
+    queue_size=int(os.getenv("TRACKING_QUEUE_SIZE", "16")),
+    heartbeat=float(os.getenv("TRACKING_HEARTBEAT_SECONDS", "15")),
+)
+booking_buses: Dict[str, str] = {}
+bus_routes: Dict[str, str] = {}
+
+# Progress and ETA along route polylines, rebuilt per catalog version
+eta_engine = EtaEngine(route_catalog)
+
+def publish_positions(events: List[Tuple[str, Dict[str, Any]]]) -> int:
+    """
+    Publish a batch of position events, with progress and ETA for the buses
+    whose route is known, estimated in one call for the whole batch.
+
+    Returns:
+        int: Subscribers reached, summed over the events
+    """
+    located = [
+        (bus_routes[bus_id], event) for bus_id, event in events
+        if bus_id in bus_routes and event.get('current_location')
+    ]
+    if located:
+        estimates = eta_engine.estimate(
+            [(route_id, *event['current_location']) for route_id, event in located], time.time()
+        )
+        for (_, event), fields in zip(located, estimates):
+            event.update(fields)
+    return sum(tracking_hub.publish(bus_id, event) for bus_id, event in events)
+
+# Buffered GPS pings, published live and written to the database in bulk
+gps_ingestor = GpsIngestor(
+    db,
+    publish=publish_positions,
+    buffer_size=int(os.getenv("GPS_BUFFER_SIZE", "120")),
+    max_buses=int(os.getenv("GPS_MAX_BUSES", "10000")),
+    max_skew=float(os.getenv("GPS_MAX_CLOCK_SKEW_SECONDS", "30")),
+    min_distance_m=float(os.getenv("GPS_MIN_DISTANCE_METERS", "15")),
+    flush_interval=float(os.getenv("GPS_FLUSH_INTERVAL_SECONDS", "5")),
+)
+
+async def load_buses() -> List[Dict[str, Any]]:
+    """Buses running from yesterday onwards; overnight trips still report"""
+    since = (datetime.now(timezone.utc) - timedelta(days=1)).date().isoformat()
+    return await db.select('buses', "bus_id,route_id", [('date', f"gte.{since}")])
+
+# Bus ids GPS pings are accepted for, reloaded like the route catalog
+bus_catalog = RouteCatalog(
+    load_buses,
+    dict,
+    ttl=float(os.getenv("BUS_CATALOG_TTL_SECONDS", "60")),
+    key="bus_id",
+)
+
+async def known_buses() -> Optional[Container[str]]:
+    """
+    Ids of the buses in service, or None to accept every bus while they
+    cannot be loaded; the ingestor's buffer cap still bounds memory then.
+    """
+    try:
+        return (await bus_catalog.get()).by_id
+    except Exception:
+        return None
+
+async def bus_for_booking(booking_id: str) -> str:
+    """Bus a booking travels on, cached since it does not change"""
+    bus_id = booking_buses.get(booking_id)
+    if bus_id:
+        return bus_id
+    booking = await db.select_one(
+        'bookings', "route_id,travel_date,bus_id", {'booking_id': eq(booking_id)}
+    )
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    bus_id = booking.get('bus_id')
+    if not bus_id:
+        bus = await db.select_one('buses', "bus_id", [
+            ('route_id', eq(booking['route_id'])), ('date', eq(booking['travel_date'])),
+        ])
+        if not bus:
+            raise HTTPException(status_code=404, detail="No bus assigned to this booking yet")
+        bus_id = bus['bus_id']
+    if len(booking_buses) >= 100_000:
+        booking_buses.clear()
+    booking_buses[booking_id] = bus_id
+    bus_routes[bus_id] = booking['route_id']
+    return bus_id
+
+async def bus_tracking_state(bus_id: str) -> Dict[str, Any]:
+    """Latest tracking event of a bus, from the hub or else the database"""
+    latest = tracking_hub.latest(bus_id)
+    if latest is not None:
+        return latest
+    bus = await db.select_one(
+        'buses', "bus_id,current_location,status", {'bus_id': eq(bus_id)}
+    )
+    if not bus:
+        raise HTTPException(status_code=404, detail="Bus not found")
+    return {
+        "bus_id": bus_id,
+        "current_location": bus.get('current_location') or [],
+        "status": bus.get('status', "scheduled"),
+        "updated_at": None,
+    }
+
+async def prime_tracking(bus_id: str) -> None:
+    """
+    Make sure the hub has a latest event for a bus before subscribing to it.
+    
+    Raises a 404 HTTPException for unknown buses, so that no tracking
+    channel is opened for them.
+    """
+    if tracking_hub.latest(bus_id) is None:
+        tracking_hub.publish(bus_id, await bus_tracking_state(bus_id))
+
+async def sse_events(bus_id: str):
+    """Server-sent events for a primed bus: its latest state, then each change"""
+    async for payload in tracking_hub.events(bus_id):
+        if payload is None:
+            yield ": keep-alive\n\n"
+        else:
+            yield f"event: position\ndata: {payload}\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# Checkout leases on seats, expired by one heap-driven background task
+seat_holds = SeatHolds(
+    db,
+    seat_inventory,
+    ttl=float(os.getenv("SEAT_HOLD_TTL_SECONDS", "600")),
+)
+
 # API Routes
 @app.post("/users/", response_model=User)
 async def create_user(user: User) -> User:
@@ -272,47 +723,82 @@ async def create_user(user: User) -> User:
         if not data.get('user_id'):
             data['user_id'] = str(uuid.uuid4())
         
-        response = supabase.table('users').insert(data).execute()
-        return response.data[0]
+        response = await db.insert('users', data)
+        return response[0]
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 # Update the get_routes function
+def route_responses(snapshot: CatalogSnapshot) -> Tuple[List[Dict[str, Any]], bytes]:
+    """
+    Catalog routes cut down to the RouteResponse fields, and their JSON.
+    
+    The catalog's prepare step already builds each route in that shape, so
+    the fields are only picked out; they are validated against the model
+    as well when DEBUG is on. A route missing a required field is left out
+    and logged rather than served incomplete.
+    """
+    fields = RouteResponse.model_fields
+    required = [name for name, field in fields.items() if field.is_required()]
+    routes = []
+    for route in snapshot.routes:
+        missing = [name for name in required if name not in route]
+        if missing:
+            logger.error(f"Route {route.get('route_id')} lacks {', '.join(missing)}; not listed")
+            continue
+        routes.append({
+            name: route[name] if name in route else field.get_default(call_default_factory=True)
+            for name, field in fields.items()
+        })
+    if DEBUG:
+        for route in routes:
+            RouteResponse.model_validate(route)
+    return routes, dumps(routes)
+
 @app.get("/routes/", response_model=List[RouteResponse])
 @limiter.limit("100/minute")
-async def get_routes(request: Request, currency: str = "USD") -> List[RouteResponse]:
+async def get_routes(
+    request: Request, currency: str = "USD", travel_date: Optional[str] = None
+) -> Response:
     """
     Get all available routes with prices in requested currency.
     
+    The response is built and serialized once per catalog version and
+    then served as bytes. It carries prices in every currency, so the same
+    bytes serve every ``currency``; a rate change reloads the catalog.
+    
     Args:
         currency (str, optional): Currency code. Defaults to "USD".
+        travel_date (str, optional): When given, available_seats leaves out
+            seats booked or held on that date.
     
     Returns:
         List[RouteResponse]: List of routes with prices
     """
     try:
-        response = supabase.table('routes').select("*").execute()
-        routes = response.data
-        
-        # Add prices in all currencies for each route
-        for route in routes:
-            base_price = route['base_price']
-            base_currency = route.get('base_currency', 'USD')
-            route['prices'] = {
-                curr: convert_price(base_price, base_currency, curr)
-                for curr in CURRENCY_RATES.keys()
-            }
-            
-        return routes
+        # Served from the catalog cache with prices precomputed for all currencies
+        snapshot = await route_catalog.get()
+        routes, body = snapshot.view("route_responses", route_responses)
+        if not travel_date:
+            return JSONBytesResponse(body)
+        states = await seat_inventory.states(travel_date)
+        return JSONBytesResponse([
+            {**route, 'available_seats': states[route['route_id']].available_seats()}
+            if route['route_id'] in states else route
+            for route in routes
+        ])
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/currencies/")
-async def get_currencies() -> Dict[str, Union[List[str], Dict[str, str], Dict[str, float]]]:
+async def get_currencies() -> Dict[str, Any]:
+    snapshot = currency_rates.snapshot
     return {
-        "currencies": list(CURRENCY_RATES.keys()),
+        "currencies": list(snapshot.rates),
         "symbols": CURRENCY_SYMBOLS,
-        "rates": CURRENCY_RATES
+        "rates": snapshot.rates,
+        "version": snapshot.version,
+        "updated_at": datetime.fromtimestamp(snapshot.updated_at, timezone.utc).isoformat(),
     }
 
 @app.get("/api/countries")
@@ -323,111 +809,590 @@ def get_countries():
     Returns:
         Dict: Countries with their cities
     """
-    countries_data = {
-        "Kenya": [
-            "Nairobi", "Mombasa", "Kisumu", "Nakuru", "Eldoret", 
-            "Thika", "Malindi", "Kitale", "Garissa", "Kakamega"
-        ],
-        "Rwanda": [
-            "Kigali", "Butare", "Gitarama", "Ruhengeri", "Gisenyi",
-            "Cyangugu", "Kibungo", "Byumba", "Gikongoro", "Kibuye"
-        ],
-        "Uganda": [
-            "Kampala", "Entebbe", "Jinja", "Mbale", "Gulu", 
-            "Lira", "Mbarara", "Kasese", "Soroti", "Arua"
-        ],
-        "Tanzania": [
-            "Dar es Salaam", "Arusha", "Mwanza", "Dodoma", "Mbeya",
-            "Tanga", "Morogoro", "Tabora", "Kigoma", "Iringa"
-        ]
-    }
+    return COUNTRIES_RESPONSE
+
+@app.get("/api/routes/search")
+async def search_routes(
+    origin: Optional[str] = None,
+    destination: Optional[str] = None,
+    country_origin: Optional[str] = None,
+    country_destination: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Find routes by origin and/or destination from the in-memory index.
+    
+    Matching is case- and accent-insensitive; country filters are optional.
     
+    Returns:
+        Dict: Matching routes with prices in all currencies
+    """
+    try:
+        index = await route_search.index()
+        routes = index.routes(origin, destination, country_origin, country_destination)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"routes": routes, "count": len(routes)}
+
+# Default and allowed fields of the combined search response
+SEARCH_ROUTE_FIELDS = (
+    "route_id", "origin", "destination", "country_origin", "country_destination",
+    "duration_hours",
+)
+SEARCH_ROUTE_OPTIONAL_FIELDS = (
+    "base_price", "base_currency", "prices", "formatted_prices",
+    "origin_coords", "destination_coords", "waypoints",
+)
+SEARCH_BUS_FIELDS = (
+    "bus_id", "departure_time", "arrival_time", "bus_number", "status", "total_seats",
+)
+SEARCH_BUS_OPTIONAL_FIELDS = (
+    "driver_name", "driver_phone", "seat_layout", "available_seats",
+)
+
+def select_fields(requested: Optional[str], default: tuple, optional: tuple) -> List[str]:
+    """Parse a comma-separated field list, keeping only known fields"""
+    if not requested:
+        return list(default)
+    allowed = set(default) | set(optional)
+    extra = [f.strip() for f in requested.split(",") if f.strip() in allowed]
+    return list(dict.fromkeys([*default, *extra]))
+
+@app.get("/api/search")
+@limiter.limit("100/minute")
+async def search_departures(
+    request: Request,
+    origin: str,
+    destination: str,
+    date: str,
+    currency: str = "USD",
+    fields: Optional[str] = None,
+    bus_fields: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Routes, their departures on a date and seat availability in one call.
+    
+    Routes come from the in-memory index; buses and seat counts for all
+    matching routes are fetched with one batched query each, in parallel.
+    
+    Args:
+        origin (str): Departure city.
+        destination (str): Arrival city.
+        date (str): Travel date, YYYY-MM-DD.
+        currency (str, optional): Currency of ``price``. Defaults to "USD".
+        fields (str, optional): Comma-separated extra route fields.
+        bus_fields (str, optional): Comma-separated extra departure fields,
+            e.g. ``available_seats`` for the seat list.
+    
+    Returns:
+        Dict: Matching routes, each with its departures
+    """
+    if currency not in currency_rates:
+        raise HTTPException(status_code=400, detail=f"Unsupported currency: {currency}")
+    route_fields = select_fields(fields, SEARCH_ROUTE_FIELDS, SEARCH_ROUTE_OPTIONAL_FIELDS)
+    departure_fields = select_fields(bus_fields, SEARCH_BUS_FIELDS, SEARCH_BUS_OPTIONAL_FIELDS)
+    try:
+        index = await route_search.index()
+        routes = index.routes(origin, destination)[:MAX_SEARCH_ROUTES]
+        if not routes:
+            return {"routes": [], "count": 0, "currency": currency, "date": date}
+        route_ids = [route['route_id'] for route in routes]
+        
+        columns = ",".join(
+            dict.fromkeys(["route_id", "available_seats", *departure_fields])
+        )
+        buses, states = await asyncio.gather(
+            db.select(
+                'buses', columns,
+                [('route_id', in_(route_ids)), ('date', eq(date))],
+                order="departure_time.asc",
+            ),
+            seat_inventory.states(date, route_ids),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    departures: Dict[str, List[Dict[str, Any]]] = {}
+    for bus in buses:
+        route_departures = departures.setdefault(bus['route_id'], [])
+        if len(route_departures) >= MAX_SEARCH_DEPARTURES:
+            continue
+        state = states.get(bus['route_id'])
+        departure = {field: bus.get(field) for field in departure_fields}
+        if state is not None:
+            # Seats are tracked per route and date
+            departure['available_seat_count'] = state.available_count
+            if 'available_seats' in departure:
+                departure['available_seats'] = state.available_seats()
+        else:
+            seats = bus.get('available_seats')
+            departure['available_seat_count'] = (
+                len(seats) if seats is not None else bus.get('total_seats') or SEATS_PER_BUS
+            )
+        route_departures.append(departure)
+    
+    results = []
+    for route in routes:
+        result = {field: route.get(field) for field in route_fields}
+        result['price'] = route['prices'][currency]
+        result['formatted_price'] = route['formatted_prices'][currency]
+        result['departures'] = departures.get(route['route_id'], [])
+        results.append(result)
+    return {"routes": results, "count": len(results), "currency": currency, "date": date}
+
+@app.get("/api/cities/autocomplete")
+async def autocomplete_cities(q: str, country: Optional[str] = None, limit: int = 10) -> Dict[str, Any]:
+    """
+    Suggest cities whose name, or any word of it, starts with ``q``.
+    
+    For example "dar" and "salaam" both suggest Dar es Salaam.
+    """
+    try:
+        index = await route_search.index()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"cities": index.autocomplete(q, country, max(1, min(limit, 50)))}
+
+@app.get("/api/journeys")
+async def plan_journeys(
+    origin: str,
+    destination: str,
+    date: str,
+    currency: str = "USD",
+    sort: str = "duration",
+    k: int = 3,
+    min_connection_minutes: int = 60,
+    max_legs: int = 3,
+) -> Dict[str, Any]:
+    """
+    Plan direct and connecting journeys, e.g. Nairobi -> Kampala -> Kigali.
+    
+    Args:
+        origin (str): Departure city.
+        destination (str): Arrival city.
+        date (str): Travel date of the first leg, YYYY-MM-DD.
+        currency (str, optional): Currency for prices. Defaults to "USD".
+        sort (str, optional): "duration" or "price". Defaults to "duration".
+        k (int, optional): Number of itineraries to return. Defaults to 3.
+        min_connection_minutes (int, optional): Minimum transfer time.
+        max_legs (int, optional): Maximum number of buses. Defaults to 3.
+    
+    Returns:
+        Dict: Itineraries, best first
+    """
+    if currency not in currency_rates:
+        raise HTTPException(status_code=400, detail=f"Unsupported currency: {currency}")
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort: {sort}")
+    try:
+        travel_date = datetime.strptime(date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    try:
+        itineraries = await journey_planner.plan(
+            origin,
+            destination,
+            travel_date,
+            k=max(1, min(k, 10)),
+            sort=sort,
+            currency=currency,
+            min_connection=timedelta(minutes=max(0, min_connection_minutes)),
+            max_legs=max(1, min(max_legs, 4)),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
     return {
-        "countries": countries_data,
-        "total_countries": len(countries_data),
-        "total_cities": sum(len(cities) for cities in countries_data.values())
+        "itineraries": [describe(i, currency, format_price) for i in itineraries],
+        "count": len(itineraries),
     }
 
+async def book_seats(
+    route: Dict[str, Any], rows: List[Dict[str, Any]], hold_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Reserve the seats of one or more booking rows and store them together.
+    
+    The seats are claimed all-or-nothing in one conditional update (or taken
+    over from a seat hold), every row gets a signed ticket token, and all rows
+    are written in one bulk insert. If the insert fails the seats are released.
+    
+    Args:
+        route (Dict[str, Any]): Catalog route all rows belong to.
+        rows (List[Dict[str, Any]]): Booking rows for one route and travel date.
+        hold_id (str, optional): Seat hold covering the seats.
+        
+    Returns:
+        List[Dict[str, Any]]: The created bookings with ticket URL and route
+    """
+    route_id, travel_date = route['route_id'], rows[0]['travel_date']
+    total_seats = route.get('total_seats') or SEATS_PER_BUS
+    seats = [row['seat_number'] for row in rows]
+    
+    if hold_id:
+        # The seats were claimed when the hold was placed. Check that it
+        # covers this booking first: a confirmed hold cannot be used again
+        hold = await seat_holds.get(hold_id)
+        if hold is None:
+            raise HTTPException(status_code=409, detail=f"Seat hold {hold_id} has expired or was already used")
+        if (hold.route_id, hold.travel_date) != (route_id, travel_date) \
+                or not set(seats) <= set(hold.seat_numbers):
+            raise HTTPException(status_code=400, detail="Booking does not match seat hold")
+        try:
+            await seat_holds.confirm(hold_id)
+        except HoldExpiredError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        unused = sorted(set(hold.seat_numbers) - set(seats))
+        if unused:
+            # Give back the held seats this booking does not take
+            await seat_inventory.release(route_id, travel_date, unused, hold.total_seats)
+    else:
+        # Claim the seats in one conditional update; losers get a 400
+        try:
+            await seat_inventory.claim(route_id, travel_date, seats, total_seats)
+        except SeatUnavailableError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+    try:
+        # Store small signed tokens; the QR images are rendered on demand
+        started = time.perf_counter()
+        for row in rows:
+            row['qr_code'] = sign_ticket(row, TICKET_SIGNING_KEY)
+        ticket_latency.observe(time.perf_counter() - started, "sign")
+        created = await db.insert('bookings', rows)
+    except Exception:
+        await seat_inventory.release(route_id, travel_date, seats, total_seats)
+        raise
+    bookings_created(created)
+        
+    return [
+        {**booking, 'ticket_url': ticket_url(booking), 'route': route}
+        for booking in created
+    ]
+
 @app.post("/bookings/", response_model=BookingResponse)
 @limiter.limit("30/minute")
+@limiter.limit("10/minute", key=booking_user)
+@limiter.limit("6/minute", key=client_route)
 async def create_booking(request: Request, booking: Booking) -> BookingResponse:
     """
     Create a new booking with the following steps:
-    1. Validate seat availability
-    2. Generate QR code for ticket
-    3. Update available seats
-    4. Store booking in database
+    1. Atomically claim the seat for the travel date
+    2. Sign a ticket token; its QR code is served by GET /api/tickets/{token}.png
+    3. Store booking in database, releasing the seat if that fails
     
     Args:
         booking (Booking): The booking information
         
     Returns:
-        Dict[str, Any]: The created booking with QR code
+        Dict[str, Any]: The created booking with its ticket token and URL
     """
     try:
         data = booking.dict()
         if not data.get('booking_id'):
             data['booking_id'] = str(uuid.uuid4())
-        data['created_at'] = datetime.now().isoformat()
+        data['created_at'] = datetime.now(timezone.utc).isoformat()
+        hold_id = data.pop('hold_id', None)
         
-        # Check seat availability
-        route_response = supabase.table('routes')\
-            .select("available_seats")\
-            .eq('route_id', booking.route_id)\
-            .execute()
-            
-        if not route_response.data:
+        route = await route_catalog.route(booking.route_id)
+        if not route:
             raise HTTPException(
                 status_code=404, 
                 detail=f"Route {booking.route_id} not found"
             )
             
-        available_seats = route_response.data[0]['available_seats']
-        if booking.seat_number not in available_seats:
+        created = await book_seats(route, [data], hold_id)
+        return created[0]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/bookings/group", response_model=List[BookingResponse])
+@limiter.limit("30/minute")
+@limiter.limit("10/minute", key=booking_user)
+@limiter.limit("6/minute", key=client_route)
+async def create_group_booking(request: Request, group: GroupBooking) -> List[BookingResponse]:
+    """
+    Book several seats on one route and date in a single request.
+    
+    Either every seat is booked or none is; the group shares one seat claim,
+    one bulk insert and one rate-limit hit.
+    
+    Args:
+        group (GroupBooking): The seats and travel details
+        
+    Returns:
+        List[BookingResponse]: One booking per seat
+    """
+    try:
+        route = await route_catalog.route(group.route_id)
+        if not route:
             raise HTTPException(
-                status_code=400, 
-                detail=f"Seat {booking.seat_number} is not available for this route"
+                status_code=404, 
+                detail=f"Route {group.route_id} not found"
             )
-            
-        # Generate QR code
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr_data = {
-            'booking_id': data['booking_id'],
-            'user_id': booking.user_id,
-            'route_id': booking.route_id,
-            'seat_number': booking.seat_number,
-            'travel_date': booking.travel_date
-        }
-        qr.add_data(str(qr_data))
-        qr.make(fit=True)
-        
-        # Convert QR code to base64 string
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        qr_code = base64.b64encode(buffered.getvalue()).decode()
-        
-        # Add QR code to booking data
-        data['qr_code'] = qr_code
-            
-        # Create booking
-        response = supabase.table('bookings').insert(data).execute()
-        
-        # Update available seats
-        available_seats.remove(booking.seat_number)
-        supabase.table('routes')\
-            .update({'available_seats': available_seats})\
-            .eq('route_id', booking.route_id)\
-            .execute()
-            
-        return response.data[0]
+        created_at = datetime.now(timezone.utc).isoformat()
+        rows = [
+            {
+                'booking_id': str(uuid.uuid4()),
+                'user_id': group.user_id,
+                'route_id': group.route_id,
+                'travel_date': group.travel_date,
+                'seat_number': seat_number,
+                'status': group.status,
+                'created_at': created_at,
+            }
+            for seat_number in group.seat_numbers
+        ]
+        return await book_seats(route, rows, group.hold_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/holds", response_model=SeatHoldResponse)
+@limiter.limit("30/minute")
+@limiter.limit("6/minute", key=client_route)
+async def create_seat_hold(request: Request, hold: SeatHoldRequest) -> SeatHoldResponse:
+    """
+    Hold seats while the customer pays.
+    
+    Held seats count as unavailable until the hold is used by
+    ``POST /bookings/`` (via ``hold_id``), cancelled, or expires.
+    """
+    try:
+        route = await route_catalog.route(hold.route_id)
+        if not route:
+            raise HTTPException(status_code=404, detail=f"Route {hold.route_id} not found")
+        try:
+            created = await seat_holds.hold(
+                hold.route_id,
+                hold.travel_date,
+                hold.seat_numbers,
+                route.get('total_seats') or SEATS_PER_BUS,
+            )
+        except SeatUnavailableError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return created.to_row()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/api/holds/{hold_id}")
+async def cancel_seat_hold(hold_id: str) -> Dict[str, Any]:
+    try:
+        released = await seat_holds.cancel(hold_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not released:
+        raise HTTPException(status_code=404, detail="Seat hold not found or no longer active")
+    return {"hold_id": hold_id, "released": True}
+
+@app.get("/api/tickets/{token}.png")
+async def get_ticket_image(request: Request, token: str) -> Response:
+    """
+    Serve the QR code PNG for a ticket token.
+    
+    The image depends only on the signed token, so it is rendered once,
+    cached in memory and marked immutable for clients and proxies.
+    """
+    try:
+        verify_ticket(token, TICKET_SIGNING_KEY)
+    except InvalidTicketError:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    etag = f'"{token.rpartition(".")[2]}"'
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": etag,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    started = time.perf_counter()
+    png = await ticket_renderer.render(token)
+    ticket_latency.observe(time.perf_counter() - started, "render")
+    return Response(content=png, media_type="image/png", headers=headers)
+
+@app.put("/buses/{bus_id}/position")
+@limiter.limit("600/minute")
+async def update_bus_position(request: Request, bus_id: str, position: BusPosition) -> Dict[str, Any]:
+    """
+    Record a bus's position and status and push it to every tracking passenger.
+    
+    Goes through the GPS ingestor like batched pings, so the database is
+    updated by the next bulk flush.
+    """
+    known = await known_buses()
+    if known is not None and bus_id not in known:
+        raise HTTPException(status_code=404, detail=f"Bus {bus_id} not found")
+    lat, lon = position.current_location
+    accepted, _ = gps_ingestor.ingest([(bus_id, lat, lon, None, position.status)])
+    return {
+        **gps_ingestor.latest(bus_id).to_event(),
+        "accepted": bool(accepted),
+        "subscribers": tracking_hub.subscribers(bus_id),
+    }
+
+@app.post("/api/gps/pings")
+@limiter.limit("600/minute")
+async def ingest_gps_pings(request: Request, batch: GpsBatch) -> Dict[str, int]:
+    """
+    Accept a batch of GPS pings from any number of buses.
+    
+    Pings of unknown buses, out-of-order, near-duplicate and future points
+    are dropped; the rest are pushed to tracking passengers at once and
+    persisted in the next bulk flush.
+    """
+    accepted, dropped = gps_ingestor.ingest([
+        (p.bus_id, p.lat, p.lon, p.recorded_at, p.status) for p in batch.pings
+    ], known=await known_buses())
+    return {"accepted": accepted, "dropped": dropped}
+
+@app.get("/api/buses/{bus_id}/positions")
+async def get_bus_positions(bus_id: str, limit: int = 20) -> Dict[str, Any]:
+    """Recent positions of a bus from the in-memory track, oldest first"""
+    limit = max(1, min(limit, gps_ingestor.buffer_size))
+    return {
+        "bus_id": bus_id,
+        "positions": [ping.to_event() for ping in gps_ingestor.recent(bus_id, limit)],
+    }
+
+@app.get("/api/bookings/{booking_id}/track")
+async def track_booking(booking_id: str) -> Dict[str, Any]:
+    """Current position, status, progress and ETA of the bus for a booking"""
+    try:
+        bus_id = await bus_for_booking(booking_id)
+        state = await bus_tracking_state(bus_id)
+        route_id = bus_routes[bus_id]
+        await eta_engine.geometry()
+        location = state.get('current_location')
+        progress = eta_engine.estimate(
+            [(route_id, *location)] if location else [], time.time()
+        )
+        return {
+            "booking_id": booking_id,
+            **state,
+            **(progress[0] if progress else dict.fromkeys(ETA_FIELDS)),
+            "route": await route_catalog.route(route_id),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/fleet/eta")
+async def get_fleet_eta() -> Dict[str, Any]:
+    """
+    Progress and ETA of every bus in transit, computed in one batch.
+    
+    Positions come from the GPS buffer where a bus has reported to this
+    worker, and from the buses table otherwise.
+    """
+    try:
+        buses = await db.select(
+            'buses', "bus_id,route_id,current_location,status", {'status': eq("in_transit")}
+        )
+        await eta_engine.geometry()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    located = []
+    for bus in buses:
+        bus_routes[bus['bus_id']] = bus['route_id']
+        ping = gps_ingestor.latest(bus['bus_id'])
+        location = [ping.lat, ping.lon] if ping else bus.get('current_location')
+        if location:
+            located.append({**bus, 'current_location': location})
+    progress = eta_engine.estimate(
+        [(bus['route_id'], *bus['current_location']) for bus in located], time.time()
+    )
+    return {
+        "computed_at": datetime.now(timezone.utc).isoformat(),
+        "buses": [{**bus, **fields} for bus, fields in zip(located, progress)],
+    }
+
+@app.get("/api/bookings/{booking_id}/track/stream")
+async def stream_booking_tracking(booking_id: str) -> StreamingResponse:
+    """
+    Live tracking for a booking as server-sent events.
+    
+    Sends the bus's latest state on connect and then every change; slow
+    clients are disconnected and should reconnect.
+    """
+    try:
+        bus_id = await bus_for_booking(booking_id)
+        await prime_tracking(bus_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        sse_events(bus_id), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+@app.get("/api/buses/{bus_id}/track/stream")
+async def stream_bus_tracking(bus_id: str) -> StreamingResponse:
+    """Live tracking for a bus as server-sent events; 404 for unknown buses"""
+    try:
+        await prime_tracking(bus_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return StreamingResponse(
+        sse_events(bus_id), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+async def send_tracking(websocket: WebSocket, events) -> None:
+    """Forward a subscription's events to a WebSocket, skipping heartbeats"""
+    async for payload in events:
+        if payload is not None:
+            await websocket.send_text(payload)
+
+async def drain_websocket(websocket: WebSocket) -> None:
+    """Read and drop client messages until the client disconnects"""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+@app.websocket("/api/buses/{bus_id}/track/ws")
+async def websocket_bus_tracking(websocket: WebSocket, bus_id: str):
+    """
+    Live tracking for a bus over a WebSocket, one JSON message per change.
+    
+    The client's side is read alongside, so a disconnect ends the
+    subscription at once rather than at the next change. Unknown buses
+    are refused with close code 1008.
+    """
+    await websocket.accept()
+    try:
+        await prime_tracking(bus_id)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    except Exception as e:
+        logger.error(f"Tracking state of bus {bus_id} unavailable: {e}")
+        await websocket.close(code=1011)
+        return
+    events = tracking_hub.events(bus_id)
+    sending = asyncio.ensure_future(send_tracking(websocket, events))
+    receiving = asyncio.ensure_future(drain_websocket(websocket))
+    try:
+        await asyncio.wait({sending, receiving}, return_when=asyncio.FIRST_COMPLETED)
+        if sending.done() and not sending.cancelled() and sending.exception() is None:
+            # Evicted for falling behind; the client reconnects
+            await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in (sending, receiving):
+            task.cancel()
+        await asyncio.gather(sending, receiving, return_exceptions=True)
+        # Ends the subscription
+        await events.aclose()
+
 @app.post("/init-routes/")
 async def initialize_routes() -> Dict[str, Any]:
     try:
-        existing = supabase.table('routes').select("route_id").execute()
-        if existing.data:
+        existing = await db.select('routes', "route_id", limit=1)
+        if existing:
             raise HTTPException(
                 status_code=400,
                 detail="Routes are already initialized"
@@ -471,70 +1436,301 @@ async def initialize_routes() -> Dict[str, Any]:
             }
         ]
         
-        response = supabase.table('routes').insert(default_routes).execute()
-        return {"message": "Routes initialized", "count": len(response.data)}
+        response = await db.insert('routes', default_routes)
+        routes_changed()
+        return {"message": "Routes initialized", "count": len(response)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+# Default and allowed fields of the bookings history
+BOOKING_FIELDS = (
+    "booking_id", "user_id", "route_id", "travel_date", "seat_number", "status",
+    "created_at",
+)
+BOOKING_OPTIONAL_FIELDS = ("bus_id", "qr_code")
+# Read for every row to build its ticket URL, whichever fields are returned
+TICKET_FIELDS = ("qr_code", "booking_id", "user_id", "route_id", "seat_number", "travel_date")
+BOOKING_CURSOR_COLUMNS = ("created_at", "booking_id")
+
+@app.get("/bookings/{user_id}")
+async def get_user_bookings(
+    user_id: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fields: Optional[str] = None,
+    route_fields: Optional[str] = None,
+    bus_fields: Optional[str] = None,
+) -> Response:
+    """
+    A user's bookings, newest first, one page at a time.
+    
+    Pages are keyed on ``created_at`` (ties broken by ``booking_id``) rather
+    than offsets, so each page costs the same however long the history is.
+    Heavy columns such as ``qr_code`` are only returned when asked for, and
+    ticket URLs use the token stored at booking time; route details come
+    from the catalog instead of a join.
+    
+    Args:
+        user_id (str): Owner of the bookings.
+        limit (int, optional): Page size, at most MAX_BOOKINGS_PAGE.
+        cursor (str, optional): ``next_cursor`` of the previous page.
+        status (str, optional): Only bookings with this status.
+        date_from (str, optional): Earliest travel date, YYYY-MM-DD.
+        date_to (str, optional): Latest travel date, YYYY-MM-DD.
+        fields (str, optional): Comma-separated extra booking fields.
+        route_fields (str, optional): Comma-separated extra route fields.
+        bus_fields (str, optional): Comma-separated bus fields to embed.
+    
+    Returns:
+        Dict: The page of bookings and the cursor of the next one, None on
+        the last page
+    """
+    limit = max(1, min(limit, MAX_BOOKINGS_PAGE))
+    booking_fields = select_fields(fields, BOOKING_FIELDS, BOOKING_OPTIONAL_FIELDS)
+    route_projection = select_fields(route_fields, SEARCH_ROUTE_FIELDS, SEARCH_ROUTE_OPTIONAL_FIELDS)
+    columns = list(dict.fromkeys([*booking_fields, *TICKET_FIELDS]))
+    if bus_fields:
+        bus_projection = select_fields(bus_fields, (), SEARCH_BUS_FIELDS + SEARCH_BUS_OPTIONAL_FIELDS)
+        columns = [*columns, f"buses({','.join(bus_projection) or 'bus_id'})"]
+    
+    filters = [('user_id', eq(user_id))]
+    if status:
+        filters.append(('status', eq(status)))
+    if date_from:
+        filters.append(('travel_date', f"gte.{date_from}"))
+    if date_to:
+        filters.append(('travel_date', f"lte.{date_to}"))
+    if cursor:
+        try:
+            values = decode_cursor(cursor, len(BOOKING_CURSOR_COLUMNS))
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        filters.append(after(BOOKING_CURSOR_COLUMNS, values))
+    
+    try:
+        # One extra row tells whether there is a next page
+        rows = await db.select(
+            'bookings', ",".join(columns), filters,
+            order=order(BOOKING_CURSOR_COLUMNS), limit=limit + 1,
+        )
+        snapshot = await route_catalog.get()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    page = rows[:limit]
+    bookings = []
+    for row in page:
+        booking = {field: row.get(field) for field in booking_fields}
+        booking['ticket_url'] = ticket_url(row)
+        route = snapshot.by_id.get(row['route_id'])
+        booking['route'] = (
+            {field: route.get(field) for field in route_projection} if route else None
+        )
+        if bus_fields:
+            booking['bus'] = row.get('buses')
+        bookings.append(booking)
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor([page[-1][c] for c in BOOKING_CURSOR_COLUMNS])
+    # Built here from stored rows and the catalog, so not validated again
+    return JSONBytesResponse({"bookings": bookings, "next_cursor": next_cursor, "limit": limit})
+@app.get("/api/admin/dashboard")
+async def get_admin_dashboard() -> Dict[str, Any]:
+    """
+    Booking, revenue and occupancy figures from the running totals.
+    
+    Reads cost O(routes): the totals are kept up to date per booking and
+    seat change, in every worker, and reloaded from a database aggregate
+    in the background.
+    """
+    try:
+        active = await db.select('buses', "bus_id", {'status': eq("in_transit")})
+        return await dashboard.summary(active_buses=len(active))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/admin/buses")
+async def get_admin_buses(limit: int = 200) -> Dict[str, Any]:
+    """Buses from today onwards with their passenger counts"""
+    limit = max(1, min(limit, 1000))
+    try:
+        buses = await db.select(
+            'buses', "bus_id,bus_number,route_id,date,departure_time,status,total_seats",
+            [('date', f"gte.{dashboard.today()}")],
+            order="date.asc,departure_time.asc", limit=limit,
+        )
+        snapshot = await route_catalog.get()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-# Fix 1: Update get_user_bookings to include buses data
-@app.get("/bookings/{user_id}",response_model=List[BookingResponse])
-async def get_user_bookings(user_id: str) -> List[BookingResponse]:
+    for bus in buses:
+        route = snapshot.by_id.get(bus['route_id'])
+        bus['route_name'] = f"{route['origin']} → {route['destination']}" if route else None
+        bus['capacity'] = bus.get('total_seats') or SEATS_PER_BUS
+        bus['passenger_count'] = dashboard.totals.booked_seats(bus['route_id'], bus['date']) or 0
+    return {"buses": buses, "count": len(buses)}
+
+@app.get("/api/admin/routes")
+async def get_admin_routes() -> Dict[str, Any]:
+    """Catalog routes with their booking and occupancy totals"""
     try:
-        response = supabase.table('bookings')\
-            .select("*, routes(*), buses(*)")\
-            .eq('user_id', user_id)\
-            .execute()
-        return response.data
+        snapshot = await route_catalog.get()
+        summary = await dashboard.summary(active_buses=0)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    stats = {route['route_id']: route for route in summary['routes']}
+    routes = [
+        {**route, 'currency': route.get('base_currency') or "USD", **stats.get(route['route_id'], {})}
+        for route in snapshot.routes
+    ]
+    return {"routes": routes, "count": len(routes)}
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_DATE_FIELDS = ("created_at", "travel_date")
+
+@app.get("/api/admin/bookings/export")
+async def export_bookings_range(
+    date_from: str,
+    date_to: str,
+    format: str = "ndjson",
+    currency: str = "USD",
+    by: str = "created_at",
+) -> StreamingResponse:
+    """
+    Stream all bookings of a date range with route and price details.
+    
+    Bookings are read in pages and written out as they arrive, so memory
+    use does not depend on the size of the export.
+    
+    Args:
+        date_from (str): First day, YYYY-MM-DD.
+        date_to (str): Last day, YYYY-MM-DD, inclusive.
+        format (str, optional): "ndjson" or "csv". Defaults to "ndjson".
+        currency (str, optional): Currency of the prices. Defaults to "USD".
+        by (str, optional): Date the range applies to, "created_at" or
+            "travel_date". Defaults to "created_at".
+    
+    Returns:
+        StreamingResponse: The export as an attachment
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    if currency not in currency_rates:
+        raise HTTPException(status_code=400, detail=f"Unsupported currency: {currency}")
+    if by not in EXPORT_DATE_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported date field: {by}")
+    try:
+        first = datetime.strptime(date_from, "%Y-%m-%d").date()
+        last = datetime.strptime(date_to, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    filters = [
+        (by, f"gte.{first.isoformat()}"),
+        (by, f"lt.{(last + timedelta(days=1)).isoformat()}"),
+    ]
+    chunks = export_bookings(
+        db, route_catalog, filters,
+        fmt=format, currency=currency, sort=(by, "booking_id"), page_size=EXPORT_PAGE_SIZE,
+    )
+    filename = f"bookings-{first.isoformat()}-{last.isoformat()}.{format}"
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 @app.put("/routes/{route_id}/seats", response_model=Route)
 @limiter.limit("50/minute")
 async def update_seat_status(request: Request, route_id: str, update: SeatUpdate) -> Route:
     try:
-        route = supabase.table('routes')\
-            .select("available_seats")\
-            .eq('route_id', update.route_id)\
-            .single()\
-            .execute()
+        route = await route_catalog.route(update.route_id)
             
-        if not route.data:
+        if not route:
             raise HTTPException(status_code=404, detail="Route not found")
-            
-        available_seats = route.data['available_seats']
+        total_seats = route.get('total_seats') or SEATS_PER_BUS
+        seat = [update.seat_number]
         
-        if update.status == "booked" and update.seat_number in available_seats:
-            available_seats.remove(update.seat_number)
-        elif update.status == "available" and update.seat_number not in available_seats:
-            available_seats.append(update.seat_number)
-            available_seats.sort()
-            
-        response = supabase.table('routes')\
-            .update({'available_seats': available_seats})\
-            .eq('route_id', update.route_id)\
-            .execute()
+        if update.status == "booked":
+            try:
+                state = await seat_inventory.claim(
+                    update.route_id, update.travel_date, seat, total_seats
+                )
+            except SeatUnavailableError:
+                # Already booked, nothing to change
+                state = await seat_inventory.state(
+                    update.route_id, update.travel_date, total_seats
+                )
+        elif update.status == "available":
+            state = await seat_inventory.release(
+                update.route_id, update.travel_date, seat, total_seats
+            )
+        else:
+            raise HTTPException(status_code=400, detail=f"Unsupported seat status: {update.status}")
             
-        return response.data[0]
+        return {**route, 'available_seats': state.available_seats()}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
     
 @app.on_event("startup")
-async def validate_currency_rates():
-    """Validate currency rates on startup"""
+async def open_rate_limits():
+    """Map the rate limit buckets shared by the workers"""
+    limiter.open()
+
+@app.on_event("startup")
+async def start_event_bus():
+    """Start receiving change events from the other workers"""
+    await event_bus.start()
+
+@app.on_event("startup")
+async def start_currency_rates():
+    """Load current rates, then refresh them in the background"""
     try:
-        for currency, rate in CURRENCY_RATES.items():
-            if not isinstance(rate, (int, float)) or rate <= 0:
-                raise ValueError(f"Invalid rate for {currency}: {rate}")
+        await currency_rates.refresh()
     except Exception as e:
-        logger.error(f"Currency rate validation failed: {e}")
-        raise
-# Fix 2: Enhanced health check
+        logger.error(f"Failed to load currency rates, serving version {currency_rates.version}: {e}")
+    currency_rates.start()
+@app.on_event("startup")
+async def start_health_probing():
+    """Check dependencies once before serving, then in the background"""
+    await health_prober.refresh()
+    health_prober.start()
 
-@app.get("/health")
-async def health_check():
+@app.on_event("startup")
+async def warm_caches():
+    """Build the route catalog and ETA geometry (importing NumPy) before the first request"""
+    if not STARTUP_WARMUP:
+        return
     try:
-        test_query = supabase.table('routes').select("count").limit(1).execute()
-        db_status = "connected" if test_query else "disconnected"
+        await eta_engine.geometry()
     except Exception as e:
-        db_status = f"error: {str(e)}"
+        logger.warning(f"Startup warm-up failed, caches load on first use: {e}")
+
+@app.on_event("startup")
+async def start_seat_hold_expiry():
+    """Start the background task that releases expired seat holds"""
+    seat_holds.start()
+
+@app.on_event("startup")
+async def start_gps_flush():
+    """Start the background task that writes buffered GPS pings"""
+    gps_ingestor.start()
+
+@app.on_event("startup")
+async def start_dashboard_reconciliation():
+    """Start the background task that rebuilds dashboard totals"""
+    dashboard.start()
+
+@app.get("/health")
+async def health_check():
+    """Overall status with the cached database check"""
+    supabase = health_prober.results.get("supabase")
+    if supabase is None:
+        db_status = "unknown"
+    else:
+        db_status = "connected" if supabase["ok"] else f"error: {supabase['error']}"
         
     return {
         "status": "healthy",
@@ -544,11 +1740,38 @@ async def health_check():
         "build_date": BUILD_DATE,
         "environment": os.getenv("ENV", "development")
     }
+
+@app.get("/health/live")
+async def liveness():
+    """The worker is up and serving; touches no dependency"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Cached dependency checks with their age; 503 while a dependency is down or unchecked"""
+    report = health_prober.report()
+    return JSONResponse(
+        status_code=200 if report["ready"] else 503,
+        content={"status": "ready" if report["ready"] else "unavailable", **report},
+    )
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    """Request, database, ticket, currency and rate limit metrics in Prometheus text format"""
+    return Response(content=metrics.render(), media_type=Registry.CONTENT_TYPE)
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down API server")
-    # Add any cleanup code here if needed
+    await health_prober.stop()
+    await currency_rates.stop()
+    await event_bus.stop()
+    await seat_holds.stop()
+    await gps_ingestor.stop()
+    await dashboard.stop()
+    ticket_renderer.close()
+    await db.close()
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
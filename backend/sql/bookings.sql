@@ -0,0 +1,4 @@
+-- Keyset pagination of a user's bookings, see get_user_bookings in
+-- backend/server.py: newest first, ties broken by booking_id.
+create index if not exists bookings_user_created_idx
+    on bookings (user_id, created_at desc, booking_id desc);
@@ -0,0 +1,44 @@
+-- GPS track points and latest bus positions, see backend/gps.py.
+-- Each API worker flushes its buffered pings in one record_bus_positions
+-- call; points of unknown buses are ignored.
+create table if not exists bus_positions (
+    bus_id text not null references buses (bus_id) on delete cascade,
+    recorded_at timestamptz not null,
+    location jsonb not null,
+    status text,
+    primary key (bus_id, recorded_at)
+);
+
+alter table buses add column if not exists location_updated_at timestamptz;
+
+create or replace function record_bus_positions(points jsonb)
+returns integer
+language plpgsql
+as $$
+declare
+    stored integer;
+begin
+    insert into bus_positions (bus_id, recorded_at, location, status)
+    select p.bus_id, p.recorded_at, p.location, p.status
+    from jsonb_to_recordset(points)
+        as p(bus_id text, recorded_at timestamptz, location jsonb, status text)
+    join buses b on b.bus_id = p.bus_id
+    on conflict do nothing;
+    get diagnostics stored = row_count;
+
+    update buses b
+    set current_location = latest.location,
+        status = coalesce(latest.status, b.status),
+        location_updated_at = latest.recorded_at
+    from (
+        select distinct on (p.bus_id) p.bus_id, p.recorded_at, p.location, p.status
+        from jsonb_to_recordset(points)
+            as p(bus_id text, recorded_at timestamptz, location jsonb, status text)
+        order by p.bus_id, p.recorded_at desc
+    ) latest
+    where b.bus_id = latest.bus_id
+      and (b.location_updated_at is null or b.location_updated_at < latest.recorded_at);
+
+    return stored;
+end;
+$$;
@@ -0,0 +1,26 @@
+-- Admin dashboard totals, see backend/dashboard.py. Each API worker reads
+-- the per route and status booking counts here instead of scanning the
+-- bookings table, plus the ids of bookings created since recent_since so
+-- that bookings it also hears about as events are not counted twice.
+create index if not exists bookings_created_idx on bookings (created_at desc, booking_id desc);
+
+create or replace function dashboard_totals(today date, recent_since timestamptz)
+returns jsonb
+language sql
+stable
+as $$
+    select jsonb_build_object(
+        'totals', coalesce((
+            select jsonb_agg(t)
+            from (
+                select route_id, status, count(*) as bookings,
+                       count(*) filter (where (created_at at time zone 'utc')::date = today) as today
+                from bookings
+                group by route_id, status
+            ) t
+        ), '[]'::jsonb),
+        'recent_ids', coalesce((
+            select jsonb_agg(booking_id) from bookings where created_at >= recent_since
+        ), '[]'::jsonb)
+    );
+$$;
@@ -0,0 +1,16 @@
+-- Checkout leases on seats, see backend/holds.py.
+-- The seats of a hold are already set in seat_inventory.booked_mask; status
+-- moves from 'held' to exactly one of 'confirmed', 'cancelled' or 'expired'.
+create table if not exists seat_holds (
+    hold_id text primary key,
+    route_id text not null,
+    travel_date date not null,
+    seat_numbers jsonb not null,
+    total_seats smallint not null default 44,
+    expires_at timestamptz not null,
+    status text not null default 'held',
+    created_at timestamptz not null default now()
+);
+
+create index if not exists seat_holds_held_expiry_idx
+    on seat_holds (expires_at) where status = 'held';
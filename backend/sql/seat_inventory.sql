@@ -0,0 +1,11 @@
+-- Seat state per route and travel date, see backend/seats.py.
+-- booked_mask bit n-1 is set when seat n is booked; every write bumps version
+-- and is conditioned on the version it read.
+create table if not exists seat_inventory (
+    route_id text not null,
+    travel_date date not null,
+    total_seats smallint not null default 44,
+    booked_mask bigint not null default 0,
+    version bigint not null default 0,
+    primary key (route_id, travel_date)
+);
@@ -0,0 +1,540 @@
+"""
+Embedded SQLite storage for depots that must keep booking when offline.
+
+``SqliteStore`` keeps the API's tables in a local file and understands the
+same PostgREST-style filters, orders and select lists as ``db.Database``,
+so the handlers run on it unchanged. The file is in WAL mode: readers do
+not wait for the writer, and every uvicorn worker on the host can open it,
+with writes from different workers queued on SQLite's lock for up to
+``busy_timeout``. Queries come from a few fixed shapes with ``?``
+parameters, so the connection's statement cache keeps them prepared. Each
+worker runs its calls on one thread, off the event loop.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Set, Union
+import asyncio
+import json
+import re
+import sqlite3
+import time
+import uuid
+
+from db import Filters, Observer, PostgrestError, Store, in_
+
+SCHEMA = """
+create table if not exists users (
+    user_id text primary key,
+    email text not null,
+    full_name text not null,
+    phone text not null,
+    preferred_language text not null default 'en',
+    created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+create table if not exists routes (
+    route_id text primary key,
+    origin text not null,
+    destination text not null,
+    country_origin text not null,
+    country_destination text not null,
+    duration_hours integer not null,
+    base_price real not null,
+    base_currency text not null default 'USD',
+    prices text not null default '{}',
+    origin_coords text,
+    destination_coords text,
+    waypoints text not null default '[]',
+    available_seats text,
+    total_seats integer,
+    created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+create table if not exists buses (
+    bus_id text primary key,
+    route_id text not null,
+    bus_number text,
+    date text not null,
+    departure_time text,
+    arrival_time text,
+    total_seats integer not null default 44,
+    available_seats text,
+    seat_layout text,
+    driver_name text,
+    driver_phone text,
+    current_location text,
+    status text not null default 'scheduled',
+    location_updated_at text,
+    created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+create table if not exists bookings (
+    booking_id text primary key,
+    user_id text not null,
+    route_id text not null,
+    bus_id text,
+    travel_date text not null,
+    seat_number integer not null,
+    status text not null default 'pending',
+    qr_code text,
+    created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+create table if not exists seat_inventory (
+    route_id text not null,
+    travel_date text not null,
+    total_seats integer not null default 44,
+    booked_mask integer not null default 0,
+    version integer not null default 0,
+    primary key (route_id, travel_date)
+);
+
+create table if not exists seat_holds (
+    hold_id text primary key,
+    route_id text not null,
+    travel_date text not null,
+    seat_numbers text not null,
+    total_seats integer not null default 44,
+    expires_at text not null,
+    status text not null default 'held',
+    created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+create table if not exists bus_positions (
+    bus_id text not null,
+    recorded_at text not null,
+    location text not null,
+    status text,
+    primary key (bus_id, recorded_at)
+);
+
+create index if not exists bookings_user_created_idx
+    on bookings (user_id, created_at desc, booking_id desc);
+create index if not exists bookings_created_idx on bookings (created_at desc, booking_id desc);
+create index if not exists bookings_route_date_idx on bookings (route_id, travel_date);
+create index if not exists bookings_travel_date_idx on bookings (travel_date);
+create index if not exists buses_route_date_idx on buses (route_id, date);
+create index if not exists buses_date_idx on buses (date);
+create index if not exists seat_inventory_travel_date_idx on seat_inventory (travel_date);
+create index if not exists seat_holds_status_expiry_idx on seat_holds (status, expires_at);
+"""
+
+# Columns holding lists or objects, stored as JSON text
+JSON_COLUMNS = {
+    "routes": {"prices", "origin_coords", "destination_coords", "waypoints", "available_seats"},
+    "buses": {"available_seats", "seat_layout", "current_location"},
+    "seat_holds": {"seat_numbers"},
+    "bus_positions": {"location"},
+}
+
+# Primary key of each table, generated when a row comes without one like
+# the uuid defaults in Postgres, and used to embed it, e.g. "buses(bus_number)"
+PRIMARY_KEYS = {
+    "users": "user_id",
+    "routes": "route_id",
+    "buses": "bus_id",
+    "bookings": "booking_id",
+    "seat_holds": "hold_id",
+}
+
+COMPARISONS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+_EMBED = re.compile(r"(\w+)\(([^)]*)\)")
+
+Function = Callable[..., Any]
+
+
+def _split(raw: str) -> List[str]:
+    """Split on commas outside parentheses and double quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in raw:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char in "()":
+            depth += 1 if char == "(" else -1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    return parts + [current] if current else parts
+
+
+def _unquote(raw: str) -> str:
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        return raw[1:-1].replace('\\"', '"')
+    return raw
+
+
+def _pairs(filters: Optional[Filters]) -> List[Any]:
+    if not filters:
+        return []
+    return list(filters.items()) if isinstance(filters, Mapping) else list(filters)
+
+
+def record_bus_positions(conn: sqlite3.Connection, points: List[Dict[str, Any]]) -> int:
+    """
+    Mirror of the function in backend/sql/bus_positions.sql: store the track
+    points of known buses and move each bus to its latest point.
+    """
+    stored = 0
+    latest: Dict[str, Dict[str, Any]] = {}
+    for point in points:
+        cursor = conn.execute(
+            "insert into bus_positions (bus_id, recorded_at, location, status) "
+            "select ?, ?, ?, ? where exists (select 1 from buses where bus_id = ?) "
+            "on conflict do nothing",
+            (point["bus_id"], point["recorded_at"], json.dumps(point["location"]),
+             point.get("status"), point["bus_id"]),
+        )
+        stored += cursor.rowcount
+        current = latest.get(point["bus_id"])
+        if current is None or point["recorded_at"] > current["recorded_at"]:
+            latest[point["bus_id"]] = point
+    for point in latest.values():
+        conn.execute(
+            "update buses set current_location = ?, status = coalesce(?, status), "
+            "location_updated_at = ? where bus_id = ? "
+            "and (location_updated_at is null or location_updated_at < ?)",
+            (json.dumps(point["location"]), point.get("status"), point["recorded_at"],
+             point["bus_id"], point["recorded_at"]),
+        )
+    return stored
+
+
+def dashboard_totals(conn: sqlite3.Connection, today: str, recent_since: str) -> Dict[str, Any]:
+    """
+    Mirror of the function in backend/sql/dashboard.sql: booking counts per
+    route and status, and ids of the bookings created since ``recent_since``.
+    """
+    # date() and datetime() apply the stored UTC offsets, so days are UTC days
+    totals = [dict(row) for row in conn.execute(
+        "select route_id, status, count(*) as bookings, "
+        "sum(date(created_at) = ?) as today "
+        "from bookings group by route_id, status",
+        (today,),
+    )]
+    recent_ids = [row[0] for row in conn.execute(
+        "select booking_id from bookings where datetime(created_at) >= datetime(?)", (recent_since,)
+    )]
+    return {"totals": totals, "recent_ids": recent_ids}
+
+
+class SqliteStore(Store):
+    """
+    The API's tables in a local SQLite database.
+
+    Args:
+        path (str): Database file, created with the schema if missing.
+        busy_timeout (float): Seconds a write waits for another worker's
+            write to finish before failing with 503.
+        cached_statements (int): Prepared statements kept per connection.
+        observer (Observer, optional): Told the operation, table, status
+            and duration of every call, like ``Database``'s observer.
+
+    The ``timeout`` of each call is accepted for the ``Store`` interface;
+    local calls are bounded by ``busy_timeout`` instead.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        busy_timeout: float = 5.0,
+        cached_statements: int = 256,
+        observer: Optional[Observer] = None,
+    ):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self.observer = observer
+        # name -> fn(connection, **params), run in one transaction
+        self.functions: Dict[str, Function] = {
+            "record_bus_positions": record_bus_positions,
+            "dashboard_totals": dashboard_totals,
+        }
+        self._conn: Optional[sqlite3.Connection] = None
+        self._columns: Dict[str, Set[str]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+    def _connection(self) -> sqlite3.Connection:
+        """The connection, opened and migrated on first use."""
+        if self._conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                isolation_level=None,
+                cached_statements=self.cached_statements,
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("pragma journal_mode = wal")
+            # Durable at checkpoints rather than at every commit; safe in WAL mode
+            conn.execute("pragma synchronous = normal")
+            conn.executescript(SCHEMA)
+            tables = [row[0] for row in conn.execute("select name from sqlite_master where type = 'table'")]
+            self._columns = {
+                table: {row[1] for row in conn.execute(f'pragma table_info("{table}")')}
+                for table in tables
+            }
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("begin immediate")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("rollback")
+            raise
+        conn.execute("commit")
+
+    async def _call(self, operation: str, target: str, fn: Callable[..., Any], *args: Any) -> Any:
+        start = time.perf_counter()
+        status = 0
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+            status = 201 if operation == "insert" else 200
+            return result
+        except PostgrestError as e:
+            status = e.status_code
+            raise
+        except sqlite3.IntegrityError as e:
+            if "UNIQUE" in str(e) or "PRIMARY KEY" in str(e):
+                status = 409
+                raise PostgrestError(409, f"duplicate key value: {e}", "23505")
+            status = 400
+            raise PostgrestError(400, str(e), "23502" if "NOT NULL" in str(e) else None)
+        except sqlite3.OperationalError as e:
+            # Typically "database is locked" after busy_timeout
+            status = 503
+            raise PostgrestError(503, f"{operation} {target} failed: {e}")
+        except sqlite3.Error as e:
+            status = 500
+            raise PostgrestError(500, f"{operation} {target} failed: {e}")
+        finally:
+            if self.observer is not None:
+                self.observer(operation, target, status, time.perf_counter() - start)
+
+    def _table(self, table: str) -> Set[str]:
+        self._connection()
+        columns = self._columns.get(table)
+        if columns is None:
+            raise PostgrestError(404, f'relation "{table}" does not exist', "42P01")
+        return columns
+
+    def _column(self, table: str, column: str) -> str:
+        """``column`` quoted as an identifier, once it is known to exist"""
+        if column not in self._table(table):
+            raise PostgrestError(400, f"column {table}.{column} does not exist", "42703")
+        return f'"{column}"'
+
+    def _encode(self, table: str, column: str, value: Any) -> Any:
+        if value is not None and column in JSON_COLUMNS.get(table, ()):
+            return json.dumps(value)
+        return value
+
+    def _decode(self, table: str, row: sqlite3.Row) -> Dict[str, Any]:
+        json_columns = JSON_COLUMNS.get(table, ())
+        return {
+            key: json.loads(row[key]) if key in json_columns and isinstance(row[key], str) else row[key]
+            for key in row.keys()
+        }
+
+    def _condition(self, table: str, column: str, expression: str, params: List[Any]) -> str:
+        """One PostgREST filter as SQL, appending its values to ``params``"""
+        if column in ("or", "and"):
+            if not (expression.startswith("(") and expression.endswith(")")):
+                raise PostgrestError(400, f"Invalid {column} filter: {expression}", "PGRST100")
+            conditions = []
+            for condition in _split(expression[1:-1]):
+                if condition.startswith(("or(", "and(")):
+                    name, _, inner = condition.partition("(")
+                    conditions.append(self._condition(table, name, "(" + inner, params))
+                else:
+                    name, _, inner = condition.partition(".")
+                    conditions.append(self._condition(table, name, inner, params))
+            return "(" + f" {column} ".join(conditions) + ")"
+
+        name = self._column(table, column)
+        operator, _, raw = expression.partition(".")
+        negate = operator == "not"
+        if negate:
+            operator, _, raw = raw.partition(".")
+        if operator in COMPARISONS:
+            sql = f"{name} {COMPARISONS[operator]} ?"
+            params.append(_unquote(raw))
+        elif operator == "like":
+            sql = f"{name} glob ?"
+            params.append(_unquote(raw).replace("%", "*").replace("_", "?"))
+        elif operator == "ilike":
+            sql = f"{name} like ?"
+            params.append(_unquote(raw).replace("*", "%"))
+        elif operator == "in":
+            options = [_unquote(o) for o in _split(raw[1:-1] if raw.startswith("(") else raw) if o]
+            sql = f"{name} in ({','.join('?' * len(options))})"
+            params.extend(options)
+        elif operator == "is" and raw in ("null", "true", "false"):
+            sql = f"{name} is null" if raw == "null" else f"{name} = {int(raw == 'true')}"
+        else:
+            raise PostgrestError(400, f"Unsupported operator: {operator}", "PGRST100")
+        return f"not ({sql})" if negate else sql
+
+    def _where(self, table: str, filters: Optional[Filters], params: List[Any]) -> str:
+        conditions = [self._condition(table, column, expression, params) for column, expression in _pairs(filters)]
+        return " where " + " and ".join(conditions) if conditions else ""
+
+    def _order(self, table: str, order: str) -> str:
+        clauses = []
+        for clause in order.split(","):
+            column, *modifiers = clause.strip().split(".")
+            descending = "desc" in modifiers
+            # PostgREST puts nulls last in ascending order and first in descending
+            nulls = "first" if "nullsfirst" in modifiers or (descending and "nullslast" not in modifiers) else "last"
+            clauses.append(f"{self._column(table, column)} {'desc' if descending else 'asc'} nulls {nulls}")
+        return " order by " + ", ".join(clauses)
+
+    def _select(
+        self,
+        table: str,
+        columns: str,
+        filters: Optional[Filters],
+        order: Optional[str],
+        limit: Optional[int],
+        offset: Optional[int],
+    ) -> List[Dict[str, Any]]:
+        embeds = {m.group(1): m.group(2) for m in _EMBED.finditer(columns)}
+        names = [c.strip() for c in _EMBED.sub("", columns).split(",") if c.strip()]
+        # Embedded tables are joined on their primary key column in this one
+        keys = [PRIMARY_KEYS.get(embed, "") for embed in embeds]
+        wanted = names if "*" not in names else sorted(self._table(table))
+        fetched = list(dict.fromkeys(wanted + keys)) if embeds else wanted
+        params: List[Any] = []
+        sql = f'select {", ".join(self._column(table, c) for c in fetched)} from "{table}"'
+        sql += self._where(table, filters, params)
+        if order:
+            sql += self._order(table, order)
+        if limit is not None or offset:
+            sql += " limit ? offset ?"
+            params += [-1 if limit is None else limit, offset or 0]
+        rows = [self._decode(table, row) for row in self._connection().execute(sql, params)]
+
+        for embed, inner in embeds.items():
+            key = PRIMARY_KEYS.get(embed, "")
+            values = sorted({row[key] for row in rows if row.get(key) is not None})
+            related = {}
+            if values:
+                matches = self._select(embed, f"{inner or '*'},{key}", [(key, in_(values))], None, None, None)
+                related = {row[key]: row for row in matches}
+            inner_names = [c.strip() for c in (inner or "*").split(",") if c.strip()]
+            for row in rows:
+                match = related.get(row.get(key))
+                if match is not None and "*" not in inner_names:
+                    match = {c: match.get(c) for c in inner_names}
+                row[embed] = match
+        if embeds and "*" not in names:
+            for row in rows:
+                for key in keys:
+                    if key not in names:
+                        row.pop(key, None)
+        return rows
+
+    def _insert(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        on_conflict: Optional[str],
+        resolution: Optional[str],
+    ) -> List[Dict[str, Any]]:
+        key = PRIMARY_KEYS.get(table)
+        target = on_conflict or key or ""
+        conflict = ", ".join(self._column(table, c.strip()) for c in target.split(",") if c.strip())
+        stored = []
+        with self._transaction() as conn:
+            for row in rows:
+                row = dict(row)
+                if key and row.get(key) is None:
+                    row[key] = str(uuid.uuid4())
+                names = [self._column(table, column) for column in row]
+                sql = f'insert into "{table}" ({", ".join(names)}) values ({", ".join("?" * len(names))})'
+                updates = [f"{n} = excluded.{n}" for n in names if n not in conflict.split(", ")]
+                if resolution == "merge-duplicates" and updates:
+                    sql += f" on conflict ({conflict}) do update set {', '.join(updates)}"
+                elif resolution in ("merge-duplicates", "ignore-duplicates"):
+                    sql += " on conflict do nothing"
+                sql += " returning *"
+                values = [self._encode(table, column, value) for column, value in row.items()]
+                stored.extend(self._decode(table, r) for r in conn.execute(sql, values))
+        return stored
+
+    def _update(self, table: str, values: Dict[str, Any], filters: Filters) -> List[Dict[str, Any]]:
+        if not values:
+            return []
+        params = [self._encode(table, column, value) for column, value in values.items()]
+        assignments = ", ".join(f"{self._column(table, column)} = ?" for column in values)
+        sql = f'update "{table}" set {assignments}' + self._where(table, filters, params) + " returning *"
+        return [self._decode(table, row) for row in self._connection().execute(sql, params)]
+
+    def _rpc(self, function: str, params: Dict[str, Any]) -> Any:
+        fn = self.functions.get(function)
+        if fn is None:
+            raise PostgrestError(404, f"Function {function} not found", "PGRST202")
+        with self._transaction() as conn:
+            return fn(conn, **params)
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Optional[Filters] = None,
+        *,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Select rows from a table, see ``Database.select``."""
+        return await self._call("select", table, self._select, table, columns, filters, order, limit, offset)
+
+    async def insert(
+        self,
+        table: str,
+        rows: Union[Dict[str, Any], List[Dict[str, Any]]],
+        *,
+        on_conflict: Optional[str] = None,
+        resolution: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Insert one or many rows in one transaction, see ``Database.insert``."""
+        rows = rows if isinstance(rows, list) else [rows]
+        return await self._call("insert", table, self._insert, table, rows, on_conflict, resolution)
+
+    async def update(
+        self,
+        table: str,
+        values: Dict[str, Any],
+        filters: Filters,
+        *,
+        timeout: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Update the rows matching ``filters`` and return them."""
+        return await self._call("update", table, self._update, table, values, filters)
+
+    async def rpc(
+        self,
+        function: str,
+        params: Optional[Dict[str, Any]] = None,
+        *,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Call a function registered in ``functions``."""
+        return await self._call("rpc", function, self._rpc, function, params or {})
+
+    async def close(self) -> None:
+        """Close the connection; the next call reopens it."""
+        def close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, close)
@@ -0,0 +1,155 @@
+"""
+Signed ticket tokens and on-demand QR rendering.
+
+Bookings store a compact signed token instead of a base64 PNG. The QR image
+is rendered from the token only when a ticket is viewed, in a process pool
+so the CPU work never holds the event loop, and recent images are kept in
+an LRU cache. Since an image is fully determined by its token it can be
+cached by clients and proxies indefinitely.
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+
+
+class InvalidTicketError(ValueError):
+    """Raised when a ticket token is malformed or its signature is wrong."""
+
+
+# Short keys keep the token, and therefore the QR code, small
+_FIELDS = {
+    "b": "booking_id",
+    "u": "user_id",
+    "r": "route_id",
+    "s": "seat_number",
+    "d": "travel_date",
+}
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _signature(payload: str, secret: str) -> str:
+    digest = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).digest()
+    return _b64encode(digest[:16])
+
+
+def sign_ticket(booking: Dict[str, Any], secret: str) -> str:
+    """
+    Create a signed ticket token for a booking.
+
+    Args:
+        booking (Dict[str, Any]): Booking with the fields listed in _FIELDS.
+        secret (str): HMAC signing key.
+
+    Returns:
+        str: ``<payload>.<signature>``, URL safe
+    """
+    claims = {short: booking[name] for short, name in _FIELDS.items()}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_signature(payload, secret)}"
+
+
+def verify_ticket(token: str, secret: str) -> Dict[str, Any]:
+    """
+    Check a token's signature and return the booking fields it carries.
+
+    Raises:
+        InvalidTicketError: If the token is malformed or tampered with.
+    """
+    payload, _, signature = token.partition(".")
+    try:
+        # Compared as bytes: compare_digest rejects non-ASCII str with TypeError
+        valid = bool(payload) and hmac.compare_digest(
+            signature.encode(), _signature(payload, secret).encode()
+        )
+    except UnicodeError:
+        valid = False
+    if not valid:
+        raise InvalidTicketError("Invalid ticket")
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise InvalidTicketError("Invalid ticket")
+    return {name: claims.get(short) for short, name in _FIELDS.items()}
+
+
+def is_ticket_token(value: Optional[str]) -> bool:
+    """Tell tokens apart from legacy base64 PNGs stored in ``qr_code``."""
+    return bool(value) and "." in value
+
+
+def render_qr_png(data: str) -> bytes:
+    """Render ``data`` as a QR code PNG. Runs in a worker process."""
+    from io import BytesIO
+
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+class TicketRenderer:
+    """
+    Renders ticket QR codes in a process pool behind an LRU cache.
+
+    Args:
+        max_workers (int): Size of the process pool, created on first use.
+        cache_size (int): Number of rendered images kept in memory.
+    """
+
+    def __init__(self, max_workers: int = 2, cache_size: int = 1024):
+        self.max_workers = max_workers
+        self.cache_size = cache_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._rendering: Dict[str, asyncio.Future] = {}
+
+    async def render(self, token: str) -> bytes:
+        """Return the PNG for a token, rendering it at most once at a time."""
+        png = self._cache.get(token)
+        if png is not None:
+            self._cache.move_to_end(token)
+            return png
+
+        future = self._rendering.get(token)
+        if future is None:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, render_qr_png, token)
+            self._rendering[token] = future
+            future.add_done_callback(lambda f: self._finish(token, f))
+        # A disconnecting client must not cancel a render others wait on
+        return await asyncio.shield(future)
+
+    def _finish(self, token: str, future: asyncio.Future) -> None:
+        self._rendering.pop(token, None)
+        if not future.cancelled() and future.exception() is None:
+            self._store(token, future.result())
+
+    def _store(self, token: str, png: bytes) -> None:
+        self._cache[token] = png
+        self._cache.move_to_end(token)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
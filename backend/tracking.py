@@ -0,0 +1,134 @@
+"""
+In-process broadcast hub for live bus tracking.
+
+Every bus has one channel holding its latest position/status event and the
+set of passengers subscribed to it. A published event is serialized once
+and pushed to each subscriber's small bounded queue without awaiting, so a
+slow connection can never hold up the publisher or the other passengers.
+A subscriber whose queue is full is evicted; SSE and WebSocket clients
+simply reconnect and start again from the latest event.
+"""
+from typing import Any, AsyncIterator, Dict, Optional, Set
+import asyncio
+import json
+
+import async_timeout
+
+_EVICTED = object()
+
+
+class Subscription:
+    __slots__ = ("queue", "evicted")
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.evicted = False
+
+
+class _Channel:
+    __slots__ = ("latest", "payload", "subscribers")
+
+    def __init__(self):
+        self.latest: Optional[Dict[str, Any]] = None
+        self.payload: Optional[str] = None
+        self.subscribers: Set[Subscription] = set()
+
+
+class TrackingHub:
+    """
+    Fans out bus events to subscribed connections.
+
+    Args:
+        queue_size (int): Events buffered per subscriber before it is
+            considered too slow and evicted.
+        heartbeat (float): Seconds without events after which ``events``
+            yields None so the transport can send a keep-alive.
+    """
+
+    def __init__(self, queue_size: int = 16, heartbeat: float = 15.0):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.evictions = 0
+        self._channels: Dict[str, _Channel] = {}
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(c.subscribers) for c in self._channels.values())
+
+    def subscribers(self, bus_id: str) -> int:
+        channel = self._channels.get(bus_id)
+        return len(channel.subscribers) if channel else 0
+
+    def latest(self, bus_id: str) -> Optional[Dict[str, Any]]:
+        channel = self._channels.get(bus_id)
+        return channel.latest if channel else None
+
+    def publish(self, bus_id: str, event: Dict[str, Any]) -> int:
+        """
+        Record ``event`` as the bus's latest state and push it to subscribers.
+
+        Returns:
+            int: Number of subscribers the event was queued for
+        """
+        channel = self._channels.get(bus_id)
+        if channel is None:
+            channel = self._channels[bus_id] = _Channel()
+        channel.latest = event
+        channel.payload = json.dumps(event, separators=(",", ":"))
+        delivered = 0
+        for subscription in list(channel.subscribers):
+            try:
+                subscription.queue.put_nowait(channel.payload)
+                delivered += 1
+            except asyncio.QueueFull:
+                self._evict(channel, subscription)
+        return delivered
+
+    def subscribe(self, bus_id: str) -> Subscription:
+        """Register a subscriber, primed with the bus's latest event if any."""
+        channel = self._channels.get(bus_id)
+        if channel is None:
+            channel = self._channels[bus_id] = _Channel()
+        subscription = Subscription(self.queue_size)
+        if channel.payload is not None:
+            subscription.queue.put_nowait(channel.payload)
+        channel.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, bus_id: str, subscription: Subscription) -> None:
+        channel = self._channels.get(bus_id)
+        if channel is None:
+            return
+        channel.subscribers.discard(subscription)
+        if not channel.subscribers and channel.latest is None:
+            del self._channels[bus_id]
+
+    async def events(self, bus_id: str) -> AsyncIterator[Optional[str]]:
+        """
+        Serialized events for one subscriber until it is evicted.
+
+        Yields None every ``heartbeat`` seconds without events.
+        """
+        subscription = self.subscribe(bus_id)
+        try:
+            while True:
+                try:
+                    async with async_timeout.timeout(self.heartbeat):
+                        payload = await subscription.queue.get()
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if payload is _EVICTED:
+                    return
+                yield payload
+        finally:
+            self.unsubscribe(bus_id, subscription)
+
+    def _evict(self, channel: _Channel, subscription: Subscription) -> None:
+        channel.subscribers.discard(subscription)
+        subscription.evicted = True
+        self.evictions += 1
+        # Drop the backlog so the end-of-stream marker is seen right away
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(_EVICTED)
@@ -0,0 +1,287 @@
+"""
+Local load tests of the API against the in-memory PostgREST stand-in.
+
+The FastAPI app is driven in-process through httpx's ASGI transport, with
+its singletons pointed at ``tests.fake_postgrest.FakePostgrest`` the way
+tests/test_server.py wires them, so no Supabase project or network is
+needed. ``--latency`` adds a fixed delay to every PostgREST call to model
+the database round trip.
+
+Scenarios:
+    routes       read storm on GET /routes/
+    booking      contended POST /bookings/ on one route, half of them
+                 for seats that are already taken
+    history      GET /bookings/{user_id} paging through a large history
+    tickets      GET /api/tickets/{token}.png rendering distinct QR codes
+
+Each reports throughput and p50/p95/p99 latency.
+
+    python benchmarks/load.py [--latency MS] [--scenario NAME ...]
+    python benchmarks/load.py --save     # store as the baseline
+    python benchmarks/load.py --check    # fail on a regression
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BASELINE = os.path.join(HERE, "load_baseline.json")
+# A run fails --check when its p95 grows, or its throughput shrinks, by more
+# than this factor
+TOLERANCE = 1.5
+# Plus this much p95 slack, so sub-millisecond scenarios are not flaky
+SLACK_MS = 1.0
+
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("SUPABASE_URL", "http://postgrest.local")
+os.environ.setdefault("SUPABASE_KEY", "bench-key")
+os.environ.update(
+    RATE_LIMIT_BACKEND="memory",
+    RATE_LIMIT_ENABLED="false",
+    ACCESS_LOG_SAMPLE_RATE="0",
+    EVENT_BUS_ENABLED="false",
+)
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from dashboard import Dashboard  # noqa: E402
+from db import Database  # noqa: E402
+from events import EventBus  # noqa: E402
+from gps import GpsIngestor  # noqa: E402
+from holds import SeatHolds  # noqa: E402
+from ratelimit import MemoryBackend  # noqa: E402
+from seats import SeatInventory  # noqa: E402
+from tickets import TicketRenderer, sign_ticket  # noqa: E402
+from tracking import TrackingHub  # noqa: E402
+from tests.fake_postgrest import FakePostgrest, dashboard_totals  # noqa: E402
+
+# One INFO line per PostgREST call would dominate the timings
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+Request = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def wire(fake: FakePostgrest) -> None:
+    """Point the app's singletons at the stand-in."""
+    fake.function("dashboard_totals")(dashboard_totals)
+    db = Database("http://postgrest.local", "bench-key", transport=fake.transport(),
+                  observer=server.observe_query, max_concurrency=200)
+    server.db = db
+    server.limiter.backend = MemoryBackend()
+    server.dashboard = Dashboard(db, server.route_catalog)
+    server.event_bus = server.subscribe_events(EventBus(tempfile.gettempdir(), enabled=False))
+    server.seat_inventory = SeatInventory(db, on_change=server.seats_changed)
+    server.seat_holds = SeatHolds(db, server.seat_inventory)
+    server.tracking_hub = TrackingHub()
+    server.booking_buses = {}
+    server.bus_routes = {}
+    server.gps_ingestor = GpsIngestor(db, publish=server.publish_positions)
+    server.ticket_renderer = TicketRenderer(max_workers=2, cache_size=64)
+    server.journey_planner.db = db
+    server.journey_planner.invalidate()
+    server.route_catalog.invalidate()
+    server.bus_catalog.invalidate()
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted ``values``"""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+async def drive(client: httpx.AsyncClient, request: Request, total: int, concurrency: int,
+                expected: Tuple[int, ...] = (200,)) -> Dict[str, Any]:
+    """Send ``total`` requests from ``concurrency`` workers and summarize them."""
+    latencies: List[float] = []
+    errors = 0
+    issued = 0
+
+    async def worker():
+        nonlocal issued, errors
+        while issued < total:
+            i = issued
+            issued += 1
+            start = time.perf_counter()
+            response = await request(client, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code not in expected:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def routes_storm(client: httpx.AsyncClient, fake: FakePostgrest, scale: float) -> Dict[str, Any]:
+    currencies = ("USD", "KES", "UGX", "TZS")
+
+    async def request(client, i):
+        return await client.get("/routes/", params={"currency": currencies[i % len(currencies)]})
+    # Load the catalog before timing
+    for currency in currencies:
+        await client.get("/routes/", params={"currency": currency})
+    return await drive(client, request, int(4000 * scale), 64)
+
+
+async def contended_booking(client: httpx.AsyncClient, fake: FakePostgrest, scale: float) -> Dict[str, Any]:
+    route_id = (await client.get("/routes/")).json()[0]["route_id"]
+    days = max(1, int(5 * scale))
+    first = date(2030, 1, 1)
+
+    async def request(client, i):
+        # Every seat of every day is asked for twice; the second ask loses
+        slot = i // 2
+        return await client.post("/bookings/", json={
+            "user_id": f"u{i % 50}",
+            "route_id": route_id,
+            "travel_date": (first + timedelta(days=slot // 44 % days)).isoformat(),
+            "seat_number": slot % 44 + 1,
+        })
+    return await drive(client, request, days * 44 * 2, 32, expected=(200, 400))
+
+
+async def large_history(client: httpx.AsyncClient, fake: FakePostgrest, scale: float) -> Dict[str, Any]:
+    route_id = (await client.get("/routes/")).json()[0]["route_id"]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    fake.table("bookings").extend(
+        {
+            "booking_id": str(uuid.uuid4()),
+            "user_id": "u-frequent",
+            "route_id": route_id,
+            "travel_date": (start + timedelta(days=i // 40)).date().isoformat(),
+            "seat_number": i % 40 + 1,
+            "status": "confirmed",
+            "created_at": (start + timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(int(2000 * scale))
+    )
+    cursors: Dict[int, str] = {}
+
+    async def request(client, i):
+        # Each of 16 readers pages on from where it stopped, ten pages deep
+        reader = i % 16
+        params = {"limit": 50}
+        if reader in cursors:
+            params["cursor"] = cursors[reader]
+        response = await client.get("/bookings/u-frequent", params=params)
+        cursor = response.json().get("next_cursor")
+        if cursor and (i // 16) % 10 != 9:
+            cursors[reader] = cursor
+        else:
+            cursors.pop(reader, None)
+        return response
+    return await drive(client, request, int(400 * scale), 16)
+
+
+async def ticket_images(client: httpx.AsyncClient, fake: FakePostgrest, scale: float) -> Dict[str, Any]:
+    tokens = [
+        sign_ticket({
+            "booking_id": str(uuid.uuid4()), "user_id": "u1", "route_id": "r1",
+            "seat_number": i % 44 + 1, "travel_date": "2030-01-01",
+        }, server.TICKET_SIGNING_KEY)
+        for i in range(int(200 * scale))
+    ]
+    # Start the render pool before timing
+    await client.get(f"/api/tickets/{tokens[0]}.png")
+
+    async def request(client, i):
+        return await client.get(f"/api/tickets/{tokens[i]}.png")
+    return await drive(client, request, len(tokens), 8)
+
+
+SCENARIOS = {
+    "routes": routes_storm,
+    "booking": contended_booking,
+    "history": large_history,
+    "tickets": ticket_images,
+}
+
+
+async def run(names: List[str], latency: float, scale: float) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for name in names:
+        fake = FakePostgrest(latency=latency)
+        wire(fake)
+        await server.app.router.startup()
+        try:
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                await client.post("/init-routes/")
+                results[name] = await SCENARIOS[name](client, fake, scale)
+        finally:
+            await server.app.router.shutdown()
+    return results
+
+
+def regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any]) -> List[str]:
+    found = []
+    for name, result in results.items():
+        before = baseline.get("scenarios", {}).get(name)
+        if result["errors"]:
+            found.append(f"{name}: {result['errors']} unexpected responses")
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * TOLERANCE + SLACK_MS:
+            found.append(f"{name}: p95 {result['p95_ms']}ms vs baseline {before['p95_ms']}ms")
+        if result["throughput_rps"] * TOLERANCE < before["throughput_rps"]:
+            found.append(f"{name}: {result['throughput_rps']} req/s vs baseline {before['throughput_rps']} req/s")
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--latency", type=float, default=2.0, help="PostgREST latency in milliseconds")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="run only these")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply request counts and data sizes")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--check", action="store_true", help="compare with the stored baseline")
+    args = parser.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    results = asyncio.run(run(names, args.latency / 1000, args.scale))
+
+    print(f"{'scenario':10} {'requests':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for name, r in results.items():
+        print(f"{name:10} {r['requests']:8} {r['throughput_rps']:9.1f} {r['p50_ms']:8.2f} "
+              f"{r['p95_ms']:8.2f} {r['p99_ms']:8.2f} {r['errors']:6}")
+
+    if args.save:
+        with open(BASELINE, "w") as f:
+            json.dump({"latency_ms": args.latency, "scale": args.scale, "scenarios": results}, f, indent=2)
+            f.write("\n")
+    if args.check:
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        if (baseline.get("latency_ms"), baseline.get("scale")) != (args.latency, args.scale):
+            print("Baseline was recorded with other --latency/--scale settings", file=sys.stderr)
+            return 2
+        found = regressions(results, baseline)
+        for regression in found:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Throughput of the HTTP middleware stack, before and after the move to pure ASGI.
+
+"before" rebuilds the old stack: an ``@app.middleware("http")`` function
+logging every request with a synchronous f-string, and a
+``BaseHTTPMiddleware`` subclass applying the timeout. "after" uses
+``AccessLogMiddleware`` and ``TimeoutMiddleware`` with logging going
+through the queue handler. Both wrap the same trivial JSON endpoint and a
+streaming one, driven in-process through httpx's ASGI transport so only
+the framework and middleware cost is measured.
+
+    python benchmarks/middleware.py [requests] [concurrency]
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import async_timeout
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from logs import setup_logging, stop_logging  # noqa: E402
+from middleware import AccessLogMiddleware, TimeoutMiddleware  # noqa: E402
+
+
+def routes(app: FastAPI) -> FastAPI:
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(20):
+                yield f"{i}\n"
+        return StreamingResponse(chunks())
+    return app
+
+
+def before() -> FastAPI:
+    app = routes(FastAPI())
+    logger = logging.getLogger("before")
+
+    @app.middleware("http")
+    async def log_requests(request, call_next):
+        logger.info(f"Request: {request.method} {request.url}")
+        return await call_next(request)
+
+    class OldTimeoutMiddleware(BaseHTTPMiddleware):
+        async def dispatch(self, request: Request, call_next):
+            try:
+                async with async_timeout.timeout(30):
+                    return await call_next(request)
+            except asyncio.TimeoutError:
+                return JSONResponse(status_code=504, content={"detail": "Request timeout"})
+
+    app.add_middleware(OldTimeoutMiddleware)
+    return app
+
+
+def after() -> FastAPI:
+    app = routes(FastAPI())
+    app.add_middleware(AccessLogMiddleware, logger=logging.getLogger("after"), sample_rate=0.1)
+    app.add_middleware(TimeoutMiddleware, timeout=30)
+    return app
+
+
+async def run(app: FastAPI, path: str, total: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(50):
+            await client.get(path)
+        remaining = total
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                response = await client.get(path)
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - start)
+
+
+def main() -> None:
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+
+    # The old stack wrote straight to stderr; send that to /dev/null so the
+    # terminal is not what is measured, but keep the formatting and write
+    devnull = open(os.devnull, "w")
+    sink = logging.StreamHandler(devnull)
+    sink.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    old = logging.getLogger("before")
+    old.addHandler(sink)
+    old.setLevel(logging.INFO)
+    old.propagate = False
+
+    setup_logging(logging.INFO, stream=devnull)
+    print(f"{total} requests, concurrency {concurrency}")
+    for path in ("/ping", "/stream"):
+        old_rps = asyncio.run(run(before(), path, total, concurrency))
+        new_rps = asyncio.run(run(after(), path, total, concurrency))
+        print(f"{path:8} before {old_rps:8.0f} req/s   after {new_rps:8.0f} req/s   x{new_rps / old_rps:.2f}")
+    stop_logging()
+
+
+if __name__ == "__main__":
+    main()
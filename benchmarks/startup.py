@@ -0,0 +1,111 @@
+"""
+Cold start cost of a worker: importing backend/server.py, running its
+startup hooks, and serving the first request.
+
+Each run is a fresh interpreter, so nothing is cached between runs; the
+median of several runs is reported. Supabase points at a closed local
+port, so startup measures the app's own work rather than network latency
+(the health check and warm-up fail fast and are logged).
+
+    python benchmarks/startup.py [--runs N] [--backend DIR]
+    python benchmarks/startup.py --save     # store as the baseline
+    python benchmarks/startup.py --check    # fail on a >25% regression
+
+It also lists heavy modules that importing the app pulled in; QR, imaging
+and NumPy should only load when first used.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "startup_baseline.json")
+HEAVY_MODULES = ("numpy", "qrcode", "PIL", "pandas", "boto3", "motor", "fastapi_utils")
+TOLERANCE = 1.25
+
+PROBE = r"""
+import asyncio, json, sys, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+heavy = sorted(m for m in HEAVY if m in sys.modules)
+
+async def main():
+    import httpx
+    began = time.perf_counter()
+    await server.app.router.startup()
+    started = time.perf_counter()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.get("/currencies/")
+        assert response.status_code == 200
+    served = time.perf_counter()
+    await server.app.router.shutdown()
+    return started - began, served - started
+
+startup, first_request = asyncio.run(main())
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "startup_ms": startup * 1000,
+    "first_request_ms": first_request * 1000,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+def measure(backend: str) -> dict:
+    env = dict(
+        os.environ,
+        SUPABASE_URL="http://127.0.0.1:9",
+        SUPABASE_KEY="bench-key",
+        HEALTH_TIMEOUT_SECONDS="0.5",
+    )
+    code = f"HEAVY = {HEAVY_MODULES!r}\n" + PROBE
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=backend, env=env, check=True,
+        capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--backend", default=os.path.join(HERE, "..", "backend"))
+    parser.add_argument("--save", action="store_true", help="store the result as the baseline")
+    parser.add_argument("--check", action="store_true", help="compare with the stored baseline")
+    args = parser.parse_args()
+
+    runs = [measure(args.backend) for _ in range(args.runs)]
+    result = {
+        key: round(statistics.median(run[key] for run in runs), 1)
+        for key in ("import_ms", "startup_ms", "first_request_ms")
+    }
+    result["heavy_modules"] = runs[-1]["heavy_modules"]
+    print(json.dumps(result, indent=2))
+
+    if args.save:
+        with open(BASELINE, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+    if args.check:
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        failures = [
+            f"{key}: {result[key]}ms vs baseline {baseline[key]}ms"
+            for key in ("import_ms", "first_request_ms")
+            if result[key] > baseline[key] * TOLERANCE
+        ]
+        if result["heavy_modules"]:
+            failures.append(f"heavy modules imported at startup: {result['heavy_modules']}")
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
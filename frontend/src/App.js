@@ -23,6 +23,7 @@ const App = () => {
   const [selectedBus, setSelectedBus] = useState(null);
   const [selectedSeats, setSelectedSeats] = useState([]);
   const [currentBooking, setCurrentBooking] = useState(null);
+  const [seatHold, setSeatHold] = useState(null);
   const [trackingBookingId, setTrackingBookingId] = useState(null);
 
   const t = translations[language];
@@ -36,15 +37,21 @@ const App = () => {
     }
 
     try {
-      const routeResponse = await fetch(`${API_BASE}/api/routes/search?origin=${searchData.origin}&destination=${searchData.destination}`);
-      const routeData = await routeResponse.json();
+      // Routes, departures and seat availability in a single round trip
+      const params = new URLSearchParams({
+        origin: searchData.origin,
+        destination: searchData.destination,
+        date: searchData.travelDate,
+        currency: 'KES',
+        bus_fields: 'driver_name,available_seats'
+      });
+      const searchResponse = await fetch(`${API_BASE}/api/search?${params}`);
+      const searchResult = await searchResponse.json();
       
-      if (routeData.routes.length > 0) {
-        const route = routeData.routes[0];
-        const busResponse = await fetch(`${API_BASE}/api/buses/${route.route_id}?date=${searchData.travelDate}`);
-        const busData = await busResponse.json();
+      if (searchResult.routes.length > 0) {
+        const route = searchResult.routes[0];
         
-        setBuses(busData.buses);
+        setBuses(route.departures.map(bus => ({ ...bus, route_id: route.route_id, price: route.price })));
         setSearchResults({ ...searchData, route });
         setCurrentStep('buses');
       } else {
@@ -71,10 +78,34 @@ const App = () => {
     }
   };
 
-  // Proceed to passenger form
-  const handleProceedToPassenger = () => {
-    if (selectedSeats.length > 0) {
+  // Hold the selected seats while the customer fills in details and pays
+  const handleProceedToPassenger = async () => {
+    if (selectedSeats.length === 0) {
+      return;
+    }
+    try {
+      const holdResponse = await fetch(`${API_BASE}/api/holds`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          route_id: selectedBus.route_id,
+          travel_date: searchResults.travelDate,
+          seat_numbers: selectedSeats
+        })
+      });
+      if (!holdResponse.ok) {
+        if (holdResponse.status === 409) {
+          alert('Some of the selected seats were just taken, please choose again');
+          setSelectedSeats([]);
+        } else {
+          alert('Could not hold the selected seats, please try again');
+        }
+        return;
+      }
+      setSeatHold(await holdResponse.json());
       setCurrentStep('passenger');
+    } catch (error) {
+      console.error('Seat hold error:', error);
     }
   };
 
@@ -103,7 +134,8 @@ const App = () => {
         passenger_names: passengerData.passengers.map(p => p.name),
         total_price: selectedSeats.length * selectedBus.price,
         currency: 'KES',
-        travel_date: searchResults.travelDate
+        travel_date: searchResults.travelDate,
+        hold_id: seatHold && seatHold.hold_id
       };
 
       const bookingResponse = await fetch(`${API_BASE}/api/bookings`, {
@@ -125,6 +157,7 @@ const App = () => {
       });
 
       setCurrentBooking(bookingResult.booking);
+      setSeatHold(null);
       setCurrentStep('confirmation');
     } catch (error) {
       console.error('Booking error:', error);
@@ -139,6 +172,7 @@ const App = () => {
     setSelectedBus(null);
     setBuses([]);
     setCurrentBooking(null);
+    setSeatHold(null);
     setTrackingBookingId(null);
   };
 
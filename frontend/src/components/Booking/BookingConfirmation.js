@@ -3,6 +3,7 @@ import React from 'react';
 import { useAppContext } from '../../contexts/AppContext';
 import { translations } from '../../translations';
 import { Button } from '../common/button';
+import { API_BASE } from '../../config/config';
 
 export const BookingConfirmation = ({ booking, onNewBooking, onTrackJourney }) => {
   const { language } = useAppContext();
@@ -23,7 +24,11 @@ export const BookingConfirmation = ({ booking, onNewBooking, onTrackJourney }) =
       {/* QR Code */}
       {booking.qr_code && (
         <div className="mb-8">
-          <img src={booking.qr_code} alt="QR Code" className="mx-auto max-w-48" />
+          <img
+            src={booking.ticket_url ? `${API_BASE}${booking.ticket_url}` : booking.qr_code}
+            alt="QR Code"
+            className="mx-auto max-w-48"
+          />
           <p className="text-sm text-gray-600 mt-2">Show this QR code when boarding</p>
         </div>
       )}
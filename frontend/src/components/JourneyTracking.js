@@ -16,9 +16,18 @@ export const JourneyTracking = ({ bookingId, onBack }) => {
     fetchTrackingData();
     getUserLocation();
     
-    // Update tracking every 30 seconds
-    const interval = setInterval(fetchTrackingData, 30000);
-    return () => clearInterval(interval);
+    // Live updates are pushed by the server; poll only if streaming is unavailable
+    if (!window.EventSource) {
+      const interval = setInterval(fetchTrackingData, 30000);
+      return () => clearInterval(interval);
+    }
+    const source = new EventSource(`${API_BASE}/api/bookings/${bookingId}/track/stream`);
+    source.addEventListener('position', (event) => {
+      const update = JSON.parse(event.data);
+      setTrackingData((current) => ({ ...current, ...update }));
+      setLoading(false);
+    });
+    return () => source.close();
   }, [bookingId]);
 
   const fetchTrackingData = async () => {
@@ -107,11 +116,11 @@ export const JourneyTracking = ({ bookingId, onBack }) => {
           </div>
           <div>
             <p className="text-sm text-gray-600">{t.estimatedArrival}</p>
-            <p className="font-semibold">{new Date(trackingData.eta).toLocaleString()}</p>
+            <p className="font-semibold">{trackingData.eta ? new Date(trackingData.eta).toLocaleString() : '—'}</p>
           </div>
           <div>
             <p className="text-sm text-gray-600">Progress</p>
-            <p className="font-semibold">{trackingData.progress_percentage.toFixed(1)}%</p>
+            <p className="font-semibold">{(trackingData.progress_percentage ?? 0).toFixed(1)}%</p>
           </div>
         </div>
 
@@ -119,7 +128,7 @@ export const JourneyTracking = ({ bookingId, onBack }) => {
         <div className="w-full bg-gray-200 rounded-full h-3 mb-6">
           <div
             className="bg-blue-600 h-3 rounded-full transition-all duration-500"
-            style={{ width: `${trackingData.progress_percentage}%` }}
+            style={{ width: `${trackingData.progress_percentage ?? 0}%` }}
           ></div>
         </div>
 
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+# The backend runs as a flat set of modules from backend/ (``python backend/server.py``)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "backend"))
+
+from tests.fake_postgrest import FakePostgrest  # noqa: E402
+
+
+class Clock:
+    """A time source tests move by hand, for components taking ``clock``."""
+
+    def __init__(self, now: float = 1_722_470_400.0):  # 2024-08-01T00:00:00Z
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def fake():
+    return FakePostgrest()
+
+
+@pytest.fixture
+def db(fake):
+    """A Database served by ``fake``"""
+    return fake.database()
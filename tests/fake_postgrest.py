@@ -0,0 +1,257 @@
+"""
+In-memory PostgREST stand-in for tests.
+
+Serves the subset of the PostgREST API used by the backend through an
+``httpx.MockTransport``: select with column lists and simple embeds,
+filters including or/and groups, ordering, limit/offset, insert, update
+and registered RPC functions. Each request runs atomically between awaits,
+which mirrors row-level locking for single-statement updates.
+"""
+import asyncio
+import copy
+import json
+import re
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import httpx
+
+from dashboard import utc_time
+from db import Database
+
+# Primary key of each table, also used to embed it, e.g. "routes(*)"
+PRIMARY_KEYS = {
+    "routes": "route_id",
+    "buses": "bus_id",
+    "users": "user_id",
+    "bookings": "booking_id",
+    "seat_holds": "hold_id",
+}
+
+_EMBED = re.compile(r"(\w+)\(([^)]*)\)")
+
+
+def _coerce(raw: str, current: Any) -> Any:
+    if isinstance(current, bool):
+        return raw == "true"
+    if isinstance(current, int):
+        return int(raw)
+    if isinstance(current, float):
+        return float(raw)
+    return raw
+
+
+@lru_cache(maxsize=256)
+def _split(raw: str) -> Tuple[str, ...]:
+    """Split on commas outside parentheses and double quotes."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in raw:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char in "()":
+            depth += 1 if char == "(" else -1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    return tuple(parts + [current] if current else parts)
+
+
+def _matches(row: Dict[str, Any], column: str, expression: str) -> bool:
+    if column in ("or", "and"):
+        results = []
+        for condition in _split(expression[1:-1]):
+            if condition.startswith(("or(", "and(")):
+                name, _, inner = condition.partition("(")
+                results.append(_matches(row, name, "(" + inner))
+            else:
+                name, _, inner = condition.partition(".")
+                results.append(_matches(row, name, inner))
+        return any(results) if column == "or" else all(results)
+    operator, _, raw = expression.partition(".")
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        raw = raw[1:-1].replace('\\"', '"')
+    value = row.get(column)
+    if operator == "is":
+        return value is None if raw == "null" else value == (raw == "true")
+    if operator == "in":
+        options = [o.strip('"') for o in raw.strip("()").split(",") if o]
+        return value is not None and str(value) in options
+    if value is None:
+        return False
+    if operator == "not":
+        return not _matches(row, column, raw)
+    target = _coerce(raw, value)
+    if operator == "eq":
+        return value == target
+    if operator == "neq":
+        return value != target
+    if operator == "gt":
+        return value > target
+    if operator == "gte":
+        return value >= target
+    if operator == "lt":
+        return value < target
+    if operator == "lte":
+        return value <= target
+    if operator in ("like", "ilike"):
+        pattern = re.escape(raw).replace(r"\*", ".*").replace("%", ".*")
+        flags = re.IGNORECASE if operator == "ilike" else 0
+        return re.fullmatch(pattern, str(value), flags) is not None
+    raise ValueError(f"Unsupported operator: {operator}")
+
+
+def dashboard_totals(fake: "FakePostgrest", today: str, recent_since: str) -> Dict[str, Any]:
+    """The function in backend/sql/dashboard.sql, to register with ``function``."""
+    totals: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    recent_ids = []
+    since = utc_time(recent_since)
+    for row in fake.table("bookings"):
+        created_at = utc_time(row["created_at"]) if row.get("created_at") else None
+        entry = totals.setdefault((row["route_id"], row.get("status")), {
+            "route_id": row["route_id"], "status": row.get("status"), "bookings": 0, "today": 0,
+        })
+        entry["bookings"] += 1
+        if created_at is not None:
+            entry["today"] += created_at.date().isoformat() == today
+            if created_at >= since:
+                recent_ids.append(row["booking_id"])
+    return {"totals": list(totals.values()), "recent_ids": recent_ids}
+
+
+class FakePostgrest:
+    """
+    A PostgREST server backed by dictionaries.
+
+    Args:
+        latency (float): Seconds every request sleeps before it is served.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.functions: Dict[str, Callable[..., Any]] = {}
+        self.requests: List[httpx.Request] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def database(self, **options: Any) -> Database:
+        """A ``db.Database`` served by this fake; ``options`` go to its constructor."""
+        return Database("http://postgrest.local", "test-key", transport=self.transport(), **options)
+
+    def table(self, name: str) -> List[Dict[str, Any]]:
+        return self.tables.setdefault(name, [])
+
+    def function(self, name: str):
+        """Register a Python callable served at ``/rpc/<name>``."""
+        def decorator(fn):
+            self.functions[name] = fn
+            return fn
+        return decorator
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self.serve(request)
+        except (KeyError, ValueError) as e:
+            return httpx.Response(400, json={"message": str(e), "code": "PGRST100"})
+        finally:
+            self.in_flight -= 1
+
+    def serve(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path.split("/rest/v1/", 1)[1]
+        params = parse_qsl(request.url.query.decode(), keep_blank_values=True)
+        body = json.loads(request.content) if request.content else None
+
+        if path.startswith("rpc/"):
+            fn = self.functions.get(path[4:])
+            if fn is None:
+                return httpx.Response(404, json={"message": f"Function {path[4:]} not found"})
+            return httpx.Response(200, json=fn(self, **(body or {})))
+
+        rows = self.table(path)
+        if request.method == "POST":
+            return self.insert(path, rows, body, dict(params), request.headers.get("Prefer", ""))
+
+        select, order, limit, offset, filters = "*", None, None, 0, []
+        for key, value in params:
+            if key == "select":
+                select = value
+            elif key == "order":
+                order = value
+            elif key == "limit":
+                limit = int(value)
+            elif key == "offset":
+                offset = int(value)
+            else:
+                filters.append((key, value))
+        matched = [r for r in rows if all(_matches(r, c, e) for c, e in filters)]
+
+        if request.method == "PATCH":
+            for row in matched:
+                row.update(copy.deepcopy(body))
+            return httpx.Response(200, json=copy.deepcopy(matched))
+        if request.method == "DELETE":
+            self.tables[path] = [r for r in rows if r not in matched]
+            return httpx.Response(200, json=matched)
+
+        if order:
+            for clause in reversed(order.split(",")):
+                column, _, direction = clause.partition(".")
+                matched.sort(
+                    key=lambda r: (r.get(column) is None, r.get(column)),
+                    reverse=direction.startswith("desc"),
+                )
+        matched = matched[offset:]
+        if limit is not None:
+            matched = matched[:limit]
+        return httpx.Response(200, json=[self.project(r, select) for r in matched])
+
+    def insert(self, table, rows, body, params, prefer) -> httpx.Response:
+        conflict = [c for c in params.get("on_conflict", "").split(",") if c]
+        stored = []
+        for row in copy.deepcopy(body if isinstance(body, list) else [body]):
+            if table in PRIMARY_KEYS:
+                row.setdefault(PRIMARY_KEYS[table], str(uuid.uuid4()))
+            row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+            existing = next(
+                (r for r in rows if conflict and all(r.get(c) == row.get(c) for c in conflict)),
+                None,
+            )
+            if existing is None:
+                rows.append(row)
+            elif "resolution=merge-duplicates" in prefer:
+                existing.update(row)
+                row = existing
+            elif "resolution=ignore-duplicates" in prefer:
+                continue
+            else:
+                return httpx.Response(409, json={"message": "duplicate key value", "code": "23505"})
+            stored.append(copy.deepcopy(row))
+        return httpx.Response(201, json=stored)
+
+    def project(self, row: Dict[str, Any], select: str) -> Dict[str, Any]:
+        embeds = {m.group(1): m.group(2) for m in _EMBED.finditer(select)}
+        columns = [c.strip() for c in _EMBED.sub("", select).split(",") if c.strip()]
+        if "*" in columns:
+            result = copy.deepcopy(row)
+        else:
+            result = {c: copy.deepcopy(row.get(c)) for c in columns}
+        for table, inner in embeds.items():
+            key = PRIMARY_KEYS[table]
+            related: Optional[Dict[str, Any]] = next(
+                (r for r in self.table(table) if r.get(key) == row.get(key)), None
+            )
+            result[table] = self.project(related, inner or "*") if related else None
+        return result
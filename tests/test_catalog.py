@@ -0,0 +1,63 @@
+import asyncio
+
+from catalog import RouteCatalog
+
+
+def make_catalog(rows, clock, delay=0.0):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        if delay:
+            await asyncio.sleep(delay)
+        return [dict(r) for r in rows]
+
+    def prepare(route):
+        route["prices"] = {"USD": route["base_price"]}
+        return route
+
+    return RouteCatalog(loader, prepare, ttl=60, clock=clock), calls
+
+
+def test_concurrent_misses_share_one_load(clock):
+    catalog, calls = make_catalog([{"route_id": "r1", "base_price": 45.0}], clock, delay=0.01)
+
+    async def scenario():
+        return await asyncio.gather(*(catalog.get() for _ in range(50)))
+
+    snapshots = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert {s.version for s in snapshots} == {1}
+    assert snapshots[0].by_id["r1"]["prices"] == {"USD": 45.0}
+
+
+def test_ttl_expiry_and_invalidation_reload(clock):
+    catalog, calls = make_catalog([{"route_id": "r1", "base_price": 45.0}], clock)
+
+    async def scenario():
+        await catalog.get()
+        clock.now += 30
+        await catalog.get()
+        assert len(calls) == 1
+        clock.now += 31
+        assert (await catalog.get()).version == 2
+        catalog.invalidate()
+        assert (await catalog.get()).version == 3
+
+    asyncio.run(scenario())
+    assert len(calls) == 3
+
+
+def test_write_during_load_keeps_snapshot_stale(clock):
+    catalog, calls = make_catalog([{"route_id": "r1", "base_price": 45.0}], clock, delay=0.01)
+
+    async def scenario():
+        load = asyncio.ensure_future(catalog.get())
+        await asyncio.sleep(0.001)
+        catalog.invalidate()
+        await load
+        assert not catalog.is_fresh()
+        await catalog.get()
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
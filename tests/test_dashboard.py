@@ -0,0 +1,86 @@
+import asyncio
+
+from catalog import RouteCatalog
+from dashboard import Dashboard
+from seats import SeatState
+from tests.fake_postgrest import dashboard_totals
+
+
+def make_dashboard(fake, db, clock):
+    fake.function("dashboard_totals")(dashboard_totals)
+
+    async def load_routes():
+        return [{"route_id": "r1", "origin": "Nairobi", "destination": "Kampala"}]
+
+    def prepare(route):
+        route["prices"] = {"USD": 45.0, "KES": 7076.25}
+        return route
+
+    return Dashboard(db, RouteCatalog(load_routes, prepare), clock=clock)
+
+
+def booking(booking_id, created_at="2024-07-31T23:00:00+00:00", seat=1):
+    return {"booking_id": booking_id, "user_id": "u1", "route_id": "r1", "travel_date": "2024-08-02",
+            "seat_number": seat, "status": "confirmed", "created_at": created_at}
+
+
+def test_seat_states_only_move_forward(fake, db, clock):
+    dashboard = make_dashboard(fake, db, clock)
+    dashboard.record_seats("r1", "2024-08-02", SeatState(0b111, 3, 44))
+    dashboard.record_seats("r1", "2024-08-02", SeatState(0b1, 2, 44))
+    dashboard.record_seats("r1", "2024-08-03", SeatState(0b1, 1, 44))
+    dashboard.record_seats("r1", "2024-07-31", SeatState(0b1, 1, 44))  # already travelled
+
+    assert dashboard.totals.booked_seats("r1", "2024-08-02") == 3
+    assert dashboard.totals.route_seats["r1"] == [4, 88]
+
+
+def test_reconcile_keeps_bookings_recorded_while_it_reads(fake, db, clock):
+    fake.latency = 0.01
+    fake.table("bookings").extend(booking(f"k{i}", f"2024-07-0{i + 1}T10:00:00+00:00") for i in range(5))
+    fake.table("seat_inventory").extend([
+        {"route_id": "r1", "travel_date": "2024-08-02", "booked_mask": 0b11111, "version": 5, "total_seats": 44},
+        {"route_id": "r1", "travel_date": "2024-07-30", "booked_mask": 0b1, "version": 1, "total_seats": 44},
+    ])
+    # Stored by another worker just before the reload; its event arrives during it
+    early = booking("early", "2024-07-31T23:59:00+00:00", seat=7)
+    fake.table("bookings").append(early)
+    dashboard = make_dashboard(fake, db, clock)
+
+    async def scenario():
+        reconciling = asyncio.ensure_future(dashboard.reconcile())
+        await asyncio.sleep(0.015)
+        dashboard.record_bookings([early])
+        # Stored after the aggregate was read, but before the recent list is
+        late = booking("late", "2024-08-01T00:00:00+00:00", seat=6)
+        fake.table("bookings").append(late)
+        dashboard.record_bookings([late])
+        dashboard.record_seats("r1", "2024-08-02", SeatState(0b111111, 6, 44))
+        await reconciling
+        return await dashboard.summary(active_buses=0)
+
+    summary = asyncio.run(scenario())
+    totals = dashboard.totals
+    assert totals.total_bookings == 7
+    assert summary["stats"]["revenue"] == {"USD": 315.0, "KES": 49533.75}
+    assert summary["stats"]["today_bookings"] == 1
+    assert totals.route_seats["r1"] == [6, 44]
+    assert [entry["booking_id"] for entry in summary["recent_bookings"]][:3] == ["late", "early", "k4"]
+    assert summary["recent_bookings"][0]["total_price"] == 45.0
+    assert dashboard.reconciled_at == clock.now
+
+
+def test_days_are_utc_days(fake, db, clock):
+    # Just after midnight in Nairobi is still the previous day in UTC
+    fake.table("bookings").extend([
+        booking("k1", "2024-08-01T02:30:00+03:00"),
+        booking("k2", "2024-08-01T03:30:00+03:00"),
+        booking("k3", "2024-08-01T00:30:00"),
+    ])
+    dashboard = make_dashboard(fake, db, clock)
+    asyncio.run(dashboard.reconcile())
+    assert dashboard.totals.by_day == {"2024-08-01": 2}
+
+    dashboard.record_bookings([booking("k4", "2024-08-01T01:00:00+03:00")])
+    dashboard.record_bookings([booking("k5", "2024-08-01T10:00:00+03:00")])
+    assert dashboard.totals.by_day == {"2024-08-01": 3, "2024-07-31": 1}
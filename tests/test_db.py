@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+from db import PostgrestError, eq
+
+
+def test_select_insert_update_roundtrip(fake, db):
+    async def scenario():
+        await db.insert("routes", [
+            {"route_id": "r1", "origin": "Nairobi", "base_price": 45.0},
+            {"route_id": "r2", "origin": "Kampala", "base_price": 35.0},
+        ])
+        cheap = await db.select("routes", "route_id", {"base_price": "lt.40"})
+        updated = await db.update("routes", {"base_price": 50.0}, {"route_id": eq("r1")})
+        one = await db.select_one("routes", "*", {"route_id": eq("r1")})
+        missing = await db.select_one("routes", "*", {"route_id": eq("nope")})
+        await db.close()
+        return cheap, updated, one, missing
+
+    cheap, updated, one, missing = asyncio.run(scenario())
+    assert cheap == [{"route_id": "r2"}]
+    assert updated[0]["base_price"] == 50.0
+    assert one["origin"] == "Nairobi"
+    assert missing is None
+    assert fake.requests[0].headers["apikey"] == "test-key"
+
+
+def test_calls_overlap_up_to_concurrency_limit(fake):
+    fake.latency = 0.05
+    db = fake.database(max_concurrency=5)
+
+    async def scenario():
+        started = time.perf_counter()
+        await asyncio.gather(*(db.select("routes") for _ in range(20)))
+        elapsed = time.perf_counter() - started
+        await db.close()
+        return elapsed
+
+    elapsed = asyncio.run(scenario())
+    # 20 calls of 50ms through 5 slots take ~4 round trips, not 20
+    assert elapsed < 0.5
+    assert fake.max_in_flight == 5
+
+
+def test_timeout_raises_postgrest_error(fake, db):
+    fake.latency = 0.2
+
+    async def scenario():
+        try:
+            await db.select("routes", timeout=0.05)
+        finally:
+            await db.close()
+
+    with pytest.raises(PostgrestError) as exc:
+        asyncio.run(scenario())
+    assert exc.value.status_code == 504
+
+
+def test_http_errors_are_decoded(db):
+    async def scenario():
+        try:
+            await db.rpc("missing_function")
+        finally:
+            await db.close()
+
+    with pytest.raises(PostgrestError) as exc:
+        asyncio.run(scenario())
+    assert exc.value.status_code == 404
+    assert "missing_function" in exc.value.message
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from geometry import FleetGeometry, haversine_m, polyline
+
+NAIROBI = [-1.2921, 36.8219]
+NAKURU = [-0.3031, 36.0800]
+ELDORET = [0.5143, 35.2698]
+KAMPALA = [0.3476, 32.5825]
+
+
+def route(route_id, *points, hours=8):
+    return {
+        "route_id": route_id,
+        "origin_coords": points[0],
+        "waypoints": list(points[1:-1]),
+        "destination_coords": points[-1],
+        "duration_hours": hours,
+    }
+
+
+ROUTES = (
+    route("nbo-kla", NAIROBI, NAKURU, ELDORET, KAMPALA, hours=12),
+    route("nbo-nak", NAIROBI, NAKURU, hours=3),
+    route("nowhere", NAIROBI),
+)
+
+
+def test_haversine_matches_known_distance():
+    assert haversine_m(*NAIROBI, *NAKURU) == pytest.approx(137_000, rel=0.02)
+    assert haversine_m([0, 0], [0, 0], [0, 1], [1, 0]).tolist() == pytest.approx([111_195] * 2, rel=1e-3)
+
+
+def test_polyline_skips_missing_and_repeated_points():
+    assert polyline({"origin_coords": NAIROBI, "waypoints": [NAIROBI, [], NAKURU],
+                     "destination_coords": []}) == [tuple(NAIROBI), tuple(NAKURU)]
+
+
+def test_positions_snap_to_the_nearest_segment():
+    geometry = FleetGeometry(1, ROUTES)
+    total = geometry.totals[geometry.index["nbo-kla"]]
+    nakuru_at = haversine_m(*NAIROBI, *NAKURU)
+    # Halfway to Nakuru, about 5.5 km off the road at a right angle to it
+    midway = [(NAIROBI[0] + NAKURU[0]) / 2 + 0.03, (NAIROBI[1] + NAKURU[1]) / 2 + 0.04]
+
+    located = geometry.locate(
+        ["nbo-kla", "nbo-kla", "nbo-kla", "nbo-nak", "nowhere", "missing"],
+        [NAIROBI[0], NAKURU[0], KAMPALA[0], midway[0], 0.0, 0.0],
+        [NAIROBI[1], NAKURU[1], KAMPALA[1], midway[1], 0.0, 0.0],
+    )
+
+    assert located["covered_m"][:3] == pytest.approx([0, nakuru_at, total])
+    assert located["progress"][:4] == pytest.approx([0, nakuru_at / total, 1, 0.5], abs=0.02)
+    assert located["off_route_m"][3] == pytest.approx(5_560, rel=0.05)
+    assert located["eta_seconds"][0] == pytest.approx(12 * 3600)
+    assert located["eta_seconds"][3] == pytest.approx(1.5 * 3600, rel=0.05)
+    assert np.isnan(located["progress"][4:]).all()
+
+
+def test_batch_matches_one_by_one():
+    geometry = FleetGeometry(1, ROUTES)
+    rng = np.random.default_rng(7)
+    lats = rng.uniform(-1.3, 0.6, 500)
+    lons = rng.uniform(32.5, 36.9, 500)
+    route_ids = rng.choice(["nbo-kla", "nbo-nak"], 500).tolist()
+
+    batch = geometry.locate(route_ids, lats, lons)
+    for i in range(0, 500, 50):
+        single = geometry.locate([route_ids[i]], [lats[i]], [lons[i]])
+        assert single["covered_m"][0] == pytest.approx(batch["covered_m"][i])
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import socket
+import time
+
+from events import EventBus
+
+
+def test_events_reach_other_workers_within_milliseconds(tmp_path):
+    directory = str(tmp_path / "events")
+
+    async def scenario():
+        first, second, third = EventBus(directory), EventBus(directory), EventBus(directory)
+        for bus in (first, second, third):
+            await bus.start()
+        received = {"first": [], "second": [], "third": []}
+        arrived = asyncio.Event()
+        first.subscribe("seats", received["first"].append)
+        second.subscribe("seats", received["second"].append)
+        third.subscribe("routes", received["third"].append)
+
+        def on_seats(event):
+            received["third"].append(event)
+            arrived.set()
+        third.subscribe("seats", on_seats)
+
+        start = time.perf_counter()
+        assert first.publish("seats", "r1/2024-08-01", 7, booked_mask=3, total_seats=44) == 2
+        await asyncio.wait_for(arrived.wait(), 1)
+        latency = time.perf_counter() - start
+        await asyncio.sleep(0.01)
+        for bus in (first, second, third):
+            await bus.stop()
+        return received, latency
+
+    received, latency = asyncio.run(scenario())
+    assert received["first"] == []
+    event, = received["second"]
+    assert (event.topic, event.key, event.version) == ("seats", "r1/2024-08-01", 7)
+    assert event.data == {"booked_mask": 3, "total_seats": 44}
+    assert [e.topic for e in received["third"]] == ["seats"]
+    assert latency < 0.05
+    assert os.listdir(tmp_path / "events") == []
+
+
+def test_sockets_of_dead_workers_are_removed(tmp_path):
+    directory = tmp_path / "events"
+    directory.mkdir()
+    # A worker that exited without cleaning up
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    dead.bind(str(directory / "1-dead.sock"))
+    dead.close()
+
+    async def scenario():
+        bus = EventBus(str(directory))
+        await bus.start()
+        delivered = bus.publish("routes")
+        await bus.stop()
+        return delivered
+
+    assert asyncio.run(scenario()) == 0
+    assert os.listdir(directory) == []
+
+
+def test_disabled_bus_publishes_nothing(tmp_path):
+    async def scenario():
+        bus = EventBus(str(tmp_path / "events"), enabled=False)
+        await bus.start()
+        return bus.running, bus.publish("routes")
+
+    assert asyncio.run(scenario()) == (False, 0)
@@ -0,0 +1,86 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from catalog import RouteCatalog
+from exports import EXPORT_COLUMNS, export_bookings
+
+
+def make_catalog(fake, bookings):
+    fake.table("bookings").extend(bookings)
+
+    async def load_routes():
+        return [{"route_id": "r1", "origin": "Nairobi", "destination": "Kampala",
+                 "country_origin": "Kenya", "country_destination": "Uganda"}]
+
+    def prepare(route):
+        route["prices"] = {"KES": 7076.25}
+        route["formatted_prices"] = {"KES": "Ksh 7,076.25"}
+        return route
+
+    return RouteCatalog(load_routes, prepare)
+
+
+def bookings(count):
+    # Timestamps repeat so pages must break ties on booking_id
+    return [
+        {"booking_id": f"k{i:04d}", "user_id": "u1", "route_id": "r1", "bus_id": None,
+         "travel_date": "2024-08-01", "seat_number": i % 44 + 1, "status": "confirmed",
+         "created_at": f"2024-07-01T10:{i // 10 % 60:02d}:00+00:00", "qr_code": "X" * 5000}
+        for i in range(count)
+    ]
+
+
+def collect(db, catalog, **options):
+    async def scenario():
+        return [chunk async for chunk in export_bookings(db, catalog, [], **options)]
+    return asyncio.run(scenario())
+
+
+def test_ndjson_export_reads_in_pages_and_joins_routes(fake, db):
+    catalog = make_catalog(fake, bookings(250))
+
+    chunks = collect(db, catalog, currency="KES", page_size=100)
+
+    rows = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    assert [row["booking_id"] for row in rows] == [f"k{i:04d}" for i in range(250)]
+    assert rows[0]["origin"] == "Nairobi" and rows[0]["formatted_price"] == "Ksh 7,076.25"
+    assert "qr_code" not in rows[0]
+    assert len(chunks) == 3
+    assert len(fake.requests) == 3
+    assert all("limit=100" in str(request.url) for request in fake.requests)
+
+
+def test_csv_export_starts_with_header(fake, db):
+    catalog = make_catalog(fake, bookings(5))
+
+    chunks = collect(db, catalog, fmt="csv", currency="KES", page_size=5)
+
+    assert chunks[0].strip() == ",".join(EXPORT_COLUMNS)
+    rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert len(rows) == 5 and rows[4]["price"] == "7076.25"
+
+
+def test_next_page_is_prefetched_while_current_is_consumed(fake, db):
+    fake.latency = 0.01
+    catalog = make_catalog(fake, bookings(30))
+
+    async def scenario():
+        chunks = export_bookings(db, catalog, [], page_size=10)
+        await chunks.__anext__()
+        # The second page is already in flight
+        await asyncio.sleep(0)
+        in_flight = fake.in_flight
+        await chunks.aclose()
+        return in_flight
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_unknown_format_is_rejected(fake, db):
+    catalog = make_catalog(fake, [])
+    with pytest.raises(ValueError):
+        collect(db, catalog, fmt="xlsx")
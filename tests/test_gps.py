@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from db import PostgrestError
+from gps import GpsIngestor
+
+
+def record_bus_positions(fake, points):
+    """Mirror of the SQL function in backend/sql/bus_positions.sql"""
+    buses = {bus["bus_id"]: bus for bus in fake.table("buses")}
+    stored = 0
+    for point in sorted(points, key=lambda p: p["recorded_at"]):
+        bus = buses.get(point["bus_id"])
+        if bus is None:
+            continue
+        fake.table("bus_positions").append(point)
+        stored += 1
+        bus["current_location"] = point["location"]
+        bus["status"] = point["status"] or bus.get("status")
+        bus["location_updated_at"] = point["recorded_at"]
+    return stored
+
+
+def make_ingestor(fake, db, clock, **options):
+    fake.function("record_bus_positions")(record_bus_positions)
+    published = []
+    ingestor = GpsIngestor(db, publish=published.append, clock=clock, **options)
+    return ingestor, published
+
+
+def test_duplicate_and_out_of_order_pings_are_dropped(fake, db, clock):
+    ingestor, published = make_ingestor(fake, db, clock, min_distance_m=15, min_interval=60)
+    t = clock.now - 120
+
+    accepted, dropped = ingestor.ingest([
+        ("b1", -1.2900, 36.8200, t, "in_transit"),
+        ("b1", -1.2900, 36.8200, t, None),              # exact duplicate
+        ("b1", -1.2901, 36.8200, t + 5, None),          # ~11 m, too close
+        ("b1", -1.2910, 36.8200, t + 10, None),         # ~111 m
+        ("b1", -1.2950, 36.8200, t + 8, None),          # older than last kept
+        ("b1", -1.2910, 36.8200, t + 75, None),         # parked, but a minute on
+        ("b1", -1.2910, 36.8200, t + 80, "arrived"),    # status change
+        ("b2", 0.5, 35.2, None, None),
+    ])
+
+    assert (accepted, dropped) == (5, 3)
+    assert [p.recorded_at - t for p in ingestor.recent("b1")] == [0, 10, 75, 80]
+    assert ingestor.recent("b1")[1].status == "in_transit"
+    assert ingestor.latest("b1").status == "arrived"
+    assert ingestor.latest("b2").recorded_at == clock.now
+    # One publish per batch
+    [batch] = published
+    assert [bus_id for bus_id, event in batch] == ["b1"] * 4 + ["b2"]
+    assert fake.requests == []
+
+
+def test_ring_buffer_keeps_only_recent_positions(fake, db, clock):
+    ingestor, _ = make_ingestor(fake, db, clock, buffer_size=3, min_distance_m=0)
+    ingestor.ingest([("b1", 0.001 * i, 0.0, 1000.0 + i, None) for i in range(10)])
+
+    assert [p.recorded_at for p in ingestor.recent("b1")] == [1007.0, 1008.0, 1009.0]
+    assert [p.recorded_at for p in ingestor.recent("b1", 2)] == [1008.0, 1009.0]
+    assert ingestor.recent("unknown") == []
+
+
+def test_flush_writes_all_buses_in_one_request(fake, db, clock):
+    fake.table("buses").extend([
+        {"bus_id": "b1", "current_location": [], "status": "scheduled"},
+        {"bus_id": "b2", "current_location": [], "status": "scheduled"},
+    ])
+    ingestor, _ = make_ingestor(fake, db, clock, min_distance_m=0)
+    ingestor.ingest([
+        (bus_id, 0.01 * i, 36.0, clock.now - 50 + i, None)
+        for i in range(50) for bus_id in ("b1", "b2", "ghost")
+    ])
+
+    assert asyncio.run(ingestor.flush()) == 150
+    assert len(fake.requests) == 1
+    assert len(fake.table("bus_positions")) == 100
+    assert fake.table("buses")[0]["current_location"] == [0.49, 36.0]
+    assert fake.table("buses")[1]["status"] == "scheduled"
+    assert asyncio.run(ingestor.flush()) == 0
+    assert len(fake.requests) == 1
+
+
+def test_failed_flush_keeps_points_for_the_next_one(fake, db, clock):
+    fake.table("buses").append({"bus_id": "b1", "current_location": [], "status": "scheduled"})
+    ingestor, _ = make_ingestor(fake, db, clock)
+    del fake.functions["record_bus_positions"]
+    ingestor.ingest([("b1", 1.0, 36.0, clock.now, None)])
+
+    with pytest.raises(PostgrestError):
+        asyncio.run(ingestor.flush())
+    ingestor.ingest([("b1", 2.0, 36.0, clock.now + 1, None)])
+    fake.function("record_bus_positions")(record_bus_positions)
+
+    assert asyncio.run(ingestor.flush()) == 2
+    assert [p["location"] for p in fake.table("bus_positions")] == [[1.0, 36.0], [2.0, 36.0]]
+
+
+def test_unknown_buses_future_pings_and_idle_buffers_are_dropped(fake, db, clock):
+    ingestor, _ = make_ingestor(fake, db, clock, max_buses=2, max_skew=30)
+
+    accepted, dropped = ingestor.ingest([
+        ("b1", 1.0, 36.0, clock.now, None),
+        ("ghost", 1.0, 36.0, clock.now, None),
+        ("b2", 1.0, 36.0, clock.now + 20, None),    # within the clock skew
+        ("b3", 1.0, 36.0, clock.now + 3600, None),  # an hour ahead
+    ], known={"b1", "b2", "b3"})
+    assert (accepted, dropped) == (2, 2)
+    assert ingestor.latest("ghost") is None and ingestor.latest("b3") is None
+
+    # b1 reports again, so b2 is the least recent when b3 needs a buffer
+    ingestor.ingest([("b1", 2.0, 36.0, clock.now + 1, None), ("b3", 1.0, 36.0, clock.now, None)])
+    assert set(ingestor.latest_positions()) == {"b1", "b3"}
+
+
+def test_failed_flush_with_a_full_queue_drops_the_oldest_points(fake, db, clock):
+    fake.latency = 0.01
+    ingestor, _ = make_ingestor(fake, db, clock, min_distance_m=0, max_pending=3)
+    del fake.functions["record_bus_positions"]
+    ingestor.ingest([("b1", 0.01 * i, 36.0, clock.now - 10 + i, None) for i in range(3)])
+
+    async def scenario():
+        flushing = asyncio.ensure_future(ingestor.flush())
+        await asyncio.sleep(0)
+        # Newer pings arrive while the write is in flight
+        ingestor.ingest([("b1", 0.01 * i, 36.0, clock.now - 10 + i, None) for i in range(3, 5)])
+        with pytest.raises(PostgrestError):
+            await flushing
+
+    asyncio.run(scenario())
+    fake.function("record_bus_positions")(record_bus_positions)
+    fake.table("buses").append({"bus_id": "b1", "current_location": [], "status": "scheduled"})
+
+    assert asyncio.run(ingestor.flush()) == 3
+    assert [p["location"][0] for p in fake.table("bus_positions")] == [0.02, 0.03, 0.04]
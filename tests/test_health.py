@@ -0,0 +1,42 @@
+import asyncio
+
+from health import HealthProber
+
+
+def test_readiness_is_served_from_cached_checks(clock):
+    calls = []
+
+    async def database():
+        calls.append("db")
+
+    async def broker():
+        raise ConnectionError("refused")
+
+    prober = HealthProber({"database": database, "broker": broker}, interval=10, clock=clock)
+    assert prober.report()["ready"] is False
+
+    asyncio.run(prober.refresh())
+    clock.now += 4
+    for _ in range(100):
+        report = prober.report()
+    assert calls == ["db"]
+    assert report["ready"] is False
+    assert report["age_seconds"] == 4
+    assert report["checks"]["database"]["ok"] is True
+    assert report["checks"]["broker"]["error"] == "refused"
+
+    del prober.checks["broker"]
+    assert prober.report()["ready"] is True
+    # A prober that stopped refreshing stops reporting ready
+    clock.now += 30
+    assert prober.report()["ready"] is False
+
+
+def test_slow_check_fails_after_timeout():
+    async def hang():
+        await asyncio.sleep(1)
+
+    prober = HealthProber({"database": hang}, timeout=0.01)
+    asyncio.run(prober.refresh())
+    assert prober.ok("database") is False
+    assert "timed out" in prober.results["database"]["error"]
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+from holds import HoldExpiredError, SeatHolds
+from seats import SeatInventory, SeatUnavailableError
+
+
+def make_holds(db, clock, ttl=600):
+    inventory = SeatInventory(db)
+    return SeatHolds(db, inventory, ttl=ttl, clock=clock), inventory
+
+
+def test_held_seats_are_unavailable_until_expiry(fake, db, clock):
+    holds, inventory = make_holds(db, clock)
+
+    async def scenario():
+        hold = await holds.hold("r1", "2024-08-01", [3, 4])
+        with pytest.raises(SeatUnavailableError):
+            await inventory.claim("r1", "2024-08-01", [4])
+        assert (await inventory.states("2024-08-01"))["r1"].booked_seats() == [3, 4]
+
+        clock.now += 599
+        assert await holds.expire_due() == 0
+        clock.now += 2
+        assert await holds.expire_due() == 1
+        assert (await inventory.state("r1", "2024-08-01")).booked_seats() == []
+        with pytest.raises(HoldExpiredError):
+            await holds.confirm(hold.hold_id)
+
+    asyncio.run(scenario())
+    assert fake.table("seat_holds")[0]["status"] == "expired"
+
+
+def test_confirmed_hold_keeps_seats_booked(db, clock):
+    holds, inventory = make_holds(db, clock)
+
+    async def scenario():
+        hold = await holds.hold("r1", "2024-08-01", [7])
+        confirmed = await holds.confirm(hold.hold_id)
+        assert confirmed.seat_numbers == [7]
+        clock.now += 3600
+        assert await holds.expire_due() == 0
+        with pytest.raises(HoldExpiredError):
+            await holds.confirm(hold.hold_id)
+        assert (await inventory.state("r1", "2024-08-01")).booked_seats() == [7]
+
+    asyncio.run(scenario())
+
+
+def test_sweep_expires_holds_of_other_workers(fake, db, clock):
+    crashed, _ = make_holds(db, clock)
+    survivor, inventory = make_holds(fake.database(), clock)
+
+    async def scenario():
+        await crashed.hold("r1", "2024-08-01", [1])
+        clock.now += 601
+        assert await survivor.expire_due() == 0
+        assert await survivor.sweep() == 1
+        assert (await inventory.state("r1", "2024-08-01")).booked_seats() == []
+
+    asyncio.run(scenario())
+
+
+def test_background_task_releases_on_deadline(db):
+    holds, inventory = make_holds(db, clock=time.time, ttl=0.05)
+
+    async def scenario():
+        holds.start()
+        await holds.hold("r1", "2024-08-01", [9])
+        await asyncio.sleep(0.2)
+        await holds.stop()
+        return await inventory.state("r1", "2024-08-01")
+
+    assert asyncio.run(scenario()).booked_seats() == []
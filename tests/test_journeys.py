@@ -0,0 +1,75 @@
+import random
+import time
+from datetime import date, timedelta
+
+from journeys import JourneyGraph, describe, parse_departure
+
+
+def route(route_id, origin, destination, price):
+    return {"route_id": route_id, "origin": origin, "destination": destination,
+            "prices": {"USD": price, "KES": price * 100}}
+
+
+ROUTES = (
+    route("nbo-kla", "Nairobi", "Kampala", 45.0),
+    route("kla-kgl", "Kampala", "Kigali", 35.0),
+    route("nbo-kgl", "Nairobi", "Kigali", 120.0),
+)
+
+
+def bus(bus_id, route_id, day, departs, arrives):
+    return {"bus_id": bus_id, "route_id": route_id, "date": day,
+            "departure_time": departs, "arrival_time": arrives}
+
+
+BUSES = [
+    bus("b1", "nbo-kla", "2024-08-01", "06:00", "18:00"),
+    bus("b2", "kla-kgl", "2024-08-01", "18:30", "02:30"),  # too tight a connection
+    bus("b3", "kla-kgl", "2024-08-01", "20:00", "04:00"),
+    bus("b4", "kla-kgl", "2024-08-02", "08:00", "16:00"),
+    bus("b5", "nbo-kgl", "2024-08-01", "07:00", "23:00"),
+    bus("b6", "nbo-kla", "2024-08-02", "06:00", "18:00"),  # leaves the day after
+]
+
+
+def test_overnight_arrival_rolls_to_next_day():
+    departs, arrives = parse_departure(BUSES[2])
+    assert arrives - departs == timedelta(hours=8)
+
+
+def test_connections_respect_minimum_transfer_time():
+    graph = JourneyGraph(ROUTES, BUSES)
+    found = graph.plan("Nairobi", "kigali", date(2024, 8, 1), k=5)
+    assert [[leg.bus["bus_id"] for leg in itinerary] for itinerary in found] == [
+        ["b5"], ["b1", "b3"], ["b1", "b4"],
+    ]
+    assert graph.plan("Nairobi", "Kigali", date(2024, 8, 1), k=5,
+                      min_connection=timedelta(minutes=20))[1][1].bus["bus_id"] == "b2"
+
+
+def test_price_ordering_and_description():
+    graph = JourneyGraph(ROUTES, BUSES)
+    cheapest = graph.plan("Nairobi", "Kigali", date(2024, 8, 1), k=1, sort="price")[0]
+    summary = describe(cheapest, "KES", lambda amount, currency: f"{currency} {amount:,.2f}")
+    assert summary["transfers"] == 1
+    assert summary["total_price"] == 8000.0
+    assert summary["formatted_total_price"] == "KES 8,000.00"
+    assert summary["total_duration_hours"] == 22.0
+
+
+def test_large_network_stays_fast():
+    rng = random.Random(3)
+    cities = [f"City {i}" for i in range(300)]
+    routes, buses = [], []
+    for i in range(1500):
+        a, b = rng.sample(cities, 2)
+        routes.append(route(f"r{i}", a, b, rng.uniform(5, 60)))
+        for day in ("2024-08-01", "2024-08-02"):
+            hour = rng.randint(0, 22)
+            buses.append(bus(f"b{i}-{day}", f"r{i}", day, f"{hour:02d}:00", f"{(hour + rng.randint(2, 12)) % 24:02d}:30"))
+    graph = JourneyGraph(tuple(routes), buses)
+    started = time.perf_counter()
+    for _ in range(20):
+        a, b = rng.sample(cities, 2)
+        graph.plan(a, b, date(2024, 8, 1), k=3)
+    assert (time.perf_counter() - started) / 20 < 0.25
@@ -0,0 +1,36 @@
+import time
+
+from metrics import Registry
+
+
+def test_histograms_render_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("op_seconds", "Operation latency", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, "select")
+    calls = registry.counter("calls_total", "Calls", ("kind",))
+    calls.inc('say "hi"')
+    registry.callback("rejections_total", "Rejections", ("scope",), lambda: {("book",): 2}, kind="counter")
+
+    lines = registry.render().splitlines()
+    assert lines[:8] == [
+        "# HELP op_seconds Operation latency",
+        "# TYPE op_seconds histogram",
+        'op_seconds_bucket{op="select",le="0.1"} 2',
+        'op_seconds_bucket{op="select",le="1.0"} 3',
+        'op_seconds_bucket{op="select",le="+Inf"} 4',
+        'op_seconds_sum{op="select"} 3.65',
+        'op_seconds_count{op="select"} 4',
+        "# HELP calls_total Calls",
+    ]
+    assert 'calls_total{kind="say \\"hi\\""} 1' in lines
+    assert 'rejections_total{scope="book"} 2' in lines
+    assert latency.count("select") == 4
+
+
+def test_recording_takes_microseconds():
+    latency = Registry().histogram("op_seconds", "Operation latency", ("method", "route", "status"))
+    start = time.perf_counter()
+    for i in range(100_000):
+        latency.observe(0.003, "GET", "/routes/", "200")
+    assert (time.perf_counter() - start) / 100_000 < 5e-6
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from logs import DeferredQueueHandler, JsonFormatter
+from middleware import AccessLogMiddleware, TimeoutMiddleware
+
+
+async def slow(request):
+    await asyncio.sleep(0.2)
+    return JSONResponse({"ok": True})
+
+
+async def stream(request):
+    async def chunks():
+        for i in range(3):
+            await asyncio.sleep(0.05)
+            yield f"{i}\n"
+    return StreamingResponse(chunks())
+
+
+async def fail(request):
+    raise RuntimeError("boom")
+
+
+async def ok(request):
+    return JSONResponse({"ok": True})
+
+
+def make_app():
+    return Starlette(routes=[
+        Route("/slow", slow), Route("/stream", stream), Route("/fail", fail), Route("/ok", ok),
+    ])
+
+
+def request(app, path):
+    async def go():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path)
+    return asyncio.run(go())
+
+
+def test_timeout_answers_504_before_the_response_starts():
+    app = TimeoutMiddleware(make_app(), timeout=0.05)
+    response = request(app, "/slow")
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Request timeout"}
+
+
+def test_timeout_does_not_cut_off_a_started_stream():
+    app = TimeoutMiddleware(make_app(), timeout=0.08)
+    response = request(app, "/stream")
+    assert response.status_code == 200
+    assert response.text == "0\n1\n2\n"
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_access_log_samples_successes_and_keeps_failures():
+    logger = logging.getLogger("test.access")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    records = Records()
+    logger.addHandler(records)
+    draws = iter([0.5, 0.05])
+    app = AccessLogMiddleware(make_app(), logger, sample_rate=0.1, random=lambda: next(draws))
+    try:
+        request(app, "/ok")   # not sampled
+        request(app, "/ok")   # sampled
+        request(app, "/fail")  # always logged, no draw
+    finally:
+        logger.removeHandler(records)
+
+    fields = [record.fields for record in records.records]
+    assert [(f["path"], f["status"]) for f in fields] == [("/ok", 200), ("/fail", 500)]
+    assert records.records[1].levelno == logging.WARNING
+    assert all(f["method"] == "GET" and f["duration_ms"] >= 0 for f in fields)
+
+
+def test_queued_records_are_formatted_by_the_listener():
+    records = []
+    handler = DeferredQueueHandler(type("Q", (), {"put_nowait": records.append})())
+    logger = logging.getLogger("test.queue")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    try:
+        logger.info("seat %s held", 12, extra={"fields": {"route_id": "r1"}})
+    finally:
+        logger.removeHandler(handler)
+
+    record, = records
+    # Still unformatted on the calling side
+    assert record.args == (12,)
+    line = JsonFormatter().format(record)
+    assert '"message": "seat 12 held"' in line and '"route_id": "r1"' in line
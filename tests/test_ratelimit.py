@@ -0,0 +1,81 @@
+import multiprocessing
+import time
+
+import pytest
+
+from ratelimit import MemoryBackend, SharedMemoryBackend, parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate("30/minute") == (30.0, 0.5)
+    assert parse_rate("5/10 seconds") == (5.0, 0.5)
+    with pytest.raises(ValueError):
+        parse_rate("5/fortnight")
+
+
+@pytest.mark.parametrize("make", [
+    lambda tmp_path, clock: MemoryBackend(clock),
+    lambda tmp_path, clock: SharedMemoryBackend(str(tmp_path / "buckets"), slots=1024, clock=clock),
+])
+def test_token_bucket_allows_bursts_then_refills_smoothly(tmp_path, make, clock):
+    backend = make(tmp_path, clock)
+    capacity, rate = parse_rate("30/minute")
+
+    assert [backend.hit("ip:1", capacity, rate) for _ in range(30)] == [0.0] * 30
+    assert backend.hit("ip:1", capacity, rate) == pytest.approx(2.0)
+    assert backend.hit("ip:2", capacity, rate) == 0.0
+    # No window reset: a token comes back every two seconds
+    clock.now += 2
+    assert backend.hit("ip:1", capacity, rate) == 0.0
+    assert backend.hit("ip:1", capacity, rate) > 0
+    clock.now += 3600
+    assert [backend.hit("ip:1", capacity, rate) for _ in range(30)] == [0.0] * 30
+
+
+def test_full_table_reuses_least_recently_used_slot(tmp_path, clock):
+    backend = SharedMemoryBackend(str(tmp_path / "buckets"), slots=16, stripes=2, probes=8, clock=clock)
+    for i in range(200):
+        clock.now += 1
+        assert backend.hit(f"k{i}", 1, 0.001) == 0.0
+    # The most recent keys kept their buckets
+    assert backend.hit("k199", 1, 0.001) > 0
+
+
+def _spend(path, count, results):
+    backend = SharedMemoryBackend(path, slots=1024)
+    results.put(sum(backend.hit("booking:ip", 100, 1e-9) == 0.0 for _ in range(count)))
+
+
+def test_limits_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / "buckets")
+    results = multiprocessing.get_context("fork").Queue()
+    workers = [
+        multiprocessing.get_context("fork").Process(target=_spend, args=(path, 60, results))
+        for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+    assert sum(results.get(timeout=5) for _ in workers) == 100
+
+
+def test_hot_path_check_takes_microseconds(tmp_path):
+    backend = SharedMemoryBackend(str(tmp_path / "buckets"))
+    capacity, rate = parse_rate("1000000/second")
+    start = time.perf_counter()
+    for i in range(20_000):
+        backend.hit(f"ip:{i % 500}", capacity, rate)
+    per_check = (time.perf_counter() - start) / 20_000
+    assert per_check < 50e-6
+
+
+def test_table_of_another_size_is_refused(tmp_path):
+    path = str(tmp_path / "buckets")
+    SharedMemoryBackend(path, slots=1024).close()
+    assert SharedMemoryBackend(path, slots=1024).hit("ip:1", 1, 1.0) == 0.0
+    with pytest.raises(ValueError):
+        SharedMemoryBackend(path, slots=2048)
+    (tmp_path / "other").write_bytes(b"not a table" * 10)
+    with pytest.raises(ValueError):
+        SharedMemoryBackend(str(tmp_path / "other"))
@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import pytest
+
+from events import EventBus
+from rates import CurrencyRates, FileProvider, RateSnapshot, StaticProvider
+
+RATES = {"USD": 1.0, "KES": 157.25, "UGX": 3800.75}
+
+
+def test_conversion_is_a_fixed_point_table_lookup():
+    snapshot = RateSnapshot.build(1, 0.0, RATES)
+    assert snapshot.cross["USD"]["KES"] == 157_250_000_000_000
+    assert snapshot.convert(45.0, "USD", "KES") == 7076.25
+    assert snapshot.convert(7076.25, "KES", "USD") == 45.0
+    assert snapshot.convert(100_000, "UGX", "KES") == 4137.34
+    assert snapshot.convert(0.01, "KES", "KES") == 0.01
+    # Exactly half a cent rounds up, with no float drift
+    assert snapshot.convert(0.02, "USD", "KES") == 3.15
+    with pytest.raises(ValueError):
+        snapshot.convert(1.0, "USD", "EUR")
+
+
+@pytest.mark.parametrize("rates", [{"USD": 1.0, "KES": 0}, {"USD": 2.0}, {"USD": 1.0, "KES": "157"}])
+def test_invalid_rates_are_rejected(rates):
+    with pytest.raises(ValueError):
+        RateSnapshot.build(1, 0.0, rates)
+
+
+def test_refresh_swaps_versioned_snapshots_from_a_file(tmp_path):
+    path = tmp_path / "rates.json"
+    path.write_text(json.dumps({"rates": RATES}))
+    changes = []
+    rates = CurrencyRates(FileProvider(str(path)), RATES)
+    rates.on_change(changes.append)
+
+    asyncio.run(rates.refresh())
+    assert rates.version == 1 and changes == []
+
+    path.write_text(json.dumps({**RATES, "KES": 160.0}))
+    asyncio.run(rates.refresh())
+    assert rates.version == 2 and [s.version for s in changes] == [2]
+    assert rates.convert(10.0, "USD", "KES") == 1600.0
+
+    path.write_text(json.dumps({"USD": 1.0, "KES": -1}))
+    with pytest.raises(ValueError):
+        asyncio.run(rates.refresh())
+    assert rates.version == 2 and "KES" in rates and "EUR" not in rates
+
+
+def test_static_provider_serves_its_rates():
+    rates = CurrencyRates(StaticProvider({"USD": 1.0, "RWF": 1225.5}), RATES)
+    asyncio.run(rates.refresh())
+    assert rates.currencies() == ("USD", "RWF")
+
+
+def test_workers_share_rate_updates_without_echoing(tmp_path):
+    directory = str(tmp_path / "events")
+
+    def worker():
+        # Wired like backend/server.py
+        bus, rates = EventBus(directory), CurrencyRates(StaticProvider(RATES), RATES)
+        rates.on_change(
+            lambda s: bus.publish("rates", version=s.version, updated_at=s.updated_at, rates=s.rates),
+            local_only=True,
+        )
+        bus.subscribe("rates", lambda e: rates.apply(e.version, e.data["updated_at"], e.data["rates"]))
+        return bus, rates
+
+    async def until(condition):
+        for _ in range(100):
+            if condition():
+                return
+            await asyncio.sleep(0.005)
+
+    async def scenario():
+        (first_bus, first), (second_bus, second) = worker(), worker()
+        await first_bus.start()
+        await second_bus.start()
+        first.provider = StaticProvider({**RATES, "KES": 160.0})
+        await first.refresh()
+        await until(lambda: second.version == 2)
+        second.provider = StaticProvider({**RATES, "KES": 161.0})
+        await second.refresh()
+        await until(lambda: first.version == 3)
+        # Give an echo, if there were one, time to arrive
+        await asyncio.sleep(0.05)
+        # A stale or repeated snapshot is ignored
+        assert first.apply(2, 0.0, {**RATES, "KES": 1.0}) is None
+        await first_bus.stop()
+        await second_bus.stop()
+        return first_bus, first, second_bus, second
+
+    first_bus, first, second_bus, second = asyncio.run(scenario())
+    assert (first_bus.sent, second_bus.sent) == (1, 1)
+    assert (first_bus.received, second_bus.received) == (1, 1)
+    assert first.version == second.version == 3
+    assert first.convert(1.0, "USD", "KES") == second.convert(1.0, "USD", "KES") == 161.0
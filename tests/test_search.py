@@ -0,0 +1,41 @@
+import time
+
+from search import SearchIndex, normalize
+
+ROUTES = (
+    {"route_id": "r1", "origin": "Nairobi", "destination": "Dar es Salaam",
+     "country_origin": "Kenya", "country_destination": "Tanzania"},
+    {"route_id": "r2", "origin": "Kampala", "destination": "Gisényi",
+     "country_origin": "Uganda", "country_destination": "Rwanda"},
+    {"route_id": "r3", "origin": "Nairobi", "destination": "Kampala",
+     "country_origin": "Kenya", "country_destination": "Uganda"},
+)
+COUNTRIES = {"Tanzania": ["Dar es Salaam", "Dodoma"], "Kenya": ["Nairobi", "Nakuru"]}
+
+
+def test_normalize_folds_case_accents_and_spaces():
+    assert normalize("  GISÉNYI ") == "gisenyi"
+    assert normalize("Dar  es\tSalaam") == "dar es salaam"
+
+
+def test_exact_route_lookup_and_country_filters():
+    index = SearchIndex(1, ROUTES, COUNTRIES)
+    assert [r["route_id"] for r in index.routes("nairobi", "DAR ES SALAAM")] == ["r1"]
+    assert [r["route_id"] for r in index.routes("Kampala", "gisenyi")] == ["r2"]
+    assert [r["route_id"] for r in index.routes(origin="Nairobi")] == ["r1", "r3"]
+    assert [r["route_id"] for r in index.routes("Nairobi", country_destination="uganda")] == ["r3"]
+    assert index.routes("Nairobi", "Kigali") == []
+
+
+def test_prefix_autocomplete():
+    index = SearchIndex(1, ROUTES, COUNTRIES)
+    assert index.autocomplete("dar") == [{"city": "Dar es Salaam", "country": "Tanzania"}]
+    assert index.autocomplete("salaam")[0]["city"] == "Dar es Salaam"
+    assert index.autocomplete("gise") == [{"city": "Gisényi", "country": "Rwanda"}]
+    assert [c["city"] for c in index.autocomplete("n", country="kenya")] == ["Nairobi", "Nakuru"]
+    assert index.autocomplete("d", country="Kenya") == []
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        index.autocomplete("na")
+    assert (time.perf_counter() - started) / 1000 < 0.001
@@ -0,0 +1,122 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from seats import (
+    SeatInventory,
+    SeatState,
+    SeatUnavailableError,
+    mask_to_seats,
+    seats_to_mask,
+)
+
+
+def test_bitset_roundtrip():
+    assert seats_to_mask([1, 3, 44]) == 0b101 | 1 << 43
+    assert mask_to_seats(seats_to_mask([44, 1, 3])) == [1, 3, 44]
+    state = SeatState(booked_mask=seats_to_mask([2, 3]), version=1, total_seats=5)
+    assert state.available_seats() == [1, 4, 5]
+    assert state.available_seats(unavailable_mask=seats_to_mask([5])) == [1, 4]
+
+
+def test_claim_release_and_rejection(fake, db):
+    inventory = SeatInventory(db)
+
+    async def scenario():
+        await inventory.claim("r1", "2024-08-01", [5, 6])
+        with pytest.raises(SeatUnavailableError) as exc:
+            await inventory.claim("r1", "2024-08-01", [6, 7])
+        assert exc.value.seats == [6]
+        # Same seat on another date is a separate inventory
+        await inventory.claim("r1", "2024-08-02", [6])
+        state = await inventory.release("r1", "2024-08-01", [5])
+        assert state.booked_seats() == [6]
+        with pytest.raises(ValueError):
+            await inventory.claim("r1", "2024-08-01", [45])
+
+    asyncio.run(scenario())
+    rows = {r["travel_date"]: r for r in fake.table("seat_inventory")}
+    assert mask_to_seats(rows["2024-08-01"]["booked_mask"]) == [6]
+    assert mask_to_seats(rows["2024-08-02"]["booked_mask"]) == [6]
+
+
+def test_failing_change_listener_does_not_fail_the_claim(fake, db):
+    def on_change(route_id, travel_date, state):
+        raise OSError("listener down")
+    inventory = SeatInventory(db, on_change=on_change)
+
+    async def scenario():
+        state = await inventory.claim("r1", "2024-08-01", [5, 6])
+        assert state.booked_seats() == [5, 6]
+        assert (await inventory.release("r1", "2024-08-01", [5])).booked_seats() == [6]
+
+    asyncio.run(scenario())
+    assert mask_to_seats(fake.table("seat_inventory")[0]["booked_mask"]) == [6]
+
+
+def test_no_double_booking_under_contention(fake):
+    """Two workers' worth of buyers fight over 44 seats on one route and date."""
+    fake.latency = 0.002
+    workers = [SeatInventory(fake.database()), SeatInventory(fake.database())]
+    rng = random.Random(7)
+    attempts = [(rng.choice(workers), rng.randint(1, 44)) for _ in range(1000)]
+    winners = []
+
+    async def buy(inventory, seat):
+        try:
+            await inventory.claim("r1", "2024-12-24", [seat])
+            winners.append(seat)
+        except SeatUnavailableError:
+            pass
+
+    async def scenario():
+        started = time.perf_counter()
+        await asyncio.gather(*(buy(inventory, seat) for inventory, seat in attempts))
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(scenario())
+    assert sorted(winners) == sorted(set(winners))
+    assert set(winners) == {seat for _, seat in attempts}
+    row = fake.table("seat_inventory")[0]
+    assert mask_to_seats(row["booked_mask"]) == sorted(winners)
+    # Claims are combined into few conditional updates instead of one per buyer
+    writes = sum(1 for r in fake.requests if r.method == "PATCH")
+    assert writes < len(attempts) / 10
+    assert elapsed < 2.0
+
+
+def test_states_announced_by_other_workers_save_a_conflict(fake):
+    mine, theirs = SeatInventory(fake.database()), SeatInventory(fake.database())
+
+    async def scenario():
+        await mine.claim("r1", "2024-08-01", [1])
+        state = await theirs.claim("r1", "2024-08-01", [2])
+        mine.observe("r1", "2024-08-01", state)
+        # An older announcement does not win over the newer one
+        mine.observe("r1", "2024-08-01", SeatState(0b1, 1, 44))
+        writes = sum(r.method == "PATCH" for r in fake.requests)
+        reads = sum(r.method == "GET" for r in fake.requests)
+        state = await mine.claim("r1", "2024-08-01", [3])
+        return state, sum(r.method == "PATCH" for r in fake.requests) - writes, \
+            sum(r.method == "GET" for r in fake.requests) - reads
+
+    state, writes, reads = asyncio.run(scenario())
+    assert state.booked_seats() == [1, 2, 3]
+    # One conditional update, no failed attempt and no re-read
+    assert (writes, reads) == (1, 0)
+
+
+def test_past_travel_dates_are_evicted_on_load(db, clock):
+    inventory = SeatInventory(db, clock=clock)
+
+    async def scenario():
+        await inventory.claim("r1", "2024-07-31", [1])
+        await inventory.claim("r1", "2024-08-02", [1])
+        assert set(inventory._keys) == {("r1", "2024-07-31"), ("r1", "2024-08-02")}
+        clock.now += 2 * 86400  # 2024-08-03
+        await inventory.claim("r1", "2024-08-10", [1])
+        assert set(inventory._keys) == {("r1", "2024-08-10")}
+
+    asyncio.run(scenario())
@@ -0,0 +1,582 @@
+import asyncio
+import json
+import shutil
+import socket
+import tempfile
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from dashboard import Dashboard
+from events import EventBus
+from gps import GpsIngestor
+from holds import SeatHolds
+from ratelimit import MemoryBackend
+from rates import StaticProvider
+from seats import SeatInventory
+from sqlite_store import SqliteStore
+from tracking import TrackingHub
+from tests.fake_postgrest import dashboard_totals
+
+
+def use_store(monkeypatch, db):
+    """Point the server's singletons at ``db``; returns the event bus directory"""
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server.limiter, "backend", MemoryBackend())
+    dashboard = Dashboard(db, server.route_catalog)
+    monkeypatch.setattr(server, "dashboard", dashboard)
+    # Unix socket paths are limited to about 100 bytes, so not under tmp_path
+    events = tempfile.mkdtemp(prefix="events-")
+    monkeypatch.setattr(server, "event_bus", server.subscribe_events(EventBus(events)))
+    inventory = SeatInventory(db, on_change=server.seats_changed)
+    monkeypatch.setattr(server, "seat_inventory", inventory)
+    monkeypatch.setattr(server, "seat_holds", SeatHolds(db, inventory))
+    monkeypatch.setattr(server, "tracking_hub", TrackingHub())
+    monkeypatch.setattr(server, "booking_buses", {})
+    monkeypatch.setattr(server, "bus_routes", {})
+    monkeypatch.setattr(server, "gps_ingestor", GpsIngestor(db, publish=server.publish_positions))
+    monkeypatch.setattr(server.journey_planner, "db", db)
+    server.journey_planner.invalidate()
+    server.route_catalog.invalidate()
+    server.bus_catalog.invalidate()
+    return events
+
+
+@pytest.fixture
+def fake(fake, monkeypatch):
+    fake.function("dashboard_totals")(dashboard_totals)
+    db = fake.database(observer=server.observe_query)
+    events = use_store(monkeypatch, db)
+    yield fake
+    shutil.rmtree(events, ignore_errors=True)
+
+
+@pytest.fixture
+def client(fake):
+    with TestClient(server.app) as client:
+        yield client
+
+
+def test_create_user_goes_through_async_db(client, fake):
+    user = {"email": "amina@example.com", "full_name": "Amina Njeri", "phone": "+254700000000"}
+    response = client.post("/users/", json=user)
+    assert response.status_code == 200
+    assert response.json()["user_id"] == fake.table("users")[0]["user_id"]
+
+
+def test_health_reports_database_status(client, fake):
+    assert client.get("/health").json()["supabase_status"] == "connected"
+
+
+def test_health_probes_read_the_cached_check(client, fake):
+    def probes():
+        return sum("select=route_id&limit=1" in str(r.url) for r in fake.requests)
+
+    reads = probes()
+    assert client.get("/health/live").json() == {"status": "alive"}
+    for _ in range(5):
+        ready = client.get("/health/ready")
+    assert ready.status_code == 200
+    assert ready.json()["checks"]["supabase"]["ok"] is True
+    assert probes() == reads == 1
+
+
+def test_init_routes_inserts_defaults_once(client, fake):
+    assert client.post("/init-routes/").json()["count"] == 3
+    assert client.post("/init-routes/").status_code == 500
+    assert len(fake.table("routes")) == 3
+
+
+def test_routes_are_served_from_catalog_with_formatted_prices(client, fake):
+    client.post("/init-routes/")
+    first = client.get("/routes/", params={"currency": "KES"})
+    reads = len(fake.requests)
+    second = client.get("/routes/")
+    assert first.status_code == 200
+    assert first.json() == second.json()
+    assert len(fake.requests) == reads
+    route = first.json()[0]
+    assert route["prices"]["KES"] == server.convert_price(45.0, "USD", "KES")
+    assert route["formatted_prices"]["KES"] == "Ksh 7,076.25"
+
+
+def test_routes_are_serialized_once_per_catalog_version(client, fake):
+    client.post("/init-routes/")
+    first = client.get("/routes/", params={"currency": "KES"})
+    snapshot = asyncio.run(server.route_catalog.get())
+    assert first.headers["content-type"] == "application/json"
+    assert first.content == snapshot.views["route_responses"][1]
+    assert client.get("/routes/").content == first.content
+    # Only RouteResponse fields, as with response_model validation
+    assert set(first.json()[0]) == set(server.RouteResponse.model_fields)
+
+    dated = client.get("/routes/", params={"travel_date": "2030-01-01"})
+    assert dated.json() == first.json()
+    server.route_catalog.invalidate()
+    client.get("/routes/")
+    assert asyncio.run(server.route_catalog.get()).version == snapshot.version + 1
+
+
+def test_route_responses_fill_defaults_and_leave_out_incomplete_routes():
+    route = {
+        "route_id": "r1", "origin": "Nairobi", "destination": "Kampala", "country_origin": "Kenya",
+        "country_destination": "Uganda", "duration_hours": 12, "base_price": 45.0, "prices": {},
+        "formatted_prices": {}, "origin_coords": [0, 0], "destination_coords": [1, 1],
+        "available_seats": [1], "created_at": "2024-07-01T00:00:00+00:00",
+    }
+    incomplete = {key: value for key, value in route.items() if key != "country_origin"}
+    routes, body = server.route_responses(SimpleNamespace(routes=[route, {**incomplete, "route_id": "r2"}]))
+    assert [r["route_id"] for r in routes] == ["r1"]
+    assert routes[0]["waypoints"] == [] and "created_at" not in routes[0]
+    assert json.loads(body) == routes
+
+
+def test_new_currency_rates_reprice_the_catalog(client, fake, monkeypatch):
+    monkeypatch.setattr(server.currency_rates, "snapshot", server.currency_rates.snapshot)
+    client.post("/init-routes/")
+    assert client.get("/routes/").json()[0]["prices"]["KES"] == 7076.25
+    version = client.get("/currencies/").json()["version"]
+
+    rates = {**server.CURRENCY_RATES, "KES": 160.0}
+    monkeypatch.setattr(server.currency_rates, "provider", StaticProvider(rates))
+    asyncio.run(server.currency_rates.refresh())
+
+    assert client.get("/currencies/").json()["version"] == version + 1
+    route = client.get("/routes/").json()[0]
+    assert route["prices"]["KES"] == 7200.0
+    assert route["formatted_prices"]["KES"] == "Ksh 7,200.00"
+
+
+def test_booking_claims_seat_once(client, fake):
+    client.post("/init-routes/")
+    route_id = client.get("/routes/").json()[0]["route_id"]
+    booking = {"user_id": "u1", "route_id": route_id, "travel_date": "2024-08-01", "seat_number": 2}
+
+    first = client.post("/bookings/", json=booking)
+    assert first.status_code == 200
+    assert first.json()["route"]["route_id"] == route_id
+    assert first.json()["ticket_url"] == f"/api/tickets/{first.json()['qr_code']}.png"
+    ticket = client.get(first.json()["ticket_url"])
+    assert ticket.status_code == 200 and ticket.headers["content-type"] == "image/png"
+    assert ticket.content.startswith(b"\x89PNG")
+    second = client.post("/bookings/", json=booking)
+    assert second.status_code == 400
+    assert second.json()["detail"] == "Seat 2 is not available for this route"
+    assert len(fake.table("bookings")) == 1
+
+    update = {"route_id": route_id, "travel_date": "2024-08-01", "seat_number": 2, "status": "available"}
+    seats = client.put(f"/routes/{route_id}/seats", json=update).json()["available_seats"]
+    assert seats == list(range(1, 45))
+
+
+def test_checkout_hold_then_booking(client, fake):
+    client.post("/init-routes/")
+    route_id = client.get("/routes/").json()[0]["route_id"]
+    hold = client.post("/api/holds", json={
+        "route_id": route_id, "travel_date": "2024-08-01", "seat_numbers": [5, 6],
+    }).json()
+
+    routes = client.get("/routes/", params={"travel_date": "2024-08-01"}).json()
+    assert 5 not in routes[0]["available_seats"]
+    assert 5 in client.get("/routes/").json()[0]["available_seats"]
+
+    booking = {"user_id": "u1", "route_id": route_id, "travel_date": "2024-08-01",
+               "seat_number": 5, "hold_id": hold["hold_id"]}
+    # A booking the hold does not cover is refused and leaves the hold usable
+    assert client.post("/bookings/", json={**booking, "seat_number": 9}).status_code == 400
+    assert client.post("/bookings/", json=booking).status_code == 200
+    assert "hold_id" not in fake.table("bookings")[0]
+    assert client.post("/bookings/", json=booking).status_code == 409
+    assert client.delete(f"/api/holds/{hold['hold_id']}").status_code == 404
+
+
+def test_ticket_image_is_rendered_on_demand_and_cacheable(client, fake):
+    token = server.sign_ticket({
+        "booking_id": "b1", "user_id": "u1", "route_id": "r1",
+        "seat_number": 1, "travel_date": "2024-08-01",
+    }, server.TICKET_SIGNING_KEY)
+    response = client.get(f"/api/tickets/{token}.png")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert "immutable" in response.headers["cache-control"]
+    cached = client.get(f"/api/tickets/{token}.png", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert client.get(f"/api/tickets/{token[:-2]}xx.png").status_code == 404
+    assert client.get(f"/api/tickets/{token[:-2]}é.png").status_code == 404
+
+
+def test_booking_succeeds_when_announcing_it_fails(client, fake, monkeypatch):
+    def publish(topic, key=None, version=None, **data):
+        raise ValueError("Event too large")
+    monkeypatch.setattr(server.event_bus, "publish", publish)
+    client.post("/init-routes/")
+    route_id = client.get("/routes/").json()[0]["route_id"]
+    group = {"user_id": "u1", "route_id": route_id, "travel_date": "2099-08-01"}
+
+    booked = client.post("/bookings/group", json={**group, "seat_numbers": list(range(1, 21))})
+    assert booked.status_code == 200
+    assert len(fake.table("bookings")) == 20
+    assert server.dashboard.totals.booked_seats(route_id, "2099-08-01") == 20
+    assert client.post("/bookings/", json={**group, "seat_number": 1}).status_code == 400
+
+
+def test_group_booking_is_all_or_nothing(client, fake):
+    client.post("/init-routes/")
+    route_id = client.get("/routes/").json()[0]["route_id"]
+    group = {"user_id": "u1", "route_id": route_id, "travel_date": "2024-08-01"}
+    client.post("/bookings/", json={**group, "seat_number": 9})
+
+    rejected = client.post("/bookings/group", json={**group, "seat_numbers": [7, 8, 9, 10]})
+    assert rejected.status_code == 400
+    assert len(fake.table("bookings")) == 1
+
+    before = len(fake.requests)
+    booked = client.post("/bookings/group", json={**group, "seat_numbers": list(range(11, 31))})
+    assert booked.status_code == 200
+    assert [b["seat_number"] for b in booked.json()] == list(range(11, 31))
+    assert len({b["qr_code"] for b in booked.json()}) == 20
+    # One conditional seat update and one bulk insert regardless of group size
+    assert len(fake.requests) - before == 2
+    assert client.post("/bookings/group", json={**group, "seat_numbers": [1, 1]}).status_code == 422
+
+
+def test_route_search_uses_index_not_database(client, fake):
+    client.post("/init-routes/")
+    client.get("/routes/")
+    reads = len(fake.requests)
+    found = client.get("/api/routes/search", params={"origin": "nairobi", "destination": "dar es salaam"})
+    assert [r["destination"] for r in found.json()["routes"]] == ["Dar es Salaam"]
+    cities = client.get("/api/cities/autocomplete", params={"q": "Kam"}).json()["cities"]
+    assert cities == [{"city": "Kampala", "country": "Uganda"}]
+    assert len(fake.requests) == reads
+
+
+def test_journey_planner_connects_routes(client, fake):
+    client.post("/init-routes/")
+    routes = {(r["origin"], r["destination"]): r["route_id"] for r in client.get("/routes/").json()}
+    fake.table("buses").extend([
+        {"bus_id": "b1", "route_id": routes[("Nairobi", "Kampala")], "date": "2024-08-01",
+         "departure_time": "06:00", "arrival_time": "18:00"},
+        {"bus_id": "b2", "route_id": routes[("Kampala", "Kigali")], "date": "2024-08-01",
+         "departure_time": "20:00", "arrival_time": "04:00"},
+    ])
+    response = client.get("/api/journeys", params={
+        "origin": "Nairobi", "destination": "Kigali", "date": "2024-08-01", "currency": "KES",
+    })
+    itinerary = response.json()["itineraries"][0]
+    assert [leg["bus_id"] for leg in itinerary["legs"]] == ["b1", "b2"]
+    assert itinerary["total_price"] == round(
+        server.convert_price(45.0, "USD", "KES") + server.convert_price(35.0, "USD", "KES"), 2)
+    assert client.get("/api/journeys", params={
+        "origin": "Nairobi", "destination": "Kigali", "date": "01-08-2024"}).status_code == 400
+
+
+def test_search_returns_departures_and_seat_counts_in_one_call(client, fake):
+    client.post("/init-routes/")
+    routes = {(r["origin"], r["destination"]): r["route_id"] for r in client.get("/routes/").json()}
+    route_id = routes[("Nairobi", "Kampala")]
+    fake.table("buses").extend([
+        {"bus_id": "b2", "route_id": route_id, "date": "2024-08-01", "departure_time": "20:00",
+         "arrival_time": "08:00", "bus_number": "KBX 2", "status": "scheduled", "total_seats": 44,
+         "driver_name": "Otieno", "available_seats": list(range(1, 45))},
+        {"bus_id": "b1", "route_id": route_id, "date": "2024-08-01", "departure_time": "06:00",
+         "arrival_time": "18:00", "bus_number": "KBX 1", "status": "scheduled", "total_seats": 44,
+         "driver_name": "Wanjiru", "available_seats": list(range(1, 45))},
+    ])
+    client.post("/bookings/group", json={"user_id": "u1", "route_id": route_id,
+                                         "travel_date": "2024-08-01", "seat_numbers": [1, 2, 3]})
+
+    before = len(fake.requests)
+    result = client.get("/api/search", params={
+        "origin": "Nairobi", "destination": "Kampala", "date": "2024-08-01", "currency": "KES",
+    }).json()
+    assert len(fake.requests) - before == 2
+    route = result["routes"][0]
+    assert route["formatted_price"] == "Ksh 7,076.25"
+    assert "available_seats" not in route
+    assert [d["bus_id"] for d in route["departures"]] == ["b1", "b2"]
+    assert route["departures"][0]["available_seat_count"] == 41
+    assert "driver_name" not in route["departures"][0]
+
+    detailed = client.get("/api/search", params={
+        "origin": "Nairobi", "destination": "Kampala", "date": "2024-08-01",
+        "bus_fields": "driver_name,available_seats,secret_column",
+    }).json()["routes"][0]["departures"][0]
+    assert detailed["driver_name"] == "Wanjiru"
+    assert detailed["available_seats"][:2] == [4, 5]
+    assert "secret_column" not in detailed
+
+
+def test_position_updates_are_pushed_to_websocket_subscribers(client, fake):
+    fake.table("buses").append({"bus_id": "b1", "route_id": "r1", "date": "2099-08-01",
+                                "current_location": [-1.29, 36.82], "status": "scheduled"})
+    with client.websocket_connect("/api/buses/b1/track/ws") as ws:
+        assert ws.receive_json()["current_location"] == [-1.29, 36.82]
+        update = client.put("/buses/b1/position", json={"current_location": [-0.5, 35.2], "status": "in_transit"})
+        assert update.json()["subscribers"] == 1
+        pushed = ws.receive_json()
+        ws.send_text("ignored")
+    # The subscription ends with the connection, not at the next change
+    deadline = time.monotonic() + 1
+    while server.tracking_hub.subscribers("b1") and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert server.tracking_hub.subscribers("b1") == 0
+    assert pushed["status"] == "in_transit"
+    assert pushed["current_location"] == [-0.5, 35.2]
+    assert client.put("/buses/b1/position", json={"current_location": [95, 0]}).status_code == 422
+    assert client.put("/buses/ghost/position", json={"current_location": [0, 0]}).status_code == 404
+
+
+def test_tracking_unknown_buses_is_refused(client, fake):
+    assert client.get("/api/buses/ghost/track/stream").status_code == 404
+    with client.websocket_connect("/api/buses/ghost/track/ws") as ws:
+        assert ws.receive()["code"] == 1008
+    assert server.tracking_hub.latest("ghost") is None and not server.tracking_hub._channels
+
+
+def test_gps_batches_are_served_from_memory_and_flushed_in_bulk(fake, monkeypatch):
+    calls, estimated = [], []
+    estimate = server.eta_engine.estimate
+    monkeypatch.setattr(server.eta_engine, "estimate", lambda positions, now: estimated.append(positions)
+                        or estimate(positions, now))
+    server.bus_routes.update({"b7": "r1", "b8": "r1"})
+    fake.table("buses").extend({"bus_id": bus_id, "route_id": "r1", "date": "2099-08-01"} for bus_id in ("b7", "b8"))
+
+    @fake.function("record_bus_positions")
+    def record(fake, points):
+        calls.append(points)
+        return len(points)
+
+    with TestClient(server.app) as client:
+        pings = [{"bus_id": "b7", "lat": -1.29 + 0.01 * i, "lon": 36.82, "recorded_at": 1_700_000_000 + i}
+                 for i in range(5)]
+        pings.append(pings[-1])
+        pings.append({"bus_id": "b8", "lat": -1.0, "lon": 36.0})
+        pings.append({"bus_id": "ghost", "lat": -1.0, "lon": 36.0})
+        pings.append({"bus_id": "b8", "lat": -1.1, "lon": 36.0, "recorded_at": time.time() + 3600})
+        response = client.post("/api/gps/pings", json={"pings": pings})
+        assert response.json() == {"accepted": 6, "dropped": 3}
+        # One ETA estimate for the whole batch
+        assert [len(positions) for positions in estimated] == [6]
+        assert client.post("/api/gps/pings", json={"pings": [{"bus_id": "b7", "lat": 91, "lon": 0}]}).status_code == 422
+
+        requests_before = len(fake.requests)
+        positions = client.get("/api/buses/b7/positions", params={"limit": 2}).json()["positions"]
+        assert [p["current_location"][0] for p in positions] == [-1.26, -1.25]
+        assert len(fake.requests) == requests_before
+        assert calls == []
+
+    assert len(calls) == 1 and len(calls[0]) == 6
+
+
+def test_tracking_and_fleet_views_report_progress_and_eta(client, fake):
+    client.post("/init-routes/")
+    route = client.get("/routes/").json()[0]
+    fake.table("buses").append({"bus_id": "b1", "route_id": route["route_id"], "date": "2099-08-01",
+                                "current_location": route["origin_coords"], "status": "in_transit"})
+    fake.table("bookings").append({"booking_id": "k1", "user_id": "u1", "route_id": route["route_id"],
+                                   "travel_date": "2024-08-01", "bus_id": "b1"})
+
+    tracking = client.get("/api/bookings/k1/track").json()
+    assert tracking["route"]["route_id"] == route["route_id"]
+    assert tracking["progress_percentage"] == 0
+    assert tracking["eta"] is not None
+
+    client.put("/buses/b1/position", json={"current_location": route["destination_coords"]})
+    fleet = client.get("/api/fleet/eta").json()["buses"]
+    assert [(bus["bus_id"], bus["progress_percentage"], bus["distance_remaining_km"]) for bus in fleet] == [
+        ("b1", 100.0, 0.0)
+    ]
+
+
+def test_booking_history_is_cursor_paginated_and_projected(client, fake):
+    client.post("/init-routes/")
+    route_id = client.get("/routes/").json()[0]["route_id"]
+    for i in range(7):
+        fake.table("bookings").append({
+            "booking_id": f"k{i}", "user_id": "u1", "route_id": route_id,
+            "travel_date": f"2024-08-{i + 1:02d}", "seat_number": i + 1,
+            "status": "cancelled" if i == 3 else "confirmed",
+            # Two bookings share a timestamp, so the tie-break matters
+            "created_at": f"2024-07-01T10:00:0{min(i, 5)}+00:00",
+            "qr_code": "data:image/png;base64," + "A" * 10_000,
+        })
+    # The newest booking stores a ticket token, the older ones legacy images
+    newest = fake.table("bookings")[-1]
+    newest["qr_code"] = stored = server.sign_ticket(newest, server.TICKET_SIGNING_KEY)
+    fake.table("bookings").append({"booking_id": "other", "user_id": "u2", "route_id": route_id,
+                                   "travel_date": "2024-08-01", "seat_number": 9, "status": "confirmed",
+                                   "created_at": "2024-07-02T00:00:00+00:00"})
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/bookings/u1", params=params).json()
+        seen.extend(booking["booking_id"] for booking in page["bookings"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["k6", "k5", "k4", "k3", "k2", "k1", "k0"]
+
+    first = client.get("/bookings/u1", params={"limit": 1}).json()["bookings"][0]
+    assert "qr_code" not in first
+    assert first["ticket_url"] == f"/api/tickets/{stored}.png"
+    assert first["route"]["route_id"] == route_id and "waypoints" not in first["route"]
+    assert client.get(first["ticket_url"]).status_code == 200
+
+    filtered = client.get("/bookings/u1", params={
+        "status": "confirmed", "date_from": "2024-08-02", "date_to": "2024-08-05", "fields": "qr_code",
+    }).json()["bookings"]
+    assert [b["booking_id"] for b in filtered] == ["k4", "k2", "k1"]
+    assert filtered[0]["qr_code"].startswith("data:image/png")
+    assert client.get(filtered[0]["ticket_url"]).status_code == 200
+    assert client.get("/bookings/u1", params={"cursor": "nonsense"}).status_code == 400
+
+
+def test_admin_export_streams_date_range(client, fake):
+    client.post("/init-routes/")
+    route_id = client.get("/routes/").json()[0]["route_id"]
+    for i, day in enumerate(["2024-06-30", "2024-07-01", "2024-07-15", "2024-07-31", "2024-08-01"]):
+        fake.table("bookings").append({"booking_id": f"k{i}", "user_id": "u1", "route_id": route_id,
+                                       "travel_date": day, "seat_number": i + 1, "status": "confirmed",
+                                       "created_at": f"{day}T23:59:00+00:00"})
+
+    response = client.get("/api/admin/bookings/export", params={"date_from": "2024-07-01", "date_to": "2024-07-31"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [line.split('"')[3] for line in response.text.splitlines()] == ["k1", "k2", "k3"]
+
+    response = client.get("/api/admin/bookings/export", params={
+        "date_from": "2024-07-15", "date_to": "2024-08-01", "format": "csv", "by": "travel_date",
+    })
+    assert response.headers["content-disposition"] == 'attachment; filename="bookings-2024-07-15-2024-08-01.csv"'
+    assert len(response.text.splitlines()) == 4
+    assert client.get("/api/admin/bookings/export", params={
+        "date_from": "2024-07-01", "date_to": "July", "format": "csv"}).status_code == 400
+
+
+def test_admin_dashboard_is_updated_per_booking_and_reconciled(client, fake):
+    client.post("/init-routes/")
+    route = client.get("/routes/").json()[0]
+    route_id = route["route_id"]
+    assert client.post("/bookings/", json={"user_id": "u1", "route_id": route_id,
+                                           "travel_date": "2099-01-01", "seat_number": 1}).status_code == 200
+    assert client.post("/bookings/group", json={"user_id": "u1", "route_id": route_id,
+                                                "travel_date": "2099-01-01", "seat_numbers": [2, 3]}).status_code == 200
+    client.put(f"/routes/{route_id}/seats", json={"route_id": route_id, "travel_date": "2099-01-01",
+                                                  "seat_number": 10, "status": "booked"})
+
+    reads = len(fake.requests)
+    summary = client.get("/api/admin/dashboard").json()
+    assert len(fake.requests) == reads + 1  # only the active bus count
+    assert summary["stats"]["total_bookings"] == 3
+    assert summary["stats"]["total_revenue"] == round(3 * route["prices"]["KES"], 2)
+    assert summary["recent_bookings"][0]["seat_numbers"] == [2, 3]
+    stats = next(r for r in summary["routes"] if r["route_id"] == route_id)
+    assert (stats["bookings"], stats["booked_seats"]) == (3, 4)
+
+    # A booking written by another worker shows up after reconciliation
+    fake.table("bookings").append({"booking_id": "elsewhere", "user_id": "u2", "route_id": route_id,
+                                   "travel_date": "2099-01-02", "seat_number": 5, "status": "confirmed",
+                                   "created_at": "2024-01-01T00:00:00+00:00"})
+    asyncio.run(server.dashboard.reconcile())
+    summary = client.get("/api/admin/dashboard").json()
+    assert summary["stats"]["total_bookings"] == 4
+    assert summary["stats"]["bookings_by_status"]["confirmed"] == 1
+    assert summary["reconciled_at"] is not None
+
+    routes = client.get("/api/admin/routes").json()["routes"]
+    assert next(r for r in routes if r["route_id"] == route_id)["occupancy_percentage"] == round(400 / 44, 1)
+
+
+def test_booking_limit_is_keyed_on_client_and_user():
+    request = SimpleNamespace(client=SimpleNamespace(host="10.0.0.1"))
+    assert server.booking_user(request=request, booking=SimpleNamespace(user_id="u1")) == "10.0.0.1:u1"
+    assert server.booking_user(request=request, group=SimpleNamespace(user_id="u2")) == "10.0.0.1:u2"
+
+
+def test_one_client_cannot_hold_a_whole_departure(client, fake):
+    client.post("/init-routes/")
+    route_id = client.get("/routes/").json()[0]["route_id"]
+    statuses = [
+        client.post("/api/holds", json={"route_id": route_id, "travel_date": "2024-08-01",
+                                     "seat_numbers": [seat]}).status_code
+        for seat in range(1, 9)
+    ]
+    assert statuses == [200] * 6 + [429] * 2
+    other_day = client.post("/api/holds", json={"route_id": route_id, "travel_date": "2024-08-02",
+                                             "seat_numbers": [1]})
+    assert other_day.status_code == 200
+    rejected = client.post("/api/holds", json={"route_id": route_id, "travel_date": "2024-08-01",
+                                            "seat_numbers": [20]})
+    assert int(rejected.headers["retry-after"]) >= 1
+
+
+def test_metrics_cover_routes_database_and_rejections(client, fake):
+    client.post("/init-routes/")
+    route_id = client.get("/routes/").json()[0]["route_id"]
+    client.get("/bookings/u1")
+    booking = {"user_id": "u9", "route_id": route_id, "travel_date": "2024-08-01", "seat_number": 1}
+    assert client.post("/bookings/", json=booking).status_code == 200
+    client.get("/no-such-page")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/bookings/{user_id}",status="200"}' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}' in text
+    assert 'db_operation_duration_seconds_count{operation="insert",table="bookings",status="201"}' in text
+    assert 'db_operation_duration_seconds_count{operation="select",table="routes",status="200"}' in text
+    assert 'ticket_duration_seconds_count{stage="sign"}' in text
+    assert 'currency_conversions_total{from="USD",to="KES"}' in text
+
+
+def test_changes_from_other_workers_update_local_caches(client, fake, monkeypatch):
+    monkeypatch.setattr(server.currency_rates, "snapshot", server.currency_rates.snapshot)
+    client.post("/init-routes/")
+    client.get("/routes/")
+    assert server.route_catalog.is_fresh()
+
+    peer = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    def send(topic, key, version, **data):
+        event = {"topic": topic, "key": key, "version": version, "data": data, "origin": "peer"}
+        peer.sendto(json.dumps(event).encode(), server.event_bus.path)
+
+    send("seats", "r1/2099-08-01", 3, route_id="r1", travel_date="2099-08-01",
+         booked_mask=0b110, total_seats=44)
+    send("routes", None, 1)
+    send("bookings", None, None, route_id="r1", travel_date="2099-08-01", status="confirmed",
+         created_at=None, seats=[["b1", 2]])
+    version = server.currency_rates.version + 5
+    sent = server.event_bus.sent
+    send("rates", None, version, updated_at=1.0, rates={**server.CURRENCY_RATES, "KES": 160.0})
+    deadline = time.monotonic() + 1
+    while server.currency_rates.version != version and time.monotonic() < deadline:
+        time.sleep(0.005)
+    peer.close()
+
+    assert not server.route_catalog.is_fresh()
+    assert server.dashboard.totals.booked_seats("r1", "2099-08-01") == 2
+    assert server.dashboard.totals.route_bookings == {"r1": 1}
+    # Taken with the peer's version, and not sent back out
+    assert server.currency_rates.version == version
+    assert server.event_bus.sent == sent
+
+
+def test_depot_books_against_sqlite(monkeypatch, tmp_path):
+    events = use_store(monkeypatch, SqliteStore(str(tmp_path / "depot.db"), observer=server.observe_query))
+    try:
+        with TestClient(server.app) as client:
+            assert client.post("/init-routes/").json()["count"] == 3
+            route_id = client.get("/routes/").json()[0]["route_id"]
+            booking = {"user_id": "u1", "route_id": route_id, "travel_date": "2030-01-01"}
+            assert client.post("/bookings/", json={**booking, "seat_number": 5}).status_code == 200
+            assert client.post("/bookings/", json={**booking, "seat_number": 5}).status_code == 400
+            history = client.get("/bookings/u1").json()
+            assert [b["seat_number"] for b in history["bookings"]] == [5]
+            assert client.get("/health/ready").status_code == 200
+    finally:
+        shutil.rmtree(events, ignore_errors=True)
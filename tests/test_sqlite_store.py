@@ -0,0 +1,166 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from db import PostgrestError, eq, in_
+from holds import SeatHolds
+from pagination import after, order
+from seats import SeatInventory, SeatUnavailableError
+from sqlite_store import SqliteStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteStore(str(tmp_path / "depot.db"))
+    yield store
+    asyncio.run(store.close())
+
+
+def bookings(n, user_id="u1"):
+    return [
+        {
+            "booking_id": f"{user_id}-{i:03}",
+            "user_id": user_id,
+            "route_id": "r1",
+            "bus_id": "bus1" if i % 2 else None,
+            "travel_date": f"2024-08-{i % 28 + 1:02}",
+            "seat_number": i % 44 + 1,
+            "status": "confirmed",
+            "created_at": f"2024-07-01T00:{i // 60:02}:{i % 60:02}+00:00",
+        }
+        for i in range(n)
+    ]
+
+
+def test_file_uses_wal_and_indexes(store, tmp_path):
+    asyncio.run(store.select("bookings", limit=1))
+    conn = sqlite3.connect(str(tmp_path / "depot.db"))
+    assert conn.execute("pragma journal_mode").fetchone()[0] == "wal"
+    plan = " ".join(row[3] for row in conn.execute(
+        "explain query plan select * from bookings where user_id = ? "
+        "order by created_at desc, booking_id desc limit 51", ("u1",)
+    ))
+    assert "bookings_user_created_idx" in plan and "TEMP B-TREE" not in plan
+    for sql in (
+        "select * from bookings where route_id = ? and travel_date = ?",
+        "select * from buses where route_id = ? and date = ?",
+        "select * from seat_inventory where travel_date >= ?",
+    ):
+        plan = " ".join(row[3] for row in conn.execute("explain query plan " + sql, ("x",) * sql.count("?")))
+        assert "USING INDEX" in plan, sql
+
+
+def test_insert_round_trips_json_and_generates_keys(store):
+    async def scenario():
+        [route] = await store.insert("routes", {
+            "origin": "Nairobi", "destination": "Kampala", "country_origin": "Kenya",
+            "country_destination": "Uganda", "duration_hours": 12, "base_price": 45.0,
+            "origin_coords": [-1.2921, 36.8219], "destination_coords": [0.3476, 32.5825],
+            "available_seats": [1, 2, 3],
+        })
+        assert route["route_id"] and route["created_at"]
+        assert route["origin_coords"] == [-1.2921, 36.8219]
+        assert await store.select_one("routes", "origin,available_seats", {"route_id": eq(route["route_id"])}) \
+            == {"origin": "Nairobi", "available_seats": [1, 2, 3]}
+
+    asyncio.run(scenario())
+
+
+def test_filters_order_and_keyset_pages(store):
+    async def scenario():
+        await store.insert("bookings", bookings(120) + bookings(5, user_id="u2"))
+        columns = ("created_at", "booking_id")
+        seen, cursor = [], None
+        while True:
+            filters = [("user_id", eq("u1"))] + ([after(columns, cursor)] if cursor else [])
+            page = await store.select("bookings", "booking_id,created_at", filters, order=order(columns), limit=50)
+            seen += [row["booking_id"] for row in page]
+            if len(page) < 50:
+                break
+            cursor = [page[-1][c] for c in columns]
+        assert seen == [f"u1-{i:03}" for i in reversed(range(120))]
+
+        rows = await store.select("bookings", "booking_id", [
+            ("user_id", eq("u1")), ("seat_number", "gte.40"), ("travel_date", in_(["2024-08-01", "2024-08-12"])),
+        ], order="booking_id.asc")
+        assert [r["booking_id"] for r in rows] == ["u1-039", "u1-084"]
+        assert len(await store.select("bookings", "booking_id", [("bus_id", "is.null")])) == 63
+        assert len(await store.select("bookings", "booking_id", [("bus_id", "not.is.null")])) == 62
+        with pytest.raises(PostgrestError) as error:
+            await store.select("bookings", "booking_id", [("seat; drop table bookings", eq(1))])
+        assert error.value.status_code == 400
+
+    asyncio.run(scenario())
+
+
+def test_embeds_related_rows(store):
+    async def scenario():
+        await store.insert("buses", {"bus_id": "bus1", "route_id": "r1", "date": "2024-08-02", "bus_number": "KBX 1"})
+        await store.insert("bookings", bookings(2))
+        rows = await store.select("bookings", "booking_id,buses(bus_number)", order="booking_id.asc")
+        assert rows == [
+            {"booking_id": "u1-000", "buses": None},
+            {"booking_id": "u1-001", "buses": {"bus_number": "KBX 1"}},
+        ]
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_insert_is_a_conflict_and_rolls_back(store):
+    async def scenario():
+        await store.insert("bookings", bookings(1))
+        with pytest.raises(PostgrestError) as error:
+            await store.insert("bookings", bookings(3))
+        assert (error.value.status_code, error.value.code) == (409, "23505")
+        assert len(await store.select("bookings")) == 1
+        ignored = await store.insert("bookings", bookings(2), resolution="ignore-duplicates")
+        assert [row["booking_id"] for row in ignored] == ["u1-001"]
+
+    asyncio.run(scenario())
+
+
+def test_seat_inventory_and_holds_run_on_sqlite(store):
+    inventory = SeatInventory(store)
+    holds = SeatHolds(store, inventory)
+
+    async def scenario():
+        await inventory.claim("r1", "2024-08-01", [1, 2])
+        results = await asyncio.gather(
+            *(inventory.claim("r1", "2024-08-01", [3]) for _ in range(3)), return_exceptions=True
+        )
+        assert sum(isinstance(r, SeatUnavailableError) for r in results) == 2
+        hold = await holds.hold("r1", "2024-08-01", [10])
+        assert (await inventory.state("r1", "2024-08-01")).booked_seats() == [1, 2, 3, 10]
+        assert (await holds.confirm(hold.hold_id)).seat_numbers == [10]
+
+    asyncio.run(scenario())
+
+
+def test_record_bus_positions(store):
+    async def scenario():
+        await store.insert("buses", {"bus_id": "bus1", "route_id": "r1", "date": "2024-08-02"})
+        stored = await store.rpc("record_bus_positions", {"points": [
+            {"bus_id": "bus1", "location": [1.0, 36.0], "status": None,
+             "recorded_at": "2024-08-02T08:00:00+00:00"},
+            {"bus_id": "bus1", "location": [1.1, 36.0], "status": "in_transit",
+             "recorded_at": "2024-08-02T08:00:05+00:00"},
+            {"bus_id": "unknown", "location": [0.0, 0.0], "status": None,
+             "recorded_at": "2024-08-02T08:00:00+00:00"},
+        ]})
+        assert stored == 2
+        bus = await store.select_one("buses", "current_location,status", {"bus_id": eq("bus1")})
+        assert bus == {"current_location": [1.1, 36.0], "status": "in_transit"}
+
+    asyncio.run(scenario())
+
+
+def test_dashboard_totals(store):
+    async def scenario():
+        await store.insert("bookings", bookings(3) + [{**bookings(1, user_id="u2")[0], "status": "cancelled"}])
+        result = await store.rpc("dashboard_totals", {"today": "2024-07-01", "recent_since": "2024-07-01T00:00:01"})
+        assert sorted((row["status"], row["bookings"], row["today"]) for row in result["totals"]) \
+            == [("cancelled", 1, 1), ("confirmed", 3, 3)]
+        assert sorted(result["recent_ids"]) == ["u1-001", "u1-002"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+
+def test_importing_the_app_defers_heavy_modules(tmp_path):
+    code = (
+        "import sys, threading, server; "
+        "print(threading.active_count()); "
+        "print(sorted(m for m in ('numpy', 'qrcode', 'PIL', 'fastapi_utils') if m in sys.modules))"
+    )
+    shared = tmp_path / "ratelimit"
+    env = dict(os.environ, SUPABASE_URL="http://127.0.0.1:9", SUPABASE_KEY="test-key", RATE_LIMIT_PATH=str(shared))
+    env.pop("RATE_LIMIT_BACKEND", None)
+    output = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    threads, modules = output.strip().splitlines()[-2:]
+    assert modules == "[]"
+    # No log listener thread and no shared rate limit file until startup
+    assert threads == "1"
+    assert not shared.exists()
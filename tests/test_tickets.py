@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from tickets import InvalidTicketError, TicketRenderer, is_ticket_token, sign_ticket, verify_ticket
+
+BOOKING = {
+    "booking_id": "b1",
+    "user_id": "u1",
+    "route_id": "r1",
+    "seat_number": 12,
+    "travel_date": "2024-08-01",
+    "status": "pending",
+}
+
+
+def test_token_roundtrip_and_tamper_detection():
+    token = sign_ticket(BOOKING, "secret")
+    assert is_ticket_token(token)
+    assert len(token) < 200
+    assert verify_ticket(token, "secret")["seat_number"] == 12
+    with pytest.raises(InvalidTicketError):
+        verify_ticket(token, "other-secret")
+    forged = sign_ticket({**BOOKING, "seat_number": 13}, "secret").split(".")[0]
+    with pytest.raises(InvalidTicketError):
+        verify_ticket(f"{forged}.{token.split('.')[1]}", "secret")
+
+
+def test_non_ascii_tokens_are_invalid():
+    payload = sign_ticket(BOOKING, "secret").split(".")[0]
+    for token in (f"{payload}.é", f"ü{payload}.sig", f"{payload}.\udc80"):
+        with pytest.raises(InvalidTicketError):
+            verify_ticket(token, "secret")
+
+
+def test_renderer_caches_and_evicts():
+    renderer = TicketRenderer(max_workers=1, cache_size=2)
+    tokens = [sign_ticket({**BOOKING, "seat_number": n}, "secret") for n in (1, 2, 3)]
+
+    async def scenario():
+        first = await asyncio.gather(*(renderer.render(tokens[0]) for _ in range(5)))
+        await renderer.render(tokens[1])
+        await renderer.render(tokens[2])
+        return first
+
+    try:
+        first = asyncio.run(scenario())
+    finally:
+        renderer.close()
+    assert first[0].startswith(b"\x89PNG")
+    assert all(png is first[0] for png in first)
+    assert list(renderer._cache) == tokens[1:]
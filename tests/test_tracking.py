@@ -0,0 +1,57 @@
+import asyncio
+
+from tracking import TrackingHub
+
+
+def test_fan_out_primes_new_subscribers_with_latest_event():
+    hub = TrackingHub()
+
+    async def scenario():
+        hub.publish("bus-1", {"current_location": [0.1, 32.5]})
+        streams = [hub.events("bus-1") for _ in range(1000)]
+        first = await asyncio.gather(*(anext(s) for s in streams))
+        assert hub.publish("bus-1", {"current_location": [0.2, 32.4]}) == 1000
+        second = await asyncio.gather(*(anext(s) for s in streams))
+        for stream in streams:
+            await stream.aclose()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert set(first) == {'{"current_location":[0.1,32.5]}'}
+    assert set(second) == {'{"current_location":[0.2,32.4]}'}
+    assert hub.subscriber_count == 0
+
+
+def test_slow_consumer_is_evicted_without_blocking_others():
+    hub = TrackingHub(queue_size=4)
+
+    async def scenario():
+        slow = hub.subscribe("bus-1")
+        fast = hub.events("bus-1")
+        received = []
+        for i in range(10):
+            hub.publish("bus-1", {"seq": i})
+            received.append(await anext(fast))
+        await fast.aclose()
+        return slow, received
+
+    slow, received = asyncio.run(scenario())
+    assert received == [f'{{"seq":{i}}}' for i in range(10)]
+    assert slow.evicted
+    assert slow.queue.qsize() == 1
+    assert hub.evictions == 1
+    assert hub.subscriber_count == 0
+
+
+def test_heartbeat_when_idle():
+    hub = TrackingHub(heartbeat=0.01)
+
+    async def scenario():
+        stream = hub.events("bus-1")
+        payload = await anext(stream)
+        await stream.aclose()
+        return payload
+
+    assert asyncio.run(scenario()) is None
+    # A channel with neither subscribers nor an event is not kept
+    assert hub.latest("bus-1") is None and not hub._channels